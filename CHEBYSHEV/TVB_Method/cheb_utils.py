@@ -3,7 +3,7 @@ import numpy as np
 import itertools
 from scipy.linalg import qr, solve_triangular
 from scipy.misc import comb
-#from TVB_Method.root_finder import newton_polish
+from CHEBYSHEV.TVB_Method.root_finder import newton_polish_batch
 
 class TVBError(RuntimeError):
     pass
@@ -404,8 +404,8 @@ def check_zeros(zeros, polys, real=True, tol=1e-5):
     better = []
     diff = []
     newt_bad = set()
-    for zero in bad_inrange:
-        newt_zero = newton_polish(polys,zero,tol=1e-10)
+    polished = newton_polish_batch(polys,np.array(bad_inrange),tol=1e-10) if bad_inrange else []
+    for zero, newt_zero in zip(bad_inrange, polished):
         better.append(newt_zero)
         diff.append(zero - newt_zero)
         for poly in polys:
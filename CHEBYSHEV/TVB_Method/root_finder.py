@@ -1,7 +1,8 @@
 import numpy as np
 import itertools
 import warnings
-from CHEBYSHEV.TVB_Method.cheb_class import MultiCheb, Term, TVBError, match_size, match_poly_dimensions, get_var_list
+from CHEBYSHEV.TVB_Method.cheb_class import MultiCheb, Term, TVBError, match_size, match_poly_dimensions, get_var_list, chebvalnd
+from numpy.polynomial import chebyshev as cheb
 from CHEBYSHEV.TVB_Method.TVB import telen_van_barel
 
 '''This module contains methods for finding the zero locus of a
@@ -26,6 +27,9 @@ Methods:
     newton_polish(polys,roots) : Use Newton's method to polish a collection of 
                                  approximate roots.
 
+    newton_polish_batch(polys,roots) : Use Newton's method to polish many approximate
+                                       roots at once.
+
     check_zeros(zeros, polys): Check whether 'zeros' are, indeed, all the zeros of 
                                'polys', and how many are outside the sup-norm unit 
                                 ball |z|_\infty < 1 or are not real.
@@ -263,6 +267,54 @@ def newton_polish(polys,root,niter=100,tol=1e-8):
 
 
 
+def newton_polish_batch(polys,roots,niter=100,tol=1e-8):
+    """
+    Perform Newton's method on a system of N polynomials in M variables from many starting points at once.
+
+    Each iteration evaluates every polynomial and its gradient at all the roots that haven't
+    converged yet, and solves all of their Newton steps with one stacked solve. Each root uses
+    the same stopping rule as newton_polish.
+
+    Parameters
+    ----------
+    polys : list
+        A list of MultiCheb polynomials.
+    roots : ndarray
+        The initial guesses for Newton's method. Each row is a root.
+    niter : int
+        A maximum number of iterations of Newton's method.
+    tol : float
+        Tolerance for convergence of Newton's method.
+
+    Returns
+    -------
+    roots : ndarray
+        The terminal point of Newton's method for each root.
+    """
+    m = len(polys)
+    roots = np.array(roots, dtype="complex_")
+    active = np.arange(len(roots))
+    for poly in polys:
+        if poly.jac is None:
+            poly.jac = [cheb.chebder(poly.coeff,axis=i) for i in range(poly.dim)]
+
+    for i in range(niter):
+        if len(active) == 0:
+            break
+        #chebvalnd evaluates at every column of the points at once.
+        points = roots[active].T
+        f_x = np.empty((len(active),m),dtype="complex_")
+        jac = np.empty((len(active),m,roots.shape[1]),dtype="complex_")
+        for j, poly in enumerate(polys):
+            f_x[:,j] = chebvalnd(points,poly.coeff)
+            for k, der in enumerate(poly.jac):
+                jac[:,j,k] = chebvalnd(points,der)
+        delta = np.linalg.solve(jac,-f_x[:,:,np.newaxis])[:,:,0]
+        roots[active] += delta
+        #Like newton_polish, the step is still taken on the iteration a root converges.
+        active = active[np.linalg.norm(delta,axis=1) >= tol]
+    return roots
+
 
 #########  Testing Funtions   ##########
 
@@ -326,8 +378,8 @@ def check_zeros(zeros, polys, real=True, tol=1e-5):
     better = []
     diff = []
     newt_bad = set()
-    for zero in bad_inrange:
-        newt_zero = newton_polish(polys,zero,tol=1e-10)
+    polished = newton_polish_batch(polys,np.array(bad_inrange),tol=1e-10) if bad_inrange else []
+    for zero, newt_zero in zip(bad_inrange, polished):
         better.append(newt_zero)
         diff.append(zero - newt_zero)
         for poly in polys:
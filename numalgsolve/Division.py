@@ -1,13 +1,16 @@
 import numpy as np
 import itertools
 from scipy.linalg import solve_triangular, eig, qr
+from scipy import sparse
 from numalgsolve.polynomial import MultiCheb, MultiPower, is_power
-from numalgsolve.MacaulayReduce import add_polys, rrqr_reduceMacaulay, rrqr_reduceMacaulay2
-from numalgsolve.utils import get_var_list, slice_top, row_swap_matrix, \
-                              mon_combos, newton_polish, MacaulayError
+from numalgsolve.MacaulayReduce import macaulay_entries, rrqr_reduceMacaulay
+from numalgsolve.utils import get_var_list, slice_top, row_swap_matrix, macaulay_matrix, entries_matrix, \
+                              mon_combos, newton_polish_batch, MacaulayError, MonomialIndex, \
+                              num_mons_full, macaulay_layout, planned_macaulay_matrix, plan_cache
 import warnings
 
-def division(polys, get_divvar_coord_from_eigval = False, divisor_var = 0, tol = 1.e-12, verbose=False, polish = False):
+def division(polys, get_divvar_coord_from_eigval = False, divisor_var = 0, tol = 1.e-12, verbose=False, polish = False,
+             layout = None, sparse_matrix = False):
     '''Calculates the common zeros of polynomials using a division matrix.
 
     Parameters
@@ -19,6 +22,12 @@ def division(polys, get_divvar_coord_from_eigval = False, divisor_var = 0, tol =
     get_divvar_coord_from_eigval: bool
         Whether the divisor_var-coordinate of the roots is calculated from the eigenvalue or eigenvector.
         More stable to use the eigenvector. Defaults to false
+    layout : dict
+        The layout of the Macaulay matrix from division_plan. Found from the plan cache if None.
+        It is only used when every coefficient of the polynomials is nonzero.
+    sparse_matrix : bool
+        If True the Macaulay matrix is built as a scipy csr matrix and reduced by
+        rrqr_reduceMacaulaySparse, so the whole matrix is never made dense.
 
     Returns
     -----------
@@ -36,22 +45,26 @@ def division(polys, get_divvar_coord_from_eigval = False, divisor_var = 0, tol =
 
     matrix_degree = np.sum(poly.degree for poly in polys) - len(polys) + 1
 
-    poly_coeff_list = []
-    for poly in polys:
-        poly_coeff_list = add_polys(matrix_degree, poly, poly_coeff_list)
-
-    matrix, matrix_terms, cuts = create_matrix(poly_coeff_list, matrix_degree, dim, divisor_var, get_divvar_coord_from_eigval)
+    if all(np.count_nonzero(poly.coeff) == num_mons_full(poly.degree, dim) for poly in polys):
+        #Every coefficient is nonzero, so the terms of the matrix only depend on the degrees and a cached layout is used.
+        if layout is None:
+            layout = division_plan(degrees, dim, divisor_var, not get_divvar_coord_from_eigval, power)
+        matrix = planned_macaulay_matrix([poly.coeff for poly in polys], layout, sparse_matrix=sparse_matrix)
+        matrix_terms, cuts = np.array(layout['matrix_terms']), tuple(int(cut) for cut in layout['cuts'])
+    else:
+        #The nonzero entries of the monomial multiples go straight into the matrix.
+        rows, terms, values, num_rows = macaulay_entries(matrix_degree, polys)
+        matrix_terms, cuts = get_matrix_terms(None, dim, divisor_var, matrix_degree, not get_divvar_coord_from_eigval,
+                                              terms=terms)
+        matrix = entries_matrix(rows, terms, values, num_rows, matrix_terms, sparse_matrix=sparse_matrix)
     if verbose:
         np.set_printoptions(suppress=False, linewidth=200)
         print('\nStarting Macaulay Matrix\n', matrix)
         print('\nColumns in Macaulay Matrix\nFirst element in tuple is degree of x monomial, Second element is degree of y monomial \n', matrix_terms)
         print('\nLocation of Cuts in the Macaulay Matrix into [ Mb | M1* | M2* ]\n', cuts)
 
-    #If bottom left is zero only does the first QR reduction on top part of matrix (for speed). Otherwise does it on the whole thing
-    if np.allclose(matrix[cuts[0]:,:cuts[0]], 0):
-        matrix, matrix_terms = rrqr_reduceMacaulay2(matrix, matrix_terms, cuts, max_number_of_roots, tol)
-    else:
-        matrix, matrix_terms = rrqr_reduceMacaulay(matrix, matrix_terms, cuts, max_number_of_roots, tol)
+    #The first QR reduction follows the staircase of the rows, see staircase_qr.
+    matrix, matrix_terms = rrqr_reduceMacaulay(matrix, matrix_terms, cuts, max_number_of_roots, tol)
 
     rows,columns = matrix.shape
 
@@ -74,82 +87,60 @@ def division(polys, get_divvar_coord_from_eigval = False, divisor_var = 0, tol =
         inverses = matrix_terms[np.where(matrix_terms[:,divisor_var] == 0)[0]]
         inverses[:,divisor_var] = -np.ones(inverses.shape[0], dtype = 'int')
         inv_matrix_terms = np.vstack((inverses, VB))
-        inv_matrix = np.zeros([len(inverses),len(inv_matrix_terms)])
 
-        #A bunch of different dictionaries are used below for speed purposes and to prevent repeat calculations.
+        #Monomial indexes are used below for speed purposes and to prevent repeat calculations.
 
-        #A dictionary of term in inv_matrix_terms to their spot in inv_matrix_terms.
-        inv_spot_dict = dict()
-        spot = 0
-        for term in inv_matrix_terms:
-            inv_spot_dict[tuple(term)] = spot
-            spot+=1
+        #The spots of the terms in inv_matrix_terms.
+        inv_index = MonomialIndex(inv_matrix_terms)
 
-        #A dictionary of terms on the diagonal to their reduction in the vector basis.
-        diag_reduction_dict = dict()
-        for i in range(matrix.shape[0]):
-            term = matrix_terms[i]
-            diag_reduction_dict[tuple(term)] = matrix[i][-len(VB):]
+        #The terms on the diagonal, their reductions in the vector basis are the rows of matrix.
+        diag_index = MonomialIndex(matrix_terms[:matrix.shape[0]])
+        diag_reductions = matrix[:,-len(VB):]
 
-        #A dictionary of terms to the terms in their quotient when divided by x.
-        divisor_terms_dict = dict()
-        for term in matrix_terms:
-            divisor_terms_dict[tuple(term)] = get_divisor_terms(term, divisor_var)
+        #The terms in the quotients of the vector basis when divided by x.
+        quotient_rows, quotients, quotient_values, last = get_divisor_terms(VB, divisor_var)
 
-        #A dictionary of terms to their quotient when divided by x.
-        term_divide_dict = dict()
-        for term in matrix_terms[-len(VB):]:
-            term_divide_dict[tuple(term)] = divide_term(term, inv_matrix_terms, inv_spot_dict, diag_reduction_dict,
-                                                          len(VB), divisor_terms_dict)
+        #Row i is the quotient of the i'th term in the vector basis when divided by x. Quotient terms
+        #outside of inv_matrix_terms are on the diagonal and get replaced by their reductions.
+        inv_spots = inv_index.spots(quotients)
+        on_diag = inv_spots < 0
+        term_divide = term_operator(quotient_rows[~on_diag], inv_spots[~on_diag], quotient_values[~on_diag],
+                                    (len(VB), len(inv_index))).toarray()
+        term_divide[:,-len(VB):] -= term_operator(quotient_rows[on_diag], diag_index[quotients[on_diag]],
+                                                  quotient_values[on_diag], (len(VB), len(diag_index))).dot(diag_reductions)
 
         #Builds the inv_matrix by dividing the rows of matrix by x.
-        for i in range(cuts[0]):
-            inv_matrix[i] = divide_row(matrix[i][-len(VB):], matrix_terms[-len(VB):], term_divide_dict, len(inv_matrix_terms))
-            spot = matrix_terms[i]
-            spot[divisor_var] -= 1
-            inv_matrix[i][inv_spot_dict[tuple(spot)]] += 1
+        inv_matrix = np.zeros([len(inverses),len(inv_matrix_terms)])
+        inv_matrix[:cuts[0]] = matrix[:cuts[0],-len(VB):].dot(term_divide)
+        spots = matrix_terms[:cuts[0]].copy()
+        spots[:,divisor_var] -= 1
+        inv_matrix[np.arange(cuts[0]), inv_index[spots]] += 1
 
         #Reduces the inv_matrix to solve for the y^k/x terms in the vector basis.
         Q,R = qr(inv_matrix)
 
         inv_solutions = np.hstack((np.eye(R.shape[0]),solve_triangular(R[:,:R.shape[0]], R[:,R.shape[0]:])))
 
-        #A dictionary of term in the vector basis to their spot in the vector basis.
-        VB_spot_dict = dict()
-        spot = 0
-        for row in VB:
-            VB_spot_dict[tuple(row)] = spot
-            spot+=1
-
-        #A dictionary of terms of type y^k/x to their reduction in the vector basis.
-        inv_reduction_dict = dict()
-        for i in range(len(inv_solutions)):
-            inv_reduction_dict[tuple(inv_matrix_terms[i])] = inv_solutions[i][len(inv_solutions):]
+        #The terms of type y^k/x and their reductions in the vector basis.
+        inv_reduction_index = MonomialIndex(inv_matrix_terms[:len(inv_solutions)])
+        inv_reductions = inv_solutions[:,len(inv_solutions):]
 
         #Builds the division matrix and finds the eigenvalues and eigenvectors.
-        division_matrix = build_division_matrix(VB, VB_spot_dict, diag_reduction_dict, inv_reduction_dict, divisor_terms_dict)
+        division_matrix = build_division_matrix(MonomialIndex(VB), diag_index, diag_reductions, inv_reduction_index,
+                                                inv_reductions, quotient_rows, quotients, quotient_values, last)
         #<---------end Chebyshev
     else:
         #--------->Power
-        basisDict = makeBasisDict(matrix, matrix_terms, VB)
-
-        #Dictionary of terms in the vector basis their spots in the matrix.
-        VBdict = {}
-        spot = 0
-        for row in VB:
-            VBdict[tuple(row)] = spot
-            spot+=1
+        basis_index, reductions = makeBasisIndex(matrix, matrix_terms, VB)
 
         # Build division matrix
+        terms = VB.copy()
+        terms[:,divisor_var] -= 1
+        spots = MonomialIndex(VB).spots(terms)
+        in_vb = spots >= 0
         division_matrix = np.zeros((len(VB), len(VB)))
-        for i in range(VB.shape[0]):
-            var = np.zeros(dim)
-            var[divisor_var] = 1
-            term = tuple(VB[i] - var)
-            if term in VBdict:
-                division_matrix[VBdict[term]][i] += 1
-            else:
-                division_matrix[:,i] -= basisDict[term]
+        division_matrix[spots[in_vb], np.where(in_vb)[0]] += 1
+        division_matrix[:,~in_vb] -= reductions[basis_index[terms[~in_vb]]].T
         #<----------end Power
         
     vals, vecs = eig(division_matrix.T)
@@ -189,11 +180,11 @@ def division(polys, get_divvar_coord_from_eigval = False, divisor_var = 0, tol =
                 root = root1
             else:
                 root = root2
-        if polish:
-            root = newton_polish(polys,root,tol = tol)
         zeros.append(root)
 
     zeros = np.array(zeros)
+    if polish and len(zeros) > 0:
+        zeros = newton_polish_batch(polys,zeros,tol = tol)
 
     #Checks that the algorithm finds the correct number of roots with Bezout's Theorem
     assert zeros.shape[0] <= max_number_of_roots,"Found too many roots" #Check if too many roots
@@ -203,7 +194,7 @@ def division(polys, get_divvar_coord_from_eigval = False, divisor_var = 0, tol =
     #    print("Number of Roots Lost:", max_number_of_roots - zeros.shape[0])
     return zeros
 
-def get_matrix_terms(poly_coeffs, dim, divisor_var, deg, include_divvar_squared=True):
+def get_matrix_terms(poly_coeffs, dim, divisor_var, deg, include_divvar_squared=True, terms=None):
     '''Finds the terms in the Macaulay matrix.
 
     Parameters
@@ -218,6 +209,8 @@ def get_matrix_terms(poly_coeffs, dim, divisor_var, deg, include_divvar_squared=
         Whether the divisor_var^2 (or T_2(divisor_var) for cheb division) term is included in the vector basis.
         Should be true if calculating divisor_var-coordinates from the eigenvector and not the eigenvalue
         Defaults to True
+    terms : numpy array
+        If given, the terms of the entries of the matrix, each row being a term, and poly_coeffs isn't used.
 
     Returns
     -----------
@@ -239,12 +232,17 @@ def get_matrix_terms(poly_coeffs, dim, divisor_var, deg, include_divvar_squared=
     """
     matrix_term_set_y= set()
     matrix_term_set_other= set()
-    for coeffs in poly_coeffs:
-        for term in zip(*np.where(coeffs != 0)):
-            if term[divisor_var] == 0:
-                matrix_term_set_y.add(term)
-            else:
-                matrix_term_set_other.add(term)
+    if terms is None:
+        terms = (term for coeffs in poly_coeffs for term in zip(*np.where(coeffs != 0)))
+    else:
+        big_shape = [deg+1]*dim
+        terms = np.unique(np.ravel_multi_index(tuple(terms.T), big_shape))
+        terms = map(tuple, np.column_stack(np.unravel_index(terms, big_shape)).tolist())
+    for term in terms:
+        if term[divisor_var] == 0:
+            matrix_term_set_y.add(term)
+        else:
+            matrix_term_set_other.add(term)
     try:
         base = np.zeros(dim, dtype = 'int')
         base[divisor_var] = 1
@@ -286,11 +284,10 @@ def get_matrix_terms(poly_coeffs, dim, divisor_var, deg, include_divvar_squared=
     matrix_terms = np.vstack((np.vstack(matrix_term_set_y),np.vstack(matrix_term_set_other),matrix_term_end))
     return matrix_terms, tuple([len(matrix_term_set_y), len(matrix_term_set_y)+len(matrix_term_set_other)])
 
-def makeBasisDict(matrix, matrix_terms, VB):
-    '''Calculates and returns the basisDict.
+def makeBasisIndex(matrix, matrix_terms, VB):
+    '''Finds the terms on the diagonal of the reduced Macaulay matrix and their reductions into the Vector Basis.
 
-    This is a dictionary of the terms on the diagonal of the reduced Macaulay matrix to the terms in the Vector Basis.
-    It is used to create the multiplication matrix in root_finder.
+    These are used to create the division matrix.
 
     Parameters
     --------
@@ -303,29 +300,58 @@ def makeBasisDict(matrix, matrix_terms, VB):
 
     Returns
     -----------
-    basisDict : dict
-        Maps terms on the diagonal of the reduced Macaulay matrix (tuples) to numpy arrays of the shape remainder_shape
-        that represent the terms reduction into the Vector Basis.
+    basis_index : MonomialIndex
+        The terms on the diagonal of the reduced Macaulay matrix that are needed.
+    reductions : numpy array
+        Row i represents the reduction of the i'th term of basis_index into the Vector Basis.
     '''
-    basisDict = {}
-    VBSet = set()
-    for i in VB:
-        VBSet.add(tuple(i))
-
     #We don't actually need most of the rows, so we only get the ones we need.
-    neededSpots = set()
-    for term, mon in itertools.product(VB,get_var_list(VB.shape[1])):
-        if tuple(term-mon) not in VBSet:
-            neededSpots.add(tuple(term-mon))
-
-    for i in range(matrix.shape[0]):
-        term = tuple(matrix_terms[i])
-        if term not in neededSpots:
-            continue
-        basisDict[term] = matrix[i][matrix.shape[0]:]
-    return basisDict
+    neededSpots = (VB[:,np.newaxis,:] - np.eye(VB.shape[1], dtype=int)).reshape(-1, VB.shape[1])
+    neededSpots = MonomialIndex(neededSpots[MonomialIndex(VB).spots(neededSpots) < 0])
+    rows = np.where(neededSpots.spots(matrix_terms[:matrix.shape[0]]) >= 0)[0]
+    return MonomialIndex(matrix_terms[rows]), matrix[rows, matrix.shape[0]:]
+
+def division_plan(degrees, dim, divisor_var, include_divvar_squared, power):
+    '''Finds the layout of the Macaulay matrix for division of polynomials with the given degrees.
+
+    The terms of the matrix are the ones get_matrix_terms finds when every coefficient of the polynomials
+    is nonzero. The layout is kept in the plan cache.
+
+    Parameters
+    ----------
+    degrees : list
+        The degree of each polynomial.
+    dim : int
+        The dimension of the polynomials.
+    divisor_var : int
+        What variable is being divided by. 0 is x, 1 is y, etc.
+    include_divvar_squared: bool
+        Whether the divisor_var^2 term is included in the vector basis. See get_matrix_terms.
+    power : bool
+        If True the polynomials are MultiPower, otherwise MultiCheb.
 
-def create_matrix(poly_coeffs, degree, dim, divisor_var, get_divvar_coord_from_eigval = False):
+    Returns
+    -------
+    plan : dict
+        The layout from macaulay_layout, with the cuts from get_matrix_terms.
+    '''
+    degrees = tuple(int(deg) for deg in degrees)
+    def build():
+        degree = sum(degrees) - len(degrees) + 1
+        polys = []
+        for deg in degrees:
+            coeff = np.zeros([deg+1]*dim)
+            coeff[tuple(np.array(mon_combos([0]*dim, deg)).T)] = 1
+            polys.append(MultiPower(coeff) if power else MultiCheb(coeff))
+        terms = macaulay_entries(degree, polys)[1]
+        matrix_terms, cuts = get_matrix_terms(None, dim, divisor_var, degree, include_divvar_squared, terms=terms)
+        plan = macaulay_layout(degrees, dim, power, matrix_terms)
+        plan['cuts'] = np.array(cuts)
+        return plan
+    key = ('division', degrees, dim, divisor_var, include_divvar_squared, 'MultiPower' if power else 'MultiCheb')
+    return plan_cache.get(key, build)
+
+def create_matrix(poly_coeffs, degree, dim, divisor_var, get_divvar_coord_from_eigval = False, sparse_matrix = False):
     ''' Builds a Macaulay matrix for reduction.
 
     Parameters
@@ -341,10 +367,12 @@ def create_matrix(poly_coeffs, degree, dim, divisor_var, get_divvar_coord_from_e
     get_divvar_coord_from_eigval: bool
         Whether the divisor_var-coordinate of the roots is calculated from the eigenvalue or eigenvector.
         More stable to use the eigenvector. Defaults to false
+    sparse_matrix : bool
+        If True the matrix is built and returned as a scipy csr matrix.
 
     Returns
     -------
-    matrix : 2D numpy array
+    matrix : 2D numpy array or scipy csr matrix
         The Macaulay matrix.
     matrix_terms : numpy array
         The ith row is the term represented by the ith column of the matrix.
@@ -352,161 +380,103 @@ def create_matrix(poly_coeffs, degree, dim, divisor_var, get_divvar_coord_from_e
         When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
         where those cuts happen.
     '''
-    bigShape = [degree+1]*dim
-
     #If you get_divvar_coord_from_eigval, then you should not include_divvar_squared in the basis, and vice versa
     include_divvar_squared = not get_divvar_coord_from_eigval
 
     matrix_terms, cuts = get_matrix_terms(poly_coeffs, dim, divisor_var, degree, include_divvar_squared)
 
-    #Get the slices needed to pull the matrix_terms from the coeff matrix.
-    matrix_term_indexes = list()
-    for row in matrix_terms.T:
-        matrix_term_indexes.append(row)
-
-    #Adds the poly_coeffs to flat_polys, using added_zeros to make sure every term is in there.
-    added_zeros = np.zeros(bigShape)
-    flat_polys = list()
-    for coeff in poly_coeffs:
-        slices = slice_top(coeff)
-        added_zeros[slices] = coeff
-        flat_polys.append(added_zeros[matrix_term_indexes])
-        added_zeros[slices] = np.zeros_like(coeff)
-        coeff = 0
-    poly_coeffs = 0
-
-    #Make the matrix. Reshape is faster than stacking.
-    matrix = np.reshape(flat_polys, (len(flat_polys),len(matrix_terms)))
-
-    #Sorts the rows of the matrix so it is close to upper triangular.
-    matrix = row_swap_matrix(matrix)
+    matrix = macaulay_matrix(poly_coeffs, matrix_terms, sparse_matrix=sparse_matrix)
     return matrix, matrix_terms, cuts
 
-def divide_row(coeffs, terms, term_divide_dict, length):
-    """Divides a row of the matrix by the divisor variable..
-
-    Parameters
-    ----------
-    coeffs : numpy array.
-        The numerical values of the terms we want to divide by x.
-    terms: numpy array
-        The terms corresponding to the numerical values.
-    term_divide_dict: dictionary
-        Maps each term as a tuple to a numpy array representing that term divided by x.
-    length : int
-        The length of the rows in the inv_matrix.
-    Returns
-    -------
-    new_row : numpy array
-        The row we get in the inverse_matrix by dividing the first row by x.
-    """
-    new_row = np.zeros(length)
-    for i in range(len(coeffs)):
-        new_row+=coeffs[i]*term_divide_dict[tuple(terms[i])]
-    return new_row
+def get_divisor_terms(terms, divisor_var):
+    """Finds the quotients of Chebyshev terms when divided by the divisor variable.
 
-def divide_term(term, inv_matrix_terms, inv_spot_dict, diag_reduction_dict, VB_size, divisor_terms_dict):
-    """Divides a term of the matrix by the divisor variable.
+    T_n(x)/x = 2T_{n-1}(x) - 2T_{n-3}(x) + ... ending with +-T_0(x) if n is odd or +-1/x if n is even.
+    An exponent of -1 represents 1/x.
 
     Parameters
     ----------
-    term: numpy array
-        The term to divide.
-    inv_matrix_terms: numpy array
-        The terms in the inverse matrix.
-    inv_spot_dict : dictionary
-        A dictionary of term in inv_matrix_terms to their spot in inv_matrix_terms.
-    diag_reduction_dict : dictionary
-        A dictionary of terms on the diagonal to their reduction in the vector basis.
-    VB_size : int
-        The number of elements in the vector basis.
-    divisor_terms_dict : dictionary
-        A dictionary of terms to the terms in their dividend when divided by x.
+    terms: numpy array
+        Each row is a term to divide.
+    divisor_var : int
+        What variable is being divided by. 0 is x, 1 is y, etc.
 
     Returns
     -------
-    row : numpy array
-        The row we get in the inverse_matrix by dividing the term by x.
+    rows : numpy array
+        The term each entry of the quotients comes from.
+    quotients : numpy array
+        Each row is a term in a quotient.
+    values : numpy array
+        The coefficient of each term in the quotients.
+    last : numpy array
+        True for the last term of each quotient.
     """
-    row = np.zeros(len(inv_matrix_terms))
-    divisor_terms = divisor_terms_dict[tuple(term)]
-    parity = 1
-    for spot in divisor_terms[:-1]:
-        if tuple(spot) in inv_spot_dict:
-            row[inv_spot_dict[tuple(spot)]] += parity*2
-        else:
-            row[-VB_size:] -= 2*parity*diag_reduction_dict[tuple(spot)]
-        parity*=-1
-    spot = divisor_terms[-1]
-    if tuple(spot) in inv_spot_dict:
-        row[inv_spot_dict[tuple(spot)]] += parity
-    else:
-        row[-VB_size:] -= parity*diag_reduction_dict[tuple(spot)]
-    return row
-
-def get_divisor_terms(term, divisor_var):
-    """Finds the terms that will be present when dividing a given term by x.
+    terms = np.asarray(terms, dtype=int)
+    counts = terms[:,divisor_var]//2+1
+    rows = np.repeat(np.arange(len(terms)), counts)
+    steps = np.arange(len(rows)) - np.repeat(np.cumsum(counts)-counts, counts)
+    quotients = terms[rows]
+    quotients[:,divisor_var] -= 2*steps+1
+    last = steps == counts[rows]-1
+    values = np.where(steps%2, -1., 1.)*np.where(last, 1., 2.)
+    return rows, quotients, values, last
+
+def term_operator(rows, cols, values, shape):
+    """Builds the sparse matrix with the given entries, adding up repeated entries.
 
     Parameters
     ----------
-    term: numpy array
-        The term to divide.
+    rows : numpy array
+        The row of each entry.
+    cols : numpy array
+        The column of each entry.
+    values : numpy array
+        The value of each entry.
+    shape : tuple
+        The shape of the matrix.
 
     Returns
     -------
-    terms : numpy array
-        Each row is a term that will be in the quotient.
-    divisor_var : int
-        What variable is being divided by. 0 is x, 1 is y, etc.
+    operator : scipy csr matrix
+        The sparse matrix.
     """
-    dim = len(term)
-    diff = np.zeros(dim)
-    diff[divisor_var] = 1
-    initial = term - diff
-    height = term[divisor_var]//2+1
-    terms = np.vstack([initial.copy() for i in range(height)])
-    dec = 0
-    for i in range(terms.shape[0]):
-        terms[i][divisor_var]-=2*dec
-        dec+=1
-    return terms
-
-def build_division_matrix(VB, VB_spot_dict, diag_reduction_dict, inv_reduction_dict, divisor_terms_dict):
+    return sparse.csr_matrix((values, (rows, cols)), shape=shape)
+
+def build_division_matrix(VB_index, diag_index, diag_reductions, inv_index, inv_reductions, rows, quotients, values, last):
     """Builds the division matrix.
 
     Parameters
     ----------
-    VB: numpy array
-        The vector basis.
-    VB_spot_dict : dictionary
-        A dictionary of term in the vector basis to their spot in the vector basis.
-    diag_reduction_dict : dictionary
-        A dictionary of terms on the diagonal to their reduction in the vector basis.
-    inv_reduction_dict : dictionary
-        A dictionary of terms of type y^k/x to their reduction in the vector basis.
-    divisor_terms_dict : dictionary
-        A dictionary of terms to the terms in their dividend when divided by x.
+    VB_index : MonomialIndex
+        The terms in the vector basis.
+    diag_index : MonomialIndex
+        The terms on the diagonal.
+    diag_reductions : numpy array
+        Row i is the reduction of the i'th term of diag_index in the vector basis.
+    inv_index : MonomialIndex
+        The terms of type y^k/x.
+    inv_reductions : numpy array
+        Row i is the reduction of the i'th term of inv_index in the vector basis.
+    rows, quotients, values, last : numpy arrays
+        The quotients of the vector basis when divided by x, from get_divisor_terms.
 
     Returns
     -------
-    row : numpy array
-        The row we get in the inverse_matrix by dividing the term by x.
+    div_matrix : numpy array
+        The division matrix.
     """
-
-    div_matrix = np.zeros((len(VB), len(VB)))
-    for i in range(len(VB)):
-        term = VB[i]
-        terms = divisor_terms_dict[tuple(term)]
-        parity = 1
-        for spot in terms[:-1]:
-            if tuple(spot) in VB_spot_dict:
-                div_matrix[VB_spot_dict[tuple(spot)]][i]+=2*parity
-            else:
-                div_matrix[:,i] -= 2*parity*diag_reduction_dict[tuple(spot)][-len(VB):]
-            parity *= -1
-        spot = terms[-1]
-        if tuple(spot) in diag_reduction_dict:
-            div_matrix[:,i] -= parity*diag_reduction_dict[tuple(spot)][-len(VB):]
-        else:
-            div_matrix[:,i] -= parity*inv_reduction_dict[tuple(spot)]
+    size = len(VB_index)
+    #All but the last term of each quotient are either in the vector basis or on the diagonal.
+    #The last term is either on the diagonal or of type y^k/x.
+    VB_spots = np.where(last, -1, VB_index.spots(quotients))
+    in_VB = VB_spots >= 0
+    inv = last & (diag_index.spots(quotients) < 0)
+    on_diag = ~in_VB & ~inv
+
+    div_matrix = term_operator(VB_spots[in_VB], rows[in_VB], values[in_VB], (size, size)).toarray()
+    div_matrix -= term_operator(rows[on_diag], diag_index[quotients[on_diag]], values[on_diag],
+                                (size, len(diag_index))).dot(diag_reductions).T
+    div_matrix -= term_operator(rows[inv], inv_index[quotients[inv]], values[inv],
+                                (size, len(inv_index))).dot(inv_reductions).T
     return div_matrix
@@ -1,10 +1,12 @@
 import numpy as np
 import itertools
-from scipy.linalg import qr, solve_triangular, qr_multiply
+from scipy.linalg import qr, solve_triangular, qr_multiply, get_lapack_funcs
+from scipy import sparse
 from numalgsolve.polynomial import Polynomial, MultiCheb, MultiPower
-from numalgsolve.utils import row_swap_matrix, MacaulayError, slice_top, mon_combos, \
+from numalgsolve.utils import row_swap_matrix, MacaulayError, slice_top, mon_combos, mon_combosHighest, \
                               num_mons_full, memoized_all_permutations, mons_ordered, \
-                              all_permutations_cheb
+                              all_permutations_cheb, mon_mult_entries, sorted_matrix_terms, \
+                              macaulay_matrix, PlanCache, sparse_row_extents
 
 def add_polys(degree, poly, poly_coeff_list):
     """Adds polynomials to a Macaulay Matrix.
@@ -37,6 +39,53 @@ def add_polys(degree, poly, poly_coeff_list):
         poly_coeff_list.append(poly.mon_mult(mon, returnType = 'Matrix'))
     return poly_coeff_list
 
+def macaulay_entries(degree, polys, layer=False):
+    """Finds the nonzero entries of the rows add_polys would make, without making any coefficient tensors.
+
+    The nonzero coefficients of each polynomial are moved straight to where they land in each
+    monomial multiple, see utils.mon_mult_entries, so there is no list of dense tensors.
+
+    Parameters
+    ----------
+    degree : int
+        The degree of the Macaulay Matrix
+    polys : list
+        The polynomials used to make the matrix, in the order of their rows.
+    layer : bool
+        If True only the monomial multiples whose degree is exactly degree are made. These are the rows
+        the Macaulay matrix of this degree has that the one of the degree below it doesn't.
+
+    Returns
+    -------
+    rows : numpy array
+        The row of each entry, in the same order as calling add_polys on each polynomial.
+    terms : 2D numpy array
+        The term of each entry. Entries of Chebyshev polynomials can land on the same row and term,
+        and are added up when they go in the matrix.
+    values : numpy array
+        The value of each entry.
+    num_rows : int
+        The number of rows.
+    """
+    dim = polys[0].dim
+    rows, terms, values = [], [], []
+    num_rows = 0
+    for poly in polys:
+        spots = np.nonzero(poly.coeff)
+        if layer:
+            mons = np.array(mon_combosHighest([0]*dim, degree - poly.degree)).reshape(-1, dim)
+        else:
+            mons = np.array(mon_combos([0]*dim, degree - poly.degree)).reshape(-1, dim)
+        mon_spots, term_spots, products, weights = mon_mult_entries(np.column_stack(spots), mons,
+                                                                     isinstance(poly, MultiPower))
+        rows.append(num_rows + mon_spots)
+        terms.append(products)
+        values.append(poly.coeff[spots][term_spots]*weights)
+        num_rows += len(mons)
+    rows, terms = np.concatenate(rows), np.vstack(terms)
+    values = np.concatenate(values).astype(np.result_type(float, *[poly.coeff for poly in polys]))
+    return rows, terms, values, num_rows
+
 def find_degree(poly_list, verbose=False):
     '''Finds the appropriate degree for the Macaulay Matrix.
 
@@ -55,87 +104,477 @@ def find_degree(poly_list, verbose=False):
         print('Degree of Macaulay Matrix:', sum(poly.degree for poly in poly_list) - len(poly_list) + 1)
     return sum(poly.degree for poly in poly_list) - len(poly_list) + 1
 
-def rrqr_reduceMacaulay(matrix, matrix_terms, cuts, number_of_roots, accuracy = 1.e-10):
+def householder_qr(block, pivoting=False, overwrite_a=False):
+    '''Finds the QR decomposition of a block of a matrix with LAPACK, leaving Q as Householder reflectors.
+
+    Parameters
+    ----------
+    block : numpy array
+        The block to decompose. It is copied once into fortran order, and that copy is overwritten.
+    pivoting : bool
+        Whether to use column pivoting.
+    overwrite_a : bool
+        Whether the block can be overwritten. If it is already in fortran order it isn't copied, and
+        the reflectors are written in it.
+    Returns
+    -------
+    reflectors : numpy array
+        R is in the upper triangle and the Householder reflectors that make up Q are below it.
+    tau : numpy array
+        The scalar factors of the reflectors.
+    P : numpy array
+        The column permutation, only returned if pivoting is True.
+    '''
+    block = np.array(block, order='F', copy=not overwrite_a)
+    #The workspace queries don't touch the block, so it isn't copied again for them.
+    if pivoting:
+        geqp3, = get_lapack_funcs(('geqp3',), (block,))
+        lwork = int(np.real(geqp3(block, lwork=-1, overwrite_a=True)[3][0]))
+        reflectors, jpvt, tau, work, info = geqp3(block, lwork=lwork, overwrite_a=True)
+        if info < 0:
+            raise ValueError('illegal value in argument {} of geqp3'.format(-info))
+        return reflectors, tau, jpvt - 1
+    geqrf, = get_lapack_funcs(('geqrf',), (block,))
+    lwork = int(np.real(geqrf(block, lwork=-1, overwrite_a=True)[2][0]))
+    reflectors, tau, work, info = geqrf(block, lwork=lwork, overwrite_a=True)
+    if info < 0:
+        raise ValueError('illegal value in argument {} of geqrf'.format(-info))
+    return reflectors, tau
+
+def block_length(length, bytes_per_slice, max_memory=None):
+    '''How many rows or columns of a matrix fit in max_memory bytes, at least one and at most all of them.
+
+    Parameters
+    ----------
+    length : int
+        How many rows or columns there are.
+    bytes_per_slice : int
+        How many bytes one of them takes.
+    max_memory : int
+        The most bytes to use. None uses all of them at once.
+
+    Returns
+    -------
+    block_length : int
+        How many to handle at once.
+    '''
+    if max_memory is None:
+        return max(length, 1)
+    return int(min(max(length, 1), max(1, max_memory // max(bytes_per_slice, 1))))
+
+def row_extents(matrix, max_memory=None):
+    '''Finds the first column and one past the last column each row of a matrix is nonzero in.
+
+    The matrix is read a block of rows at a time, so an np.memmap is never loaded whole.
+
+    Parameters
+    ----------
+    matrix : numpy array
+        The matrix.
+    max_memory : int
+        About how many bytes to use for the block of rows. None reads the whole matrix at once.
+
+    Returns
+    -------
+    leading : numpy array
+        The first nonzero column of each row, or the number of columns for rows of zeros.
+    ending : numpy array
+        One past the last nonzero column of each row, or 0 for rows of zeros.
+    '''
+    num_rows, num_cols = matrix.shape
+    leading = np.full(num_rows, num_cols, dtype=int)
+    ending = np.zeros(num_rows, dtype=int)
+    #The comparison makes a boolean, and the reversed argmax a copy of it.
+    block_rows = block_length(num_rows, 2*num_cols, max_memory)
+    for start in range(0, num_rows, block_rows):
+        nonzero = matrix[start:start+block_rows] != 0
+        nonempty = nonzero.any(axis=1)
+        leading[start:start+block_rows] = np.where(nonempty, nonzero.argmax(axis=1), num_cols)
+        ending[start:start+block_rows] = np.where(nonempty, num_cols - nonzero[:,::-1].argmax(axis=1), 0)
+    return leading, ending
+
+def permute_rows(matrix, order):
+    '''Reorders the rows of a matrix in place, so row i becomes what was row order[i].
+
+    The rows are moved one at a time along the cycles of the permutation, so only one row is
+    ever copied, and an np.memmap stays on disk.
+
+    Parameters
+    ----------
+    matrix : numpy array
+        The matrix to reorder.
+    order : numpy array
+        The permutation of the rows.
+    '''
+    placed = order == np.arange(len(order))
+    for first in np.flatnonzero(~placed):
+        if placed[first]:
+            continue
+        saved = np.array(matrix[first])
+        row = first
+        while order[row] != first:
+            matrix[row] = matrix[order[row]]
+            placed[row] = True
+            row = order[row]
+        matrix[row] = saved
+        placed[row] = True
+
+def store_triu(matrix, reflectors, max_memory=None):
+    '''Writes the upper triangle of the reflectors from householder_qr into a matrix, and zeros below it.
+
+    The upper triangle is taken a block of columns at a time instead of copying the reflectors whole.
+
+    Parameters
+    ----------
+    matrix : numpy array
+        Where R goes. It has the shape of the reflectors.
+    reflectors : numpy array
+        The reflectors from householder_qr.
+    max_memory : int
+        About how many bytes to use for the block of columns. None takes them all at once.
+    '''
+    num_rows, num_cols = reflectors.shape
+    block_cols = block_length(num_cols, num_rows*reflectors.itemsize, max_memory)
+    for start in range(0, num_cols, block_cols):
+        matrix[:,start:start+block_cols] = np.triu(reflectors[:,start:start+block_cols], -start)
+
+def apply_householder_qt(reflectors, tau, matrix, max_memory=None):
+    '''Multiplies a matrix in place by Q.T, where Q is given by Householder reflectors from householder_qr.
+
+    The matrix is handled a block of columns at a time, so Q is never formed and only one block
+    is copied at once. The matrix can be a view or an np.memmap, in which case the results are
+    written straight back to it.
+
+    Parameters
+    ----------
+    reflectors : numpy array
+        The Householder reflectors.
+    tau : numpy array
+        The scalar factors of the reflectors.
+    matrix : numpy array
+        The matrix to multiply. It must have as many rows as the reflectors.
+    max_memory : int
+        The most bytes to use for the block of columns. Defaults to None, which does all the columns at once.
+    '''
+    num_rows, num_cols = matrix.shape
+    if num_cols == 0 or len(tau) == 0:
+        return
+    reflectors = reflectors[:,:len(tau)]
+    if np.iscomplexobj(reflectors) or np.iscomplexobj(matrix):
+        name, trans = 'unmqr', 'C'
+    else:
+        name, trans = 'ormqr', 'T'
+    ormqr, = get_lapack_funcs((name,), (reflectors, matrix[:1,:1]))
+
+    block_cols = block_length(num_cols, num_rows*matrix.itemsize, max_memory)
+    lwork = int(np.real(ormqr('L', trans, reflectors, tau, np.zeros((num_rows, block_cols), order='F', dtype=matrix.dtype), -1)[1][0]))
+    for start in range(0, num_cols, block_cols):
+        block = np.array(matrix[:,start:start+block_cols], order='F', dtype=np.result_type(reflectors, matrix))
+        block, work, info = ormqr('L', trans, reflectors, tau, block, lwork, overwrite_c=True)
+        if info < 0:
+            raise ValueError('illegal value in argument {} of {}'.format(-info, name))
+        matrix[:,start:start+block_cols] = block
+
+def staircase_qr(matrix, cut, panel_width=64, max_memory=None):
+    '''Reduces the first columns of a Macaulay matrix to upper triangular form in place with Householder QR.
+
+    The rows of a Macaulay matrix sorted by row_swap_matrix form a staircase: each row starts at or
+    after the column the row above it starts at, and ends a little after it starts, since it is a
+    monomial multiple of one polynomial. The columns are reduced a panel at a time. A panel is factored
+    using only the rows that can be nonzero in it, which are the rows not yet finished down to the last
+    row starting in the panel, and its reflectors are only applied to those rows up to the last column
+    any of them is nonzero in. So the cost follows the nonzero band of the matrix instead of its full size.
+    The result is the R and Q.T times the rest of the matrix of the dense QR, up to the signs of the rows.
+
+    Parameters
+    ----------
+    matrix : numpy array
+        The Macaulay matrix, sorted by row_swap_matrix. It can be an np.memmap.
+    cut : int
+        How many of the first columns to reduce.
+    panel_width : int
+        How many columns are reduced at once.
+    max_memory : int
+        About how many bytes to use for the blocks of rows and columns the matrix is read in.
+        See row_extents and apply_householder_qt.
+
+    Returns
+    -------
+    matrix : numpy array
+        The matrix, with R in its first cut columns and the rest of it multiplied by Q.T.
+    '''
+    leading, ending = row_extents(matrix, max_memory)
+
+    for start in range(0, cut, panel_width):
+        stop = min(start + panel_width, cut)
+        starting_rows = np.flatnonzero(leading < stop)
+        if len(starting_rows) == 0 or starting_rows[-1] < start:
+            #Nothing is left in these columns, so R1 isn't full rank.
+            continue
+        bottom = starting_rows[-1] + 1
+        end = max(stop, ending[start:bottom].max())
+        reflectors, tau = householder_qr(matrix[start:bottom,start:stop])
+        matrix[start:bottom,start:stop] = np.triu(reflectors)
+        apply_householder_qt(reflectors, tau, matrix[start:bottom,stop:end], max_memory)
+        #The reflectors mix the rows, so they all end where the longest one did.
+        ending[start:bottom] = end
+    return matrix
+
+def rrqr_reduceMacaulay(matrix, matrix_terms, cuts, number_of_roots, accuracy = 1.e-10, max_memory = None):
     ''' Reduces a Macaulay matrix, BYU style.
 
     The matrix is split into the shape
     A B C
     D E F
     Where A is square and contains all the highest terms, and C contains all the x,y,z etc. terms. The lengths
-    are determined by the matrix_shape_stuff tuple. First A and D are reduced using rrqr without pivoting, and then the rest of
+    are determined by the cuts tuple. First A and D are reduced using rrqr without pivoting, and then the rest of
     the matrix is multiplied by Q.T to change it accordingly. Then E is reduced by rrqr with pivoting, the rows of B are shifted
     accordingly, and F is multipled by Q.T to change it accordingly. This is all done in place to save memory.
+    Q is never formed. It is kept as the Householder reflectors LAPACK makes, and they are applied
+    to the rest of the matrix a block of columns at a time.
+
+    If the matrix takes more than max_memory bytes it is reduced out of core, so it can be an np.memmap.
+    Then the matrix is only read and written in blocks of about max_memory bytes, the panels of A and D,
+    and the rows are sorted in place. The pivoted QR of E still needs E in memory, so E has to fit.
+    It is wider than it is tall, since the matrix has more columns than rows, so reducing it without
+    pivoting first wouldn't make it smaller.
 
     Parameters
     ----------
-    matrix : numpy array.
-        The Macaulay matrix, sorted in BYU style.
+    matrix : numpy array or scipy sparse matrix
+        The Macaulay matrix, sorted in BYU style. It can be an np.memmap for matrices that don't fit in memory.
+        A sparse matrix is reduced by rrqr_reduceMacaulaySparse, which only makes the blocks it factors dense.
     matrix_terms: numpy array
         Each row of the array contains a term in the matrix. The i'th row corresponds to
         the i'th column in the matrix.
     cuts : tuple
         When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
         where those cuts happen.
+    max_memory : int
+        About how many bytes of working memory to use on top of the matrix. Defaults to None, which
+        reduces the matrix in memory.
     Returns
     -------
     matrix : numpy array
-        The reduced matrix.
+        The reduced matrix. When reduced out of core, it is a view of the matrix passed in.
     matrix_terms: numpy array
         The resorted matrix_terms.
-    '''    
-    #print("Starting matrix.shape:\n", matrix.shape)
-    #RRQR reduces A and D without pivoting sticking the result in it's place.
-    Q1,matrix[:,:cuts[0]] = qr(matrix[:,:cuts[0]])
-    
+    '''
+    if sparse.issparse(matrix):
+        return rrqr_reduceMacaulaySparse(matrix, matrix_terms, cuts, number_of_roots, accuracy=accuracy,
+                                         max_memory=max_memory)
+    out_of_core = max_memory is not None and matrix.nbytes > max_memory
+
+    #RRQR reduces A and D without pivoting sticking the result in it's place, and multiplies the rest
+    #of the matrix by Q.T, following the staircase of the rows.
+    matrix = staircase_qr(matrix, cuts[0], max_memory=max_memory)
+
     #check if there are zeros along the diagonal of R1
     if any(np.isclose(np.diag(matrix[:,:cuts[0]]),0, atol=accuracy)):
         raise MacaulayError("R1 IS NOT FULL RANK")
 
-    #Looks like 0 but not, add to the rank.
-    #still_good = np.sum(np.abs(matrix[:,:cuts[0]].diagonal()) < accuracy)
-    #if abs(matrix[:,:cuts[0]].diagonal()[-1]) < accuracy:
-    #    print(matrix[:,:cuts[0]].diagonal())
-    #    raise MacaulayError("HIGHEST NOT FULL RANK")
-
-    #Multiplying the rest of the matrix by Q.T
-    matrix[:,cuts[0]:] = Q1.T@matrix[:,cuts[0]:]
-    Q1 = 0 #Get rid of Q1 for memory purposes.
-
     #RRQR reduces E sticking the result in it's place.
-    Q,matrix[cuts[0]:,cuts[0]:cuts[1]],P = qr(matrix[cuts[0]:,cuts[0]:cuts[1]], pivoting = True)
+    if matrix[cuts[0]:,cuts[0]:cuts[1]].size > 0:
+        reflectors, tau, P = householder_qr(matrix[cuts[0]:,cuts[0]:cuts[1]], pivoting = True)
+        store_triu(matrix[cuts[0]:,cuts[0]:cuts[1]], reflectors, max_memory)
 
-    #Multiplies F by Q.T.
-    matrix[cuts[0]:,cuts[1]:] = Q.T@matrix[cuts[0]:,cuts[1]:]
-    Q = 0 #Get rid of Q for memory purposes.
+        #Multiplies F by Q.T.
+        apply_householder_qt(reflectors, tau, matrix[cuts[0]:,cuts[1]:], max_memory)
+        reflectors, tau = 0, 0
+    else:
+        P = np.arange(cuts[1]-cuts[0])
 
     #Shifts the columns of B
-    matrix[:cuts[0],cuts[0]:cuts[1]] = matrix[:cuts[0],cuts[0]:cuts[1]][:,P]
-
-    #Checks for 0 rows and gets rid of them.
-    #rank = np.sum(np.abs(matrix.diagonal())>accuracy) + still_good
-    #matrix = matrix[:rank]
+    block_rows = block_length(cuts[0], (cuts[1]-cuts[0])*matrix.itemsize, max_memory)
+    for start in range(0, cuts[0], block_rows):
+        stop = min(start + block_rows, cuts[0])
+        matrix[start:stop,cuts[0]:cuts[1]] = matrix[start:stop,cuts[0]:cuts[1]][:,P]
 
     #eliminates rows we don't care about-- those at the bottom of the matrix
     #since the top corner is a square identity matrix, useful_rows + number_of_roots is the width of the Macaulay matrix
-    matrix = row_swap_matrix(matrix)
+    order = np.argsort(row_extents(matrix, max_memory)[0])
+    if out_of_core:
+        permute_rows(matrix, order)
+    else:
+        matrix = matrix[order]
     for row in matrix[::-1]:
         if np.allclose(row, 0):
             matrix = matrix[:-1]
         else:
             break
-    #print("Final matrix.shape:\n", matrix.shape)
-    #useful_rows = matrix.shape[1] - number_of_roots
-    #matrix = matrix[:useful_rows,:]
 
     #set very small values in the matrix to zero before backsolving
-    matrix[np.isclose(matrix, 0, atol=accuracy)] = 0
+    block_rows = block_length(matrix.shape[0], matrix.shape[1]*matrix.itemsize, max_memory)
+    for start in range(0, matrix.shape[0], block_rows):
+        block = matrix[start:start+block_rows]
+        block[np.isclose(block, 0, atol=accuracy)] = 0
 
     #Resorts the matrix_terms.
     matrix_terms[cuts[0]:cuts[1]] = matrix_terms[cuts[0]:cuts[1]][P]
-    #print("Macaulay1Rank:", np.sum(np.abs(matrix.diagonal())>accuracy))    
-    
+
     return matrix, matrix_terms
 
+def rrqr_reduceMacaulaySparse(matrix, matrix_terms, cuts, number_of_roots, accuracy = 1.e-10, max_memory = None):
+    ''' Reduces a sparse Macaulay matrix like rrqr_reduceMacaulay, only making dense the blocks it factors.
+
+    The matrix is split into the shape
+    A B C
+    D E F
+    like in rrqr_reduceMacaulay. Only the rows with entries in the highest terms are nonzero in A, so
+    just those rows are made dense for the QR of A. The other rows are zero in A and D, so only their
+    columns of E and F are made dense, under the rows of E and F that the QR of A leaves. The columns of
+    A are never made dense for those rows, and neither is the whole matrix. E and F are still dense for
+    the pivoted QR of E, which is done in place, and so is the reduced matrix that is returned.
+
+    Parameters
+    ----------
+    matrix : scipy sparse matrix
+        The Macaulay matrix.
+    matrix_terms: numpy array
+        Each row of the array contains a term in the matrix. The i'th row corresponds to
+        the i'th column in the matrix.
+    cuts : tuple
+        When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
+        where those cuts happen.
+    max_memory : int
+        About how many bytes to use for the blocks of columns the reflectors are applied to.
+        See staircase_qr and apply_householder_qt.
+    Returns
+    -------
+    matrix : numpy array
+        The reduced matrix.
+    matrix_terms: numpy array
+        The resorted matrix_terms.
+    '''
+    matrix = matrix.tocsr()
+    leading = sparse_row_extents(matrix)[0]
+    top_rows = np.flatnonzero(leading < cuts[0])
+    top_rows = top_rows[np.argsort(leading[top_rows], kind='mergesort')]
+    if len(top_rows) < cuts[0]:
+        raise MacaulayError("R1 IS NOT FULL RANK")
+
+    #RRQR reduces A without pivoting sticking the result in it's place, and multiplies the rest of its
+    #rows by Q.T, following the staircase of the rows.
+    upper = staircase_qr(matrix[top_rows].toarray(), cuts[0], max_memory=max_memory)
+    if any(np.isclose(np.diag(upper[:,:cuts[0]]), 0, atol=accuracy)):
+        raise MacaulayError("R1 IS NOT FULL RANK")
+
+    #The rows the QR of A leaves go on top of the E and F columns of the rows that are zero in A.
+    extra = len(top_rows) - cuts[0]
+    bottom_rows = np.flatnonzero(leading >= cuts[0])
+    #It is in fortran order so E can be factored in place.
+    rest = np.zeros((extra + len(bottom_rows), matrix.shape[1] - cuts[0]), dtype=upper.dtype, order='F')
+    rest[:extra] = upper[cuts[0]:,cuts[0]:]
+    upper = upper[:cuts[0]].copy()
+    bottom = matrix[bottom_rows][:,cuts[0]:].tocoo()
+    rest[extra + bottom.row, bottom.col] = bottom.data
+    bottom = None
+
+    #RRQR reduces E in it's place, multiplies F by Q.T, and then zeros the reflectors under R.
+    width = cuts[1] - cuts[0]
+    if rest[:,:width].size > 0:
+        reflectors, tau, P = householder_qr(rest[:,:width], pivoting = True, overwrite_a = True)
+        apply_householder_qt(reflectors, tau, rest[:,width:], max_memory)
+        store_triu(rest[:,:width], reflectors, max_memory)
+        reflectors, tau = 0, 0
+    else:
+        P = np.arange(width)
+
+    #Shifts the columns of B
+    upper[:,cuts[0]:cuts[1]] = upper[:,cuts[0]:cuts[1]][:,P]
+
+    #eliminates the rows of zeros and sorts the rest, like rrqr_reduceMacaulay, a block of rows at a time
+    #so no copy of the whole block is made.
+    zero_rows = np.zeros(len(rest), dtype=bool)
+    block_rows = 64 if max_memory is None else block_length(len(rest), rest.shape[1]*rest.itemsize, max_memory)
+    for start in range(0, len(rest), block_rows):
+        zero_rows[start:start+block_rows] = np.all(np.isclose(rest[start:start+block_rows], 0), axis=1)
+    order = np.flatnonzero(~zero_rows)
+    order = order[np.argsort(row_extents(rest, max_memory)[0][order])]
+
+    reduced = np.zeros((cuts[0] + len(order), len(matrix_terms)), dtype=upper.dtype)
+    reduced[:cuts[0]] = upper
+    upper = None
+    for start in range(0, len(order), block_rows):
+        reduced[cuts[0]+start:cuts[0]+start+block_rows,cuts[0]:] = rest[order[start:start+block_rows]]
+    rest = None
+
+    #set very small values in the matrix to zero before backsolving
+    for start in range(0, len(reduced), block_rows):
+        block = reduced[start:start+block_rows]
+        block[np.isclose(block, 0, atol=accuracy)] = 0
+
+    #Resorts the matrix_terms.
+    matrix_terms[cuts[0]:cuts[1]] = matrix_terms[cuts[0]:cuts[1]][P]
+
+    return reduced, matrix_terms
+
+def rrqr_reduceMacaulayDeficient(matrix, matrix_terms, cuts, accuracy = 1.e-10, max_memory = None):
+    ''' Reduces a Macaulay matrix whose highest terms don't have to be full rank, BYU style.
+
+    The matrix is split into the shape
+    A B C
+    D E F
+    like in rrqr_reduceMacaulay, but the columns of A and E are reduced a degree at a time with pivoting,
+    from the highest degree down. The columns that aren't pivots go to the end with C, so they are in
+    the vector basis, and they are of as low a degree as they can be. Highest terms aren't pivots when
+    the matrix doesn't have enough rows for them, or when the polynomials have roots at infinity.
+
+    Parameters
+    ----------
+    matrix : numpy array.
+        The Macaulay matrix, sorted in BYU style.
+    matrix_terms: numpy array
+        Each row of the array contains a term in the matrix. The i'th row corresponds to
+        the i'th column in the matrix. The terms before cuts[1] are sorted by descending degree.
+    cuts : tuple
+        When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
+        where those cuts happen.
+    accuracy : float
+        How small a diagonal entry of R has to be to not be a pivot.
+    max_memory : int
+        About how many bytes to use for the blocks of columns the reflectors are applied to.
+        See apply_householder_qt.
+    Returns
+    -------
+    matrix : numpy array
+        The reduced matrix. It has a row for each pivot, and the pivots are its first columns.
+    matrix_terms: numpy array
+        The resorted matrix_terms.
+
+    Raises
+    ------
+    MacaulayError
+        If the terms of C aren't independent, so they can't all be in the vector basis.
+    '''
+    degrees = np.sum(matrix_terms[:cuts[1]], axis=1)
+    layers = np.concatenate([[0], np.flatnonzero(np.diff(degrees)) + 1, [cuts[1]]])
+    pivots, others = [], []
+    top = 0
+    for start, stop in zip(layers[:-1], layers[1:]):
+        if matrix[top:,start:stop].size == 0:
+            others.append(np.arange(start, stop))
+            continue
+        #RRQR reduces the layer below the rows that are already pivots, and multiplies the rest by Q.T.
+        reflectors, tau, P = householder_qr(matrix[top:,start:stop], pivoting = True)
+        rank = int(np.sum(~np.isclose(np.diag(reflectors), 0, atol=accuracy)))
+        store_triu(matrix[top:,start:stop], reflectors, max_memory)
+        matrix[top+rank:,start:stop] = 0
+        apply_householder_qt(reflectors, tau, matrix[top:,stop:], max_memory)
+        #Shifts the columns of the rows above it.
+        matrix[:top,start:stop] = matrix[:top,start:stop][:,P]
+        matrix_terms[start:stop] = matrix_terms[start:stop][P]
+        pivots.append(np.arange(start, start+rank))
+        others.append(np.arange(start+rank, stop))
+        top += rank
+
+    if not np.allclose(matrix[top:,cuts[1]:], 0, atol=accuracy):
+        raise MacaulayError("THE LAST TERMS ARE DEPENDENT")
+
+    #The pivots go first, then the rest of the terms, which are the vector basis.
+    order = np.concatenate(pivots + others + [np.arange(cuts[1], matrix.shape[1])]).astype(int)
+    return matrix[:top][:,order], matrix_terms[order]
+
 def rrqr_reduceMacaulay2(matrix, matrix_terms, cuts, number_of_roots, accuracy = 1.e-10):
     ''' Reduces a Macaulay matrix, BYU style
 
@@ -323,13 +762,193 @@ def get_ranges(nums):
         count+=1
     return ranges
 
+#The gathers of permutation_gathers, keyed by the degree, dimension, variable, exponent and basis.
+permutation_cache = PlanCache(maxsize=1024)
+
+def permutation_gathers(degree, dim, var, exponent, power):
+    '''Finds the permutation arrays that multiply a row of a Macaulay matrix by one variable to a power.
+
+    The rows have one entry for each term of sorted_matrix_terms, followed by an extra entry that
+    is always zero. Multiplying a row by x_var^exponent (or T_exponent(x_var) in the Chebyshev basis)
+    is weight*np.sum(row[gathers], axis=0), which only uses integer indexing. The arrays are kept
+    in permutation_cache.
+
+    Parameters
+    ----------
+    degree : int
+        The degree of the Macaulay Matrix.
+    dim : int
+        The dimension of the polynomials.
+    var : int
+        The variable to multiply by.
+    exponent : int
+        The power of the variable.
+    power : bool
+        If True the rows are in the power basis, otherwise in the Chebyshev basis.
+
+    Returns
+    -------
+    gathers : 2D numpy array
+        Each row is a permutation array of the padded row. Entries that have nothing to gather
+        point to the zero at the end.
+    weight : float
+        What the gathered entries are multiplied by.
+    '''
+    def build():
+        matrix_terms = sorted_matrix_terms(degree, dim)[0]
+        num_cols = len(matrix_terms)
+        big_shape = [degree+1]*dim
+        lookup = np.full(np.prod(big_shape), num_cols, dtype=int)
+        lookup[np.ravel_multi_index(tuple(matrix_terms.T), big_shape)] = np.arange(num_cols)
+
+        def gather(sources, valid):
+            #The column of each source term, or the padding entry where it isn't valid.
+            columns = np.full(num_cols + 1, num_cols, dtype=int)
+            columns[:-1][valid] = lookup[np.ravel_multi_index(tuple(sources[valid].T), big_shape)]
+            return columns
+
+        terms = matrix_terms[:,var]
+        shifted = matrix_terms.copy()
+        shifted[:,var] -= exponent
+        gathers = [gather(shifted, terms >= exponent)]
+        if not power:
+            #T_a*T_m = (T_{a+m} + T_{|a-m|})/2, so a term t also comes from t+m and m-t.
+            above = matrix_terms.copy()
+            above[:,var] += exponent
+            folded = matrix_terms.copy()
+            folded[:,var] = exponent - terms
+            gathers.append(gather(above, terms + exponent <= degree))
+            gathers.append(gather(folded, (terms > 0) & (terms <= exponent)))
+        return {'gathers' : np.array(gathers), 'weight' : np.array(1. if power else .5)}
+    key = (degree, dim, var, exponent, 'MultiPower' if power else 'MultiCheb')
+    plan = permutation_cache.get(key, build)
+    return plan['gathers'], float(plan['weight'])
+
+def permutation_rows(polys, degree, matrix_terms, power):
+    '''Makes the rows of a Macaulay matrix with permutation arrays, in the same order as add_polys.
+
+    Parameters
+    ----------
+    polys : list
+        The polynomials used to make the matrix.
+    degree : int
+        The degree of the Macaulay Matrix.
+    matrix_terms : numpy array
+        The terms of sorted_matrix_terms.
+    power : bool
+        If True the polynomials are MultiPower, otherwise MultiCheb.
+
+    Returns
+    -------
+    matrix : 2D numpy array
+        The Macaulay matrix, with the rows not yet sorted.
+    '''
+    dim = matrix_terms.shape[1]
+    num_cols = len(matrix_terms)
+    big_shape = [degree+1]*dim
+    lookup = np.full(np.prod(big_shape), num_cols, dtype=int)
+    lookup[np.ravel_multi_index(tuple(matrix_terms.T), big_shape)] = np.arange(num_cols)
+
+    rows = list()
+    for poly in polys:
+        #The coefficients in the order of the columns, with the padding zero at the end.
+        spots = np.nonzero(poly.coeff)
+        base = np.zeros(num_cols + 1, dtype=np.result_type(float, poly.coeff))
+        base[lookup[np.ravel_multi_index(spots, big_shape)]] = poly.coeff[spots]
+        for mon in mon_combos([0]*dim, degree - poly.degree):
+            row = base
+            for var in np.nonzero(mon)[0]:
+                gathers, weight = permutation_gathers(degree, dim, var, mon[var], power)
+                row = weight*np.sum(row[gathers], axis=0)
+            rows.append(row[:-1])
+    return np.array(rows)
+
+def permutation_rows_accurate(matrix, polys, degree, matrix_terms, power, tol=1.e-10):
+    '''Checks the rows from permutation_rows by evaluating them at a point.
+
+    Each row is a polynomial times a monomial, so its value at a point has to be the value of the
+    polynomial times the value of the monomial.
+
+    Parameters
+    ----------
+    matrix : 2D numpy array
+        The rows from permutation_rows.
+    polys : list
+        The polynomials used to make the matrix.
+    degree : int
+        The degree of the Macaulay Matrix.
+    matrix_terms : numpy array
+        The terms of the columns.
+    power : bool
+        If True the polynomials are MultiPower, otherwise MultiCheb.
+    tol : float
+        How large the error can be relative to the size of the terms of a row.
+
+    Returns
+    -------
+    accurate : bool
+        Whether every row has the right value.
+    '''
+    dim = matrix_terms.shape[1]
+    point = .9*np.cos(1 + .7*np.arange(dim))
+    def values(terms):
+        if power:
+            return np.prod(point**terms, axis=1)
+        return np.prod(np.cos(terms*np.arccos(point)), axis=1)
+
+    expected = list()
+    for poly in polys:
+        mons = np.array(mon_combos([0]*dim, degree - poly.degree)).reshape(-1, dim)
+        expected.append(np.ravel(poly(point.reshape(1,dim)))[0]*values(mons))
+    expected = np.concatenate(expected)
+    term_values = values(matrix_terms)
+    scale = np.abs(matrix).dot(np.abs(term_values)) + np.abs(expected)
+    return bool(np.all(np.abs(matrix.dot(term_values) - expected) <= tol*scale))
+
+def permutation_matrix(polys, degree, dim, power, tol=1.e-10):
+    '''Builds a Macaulay matrix with permutation arrays, falling back to add_polys if it isn't accurate.
+
+    Parameters
+    ----------
+    polys : list
+        The polynomials used to make the matrix, sorted by descending degree.
+    degree : int
+        The degree of the Macaulay Matrix.
+    dim : int
+        The dimension of the polynomials going into the matrix.
+    power : bool
+        If True the polynomials are MultiPower, otherwise MultiCheb.
+    tol : float
+        How accurate the rows have to be, see permutation_rows_accurate.
+
+    Returns
+    -------
+    matrix : 2D numpy array
+        The Macaulay matrix.
+    matrix_terms : numpy array
+        The ith row is the term represented by the ith column of the matrix.
+    cuts : tuple
+        When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
+        where those cuts happen.
+    '''
+    matrix_terms, cuts = sorted_matrix_terms(degree, dim)
+    matrix = permutation_rows(polys, degree, matrix_terms, power)
+    if permutation_rows_accurate(matrix, polys, degree, matrix_terms, power, tol):
+        #Sorts the rows of the matrix so it is close to upper triangular.
+        return row_swap_matrix(matrix), matrix_terms, cuts
+
+    poly_coeffs = list()
+    for poly in polys:
+        poly_coeffs = add_polys(degree, poly, poly_coeffs)
+    return macaulay_matrix(poly_coeffs, matrix_terms), matrix_terms, cuts
+
 def createMatrixFast(polys, degree, dim):
-    ''' Builds a Macaulay matrix using fast construction.
+    ''' Builds a Macaulay matrix using fast construction in the power basis.
 
     Parameters
     ----------
-    poly_coeffs : list.
-        Contains numpy arrays that hold the coefficients of the polynomials to be put in the matrix.
+    polys : list.
+        The polynomials to be put in the matrix.
     degree : int
         The degree of the Macaulay Matrix
     dim : int
@@ -344,46 +963,7 @@ def createMatrixFast(polys, degree, dim):
         When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
         where those cuts happen.
     '''
-    bigShape = [degree+1]*dim
-
-    matrix_terms, cuts = sorted_matrix_terms(degree, dim)
-    columns = len(matrix_terms)
-
-    range_split = [num_mons_full(degree-poly.degree,dim) for poly in polys]
-    rows = np.sum(range_split)
-    ranges = get_ranges(range_split)    #How to slice the poly into the matrix rows.
-    matrix = np.zeros((rows,columns))
-    curr = 0
-
-    #Get the slices needed to pull the matrix_terms from the coeff matrix.
-    matrix_term_indexes = list()
-    for row in matrix_terms.T:
-        matrix_term_indexes.append(row)
-
-    permutations = None
-    currentDegree = 2
-    #Adds the poly_coeffs to flat_polys, using added_zeros to make sure every term is in there.
-    added_zeros = np.zeros(bigShape)
-
-    for poly,matrix_range in zip(polys,ranges):
-        slices = slice_top(poly.coeff)
-        added_zeros[slices] = poly.coeff
-        array = added_zeros[matrix_term_indexes]
-        added_zeros[slices] = np.zeros_like(poly.coeff)
-
-        permutations = memoized_all_permutations(degree - poly.degree, dim, degree, permutations, currentDegree)
-        currentDegree = degree - poly.degree
-        permList = list(permutations.values())
-
-        temp = array[np.reshape(permList, (len(permList), columns))[::-1]]
-        matrix[matrix_range] = temp
-
-    if matrix_shape_stuff[0] > matrix.shape[0]: #The matrix isn't tall enough, these can't all be pivot columns.
-        raise MacaulayError("HIGHEST NOT FULL RANK. TRY HIGHER DEGREE")
-    #Sorts the rows of the matrix so it is close to upper triangular.
-    if not checkEqual([poly.degree for poly in polys]): #Will need some switching possibly if some degrees are different.
-        matrix = row_swap_matrix(matrix)
-    return matrix, matrix_terms, cuts
+    return permutation_matrix(polys, degree, dim, True)
 
 def construction(polys, degree, dim):
     ''' Builds a Macaulay matrix using fast construction in the Chebyshev basis.
@@ -391,7 +971,7 @@ def construction(polys, degree, dim):
     Parameters
     ----------
     polys : list.
-        Contains numpy arrays that hold the coefficients of the polynomials to be put in the matrix.
+        The polynomials to be put in the matrix.
     degree : int
         The degree of the Macaulay Matrix
     dim : int
@@ -406,44 +986,4 @@ def construction(polys, degree, dim):
         When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
         where those cuts happen.
     '''
-    bigShape = [degree+1]*dim
-    matrix_terms, cuts = sorted_matrix_terms(degree, dim)
-    #print(matrix_shape_stuff)
-    matrix_term_indexes = list()
-    for row in matrix_terms.T:
-        matrix_term_indexes.append(row)
-
-    permutations = all_permutations_cheb(degree - np.min([poly.degree for poly in polys]), dim, degree)
-    #print(permutations)
-    added_zeros = np.zeros(bigShape)
-    flat_polys = list()
-    i = 0;
-    for poly in polys:
-        slices = slice_top(poly.coeff)
-        added_zeros[slices] = poly.coeff
-        array = added_zeros[matrix_term_indexes]
-        added_zeros[slices] = np.zeros_like(poly.coeff)
-        #print(array)
-
-        #flat_polys.append(array[np.vstack(permutations.values())])
-        degreeNeeded = degree - poly.degree
-        mons = mons_ordered(dim,degreeNeeded)
-        mons = np.pad(mons, (0,1), 'constant', constant_values = i)
-        i += 1
-        flat_polys.append(array)
-        for mon in mons[1:-1]:
-            result = np.copy(array)
-            for i in range(dim):
-                if mon[i] != 0:
-
-                    mult = [0]*dim
-                    mult[i] = mon[i]
-                    result = np.sum(result[permutations[tuple(mult)]], axis = 0)
-            flat_polys.append(result)
-    #print(flat_polys)
-    matrix = np.vstack(flat_polys)
-    if matrix_shape_stuff[0] > matrix.shape[0]: #The matrix isn't tall enough, these can't all be pivot columns.
-        raise MacaulayError("HIGHEST NOT FULL RANK. TRY HIGHER DEGREE")
-    matrix = row_swap_matrix(matrix)
-    #print(matrix)
-    return matrix, matrix_terms, cuts
+    return permutation_matrix(polys, degree, dim, False)
@@ -2,13 +2,17 @@ import numpy as np
 import itertools
 from scipy.linalg import solve_triangular, eig
 from numalgsolve.polynomial import MultiCheb, MultiPower, is_power
-from numalgsolve.MacaulayReduce import rrqr_reduceMacaulay2, rrqr_reduceMacaulay, find_degree, add_polys
-from numalgsolve.utils import row_swap_matrix, MacaulayError, slice_top, get_var_list, \
+from numalgsolve.MacaulayReduce import rrqr_reduceMacaulay2, rrqr_reduceMacaulay, find_degree, add_polys, \
+                                      permutation_matrix, macaulay_entries, rrqr_reduceMacaulayDeficient, \
+                                      householder_qr
+from numalgsolve.utils import row_swap_matrix, MacaulayError, MonomialIndex, mon_mult_entries, \
+                              macaulay_layout, planned_macaulay_matrix, planned_macaulay_matrix_batch, plan_cache, slice_top, get_var_list, macaulay_matrix, \
                               mon_combos, mon_combosHighest, sort_polys_by_degree, \
-                              deg_d_polys, all_permutations_cheb
+                              deg_d_polys, all_permutations_cheb, sorted_matrix_terms, entries_matrix
 import warnings
 
-def multiplication(polys, verbose=False, MSmatrix=0, rotate=False):
+def multiplication(polys, verbose=False, MSmatrix=0, rotate=False, max_memory=None, layout=None,
+                   construction='layout', incremental=False, sparse_matrix=False):
     '''
     Finds the roots of the given list of multidimensional polynomials using a multiplication matrix.
 
@@ -22,6 +26,17 @@ def multiplication(polys, verbose=False, MSmatrix=0, rotate=False):
             Some positive integer i < dimension -- The Moller-Stetter matrix of x_i
     verbose : bool
         Prints information about how the roots are computed.
+    max_memory : int
+        About how many bytes of working memory the Macaulay reduction may use on top of the matrix.
+        See rrqr_reduceMacaulay.
+    layout : dict
+        The layout of the Macaulay matrix from macaulay_plan. Found from the plan cache if None.
+    construction : str
+        How the Macaulay matrix is built, see MacaulayReduction.
+    incremental : bool
+        If True lower degree Macaulay matrices are tried first, see MacaulayReduction.
+    sparse_matrix : bool
+        If True the Macaulay matrix is built as a scipy csr matrix, see MacaulayReduction.
     returns
     -------
     roots : numpy array
@@ -37,7 +52,9 @@ def multiplication(polys, verbose=False, MSmatrix=0, rotate=False):
     degrees = [poly.degree for poly in polys]
     max_number_of_roots = np.prod(degrees)
 
-    m_f, var_dict = MSMultMatrix(polys, poly_type, max_number_of_roots, verbose=verbose, MSmatrix=MSmatrix)
+    m_f, var_dict = MSMultMatrix(polys, poly_type, max_number_of_roots, verbose=verbose, MSmatrix=MSmatrix,\
+                                 max_memory=max_memory, layout=layout, construction=construction,
+                                 incremental=incremental, sparse_matrix=sparse_matrix)
 
     if rotate: #rotate multiplication matrix 180 degrees
         m_f = np.rot90(m_f,2)
@@ -52,15 +69,9 @@ def multiplication(polys, verbose=False, MSmatrix=0, rotate=False):
 
     # Get list of indexes of single variables and store vars that were not
     # in the vector space basis.
-    var_spots = list()
-    spot = np.zeros(dim)
-    for i in range(dim):
-        spot[i] = 1
-        if not rotate:
-            var_spots.append(var_dict[tuple(spot)])
-        else: #if m_f is rotated 180, the eigenvectors are backwards
-            var_spots.append(m_f.shape[0] - 1 - var_dict[tuple(spot)])
-        spot[i] = 0
+    var_spots = var_dict[np.eye(dim, dtype=int)]
+    if rotate: #if m_f is rotated 180, the eigenvectors are backwards
+        var_spots = m_f.shape[0] - 1 - var_spots
 
     # Get left eigenvectors
 
@@ -69,7 +80,7 @@ def multiplication(polys, verbose=False, MSmatrix=0, rotate=False):
         print('\nLeft Eigenvectors (as rows)\n',vecs.T)
         print('\nEigenvals\n', vals)
 
-    zeros_spot = var_dict[tuple(0 for i in range(dim))]
+    zeros_spot = var_dict[np.zeros(dim, dtype=int)]
     if rotate: #if m_f is rotate 180, the eigenvectors are backwards
         zeros_spot = m_f.shape[0] - 1 - zeros_spot
 
@@ -90,7 +101,8 @@ def multiplication(polys, verbose=False, MSmatrix=0, rotate=False):
     #    print("Number of Roots Lost:", max_number_of_roots - roots.shape[1])
     return roots.T
 
-def MSMultMatrix(polys, poly_type, number_of_roots, verbose=False, MSmatrix=0):
+def MSMultMatrix(polys, poly_type, number_of_roots, verbose=False, MSmatrix=0, max_memory=None, layout=None,
+                 construction='layout', incremental=False, sparse_matrix=False):
     '''
     Finds the multiplication matrix using the reduced Macaulay matrix.
 
@@ -106,62 +118,211 @@ def MSMultMatrix(polys, poly_type, number_of_roots, verbose=False, MSmatrix=0):
             Some positive integer i < dimension -- The Moller-Stetter matrix of x_i
     verbose : bool
         Prints information about how the roots are computed.
+    max_memory : int
+        About how many bytes of working memory the Macaulay reduction may use on top of the matrix.
+    layout : dict
+        The layout of the Macaulay matrix from macaulay_plan. Found from the plan cache if None.
+    construction : str
+        How the Macaulay matrix is built, see MacaulayReduction.
+    incremental : bool
+        If True lower degree Macaulay matrices are tried first, see MacaulayReduction.
+    sparse_matrix : bool
+        If True the Macaulay matrix is built as a scipy csr matrix, see MacaulayReduction.
 
     Returns
     -------
     multiplicationMatrix : 2D numpy array
         The multiplication matrix for a random polynomial f
-    var_dict : dictionary
-        Maps each variable to its position in the vector space basis
+    var_dict : MonomialIndex
+        Maps each term in the vector space basis, including the variables, to its position
     '''
-    basisDict, VB = MacaulayReduction(polys, number_of_roots, verbose=verbose)
+    basis_index, reductions, VB = MacaulayReduction(polys, number_of_roots, verbose=verbose, max_memory=max_memory,
+                                                    layout=layout, construction=construction, incremental=incremental,
+                                                    sparse_matrix=sparse_matrix)
 
     dim = max(f.dim for f in polys)
 
     # Get the polynomial to make the MS matrix of
-    if MSmatrix==0: #random poly
-        f = _random_poly(poly_type, dim)[0]
-    else: #multiply by x_i where i is determined by MSmatrix
-        xi_ind = np.zeros(dim, dtype=int)
-        xi_ind[MSmatrix-1] = 1
-        coef = np.zeros((2,)*dim)
-        coef[tuple(xi_ind)] = 1
-        if poly_type == "MultiPower":
-            f = MultiPower(np.array(coef))
-        elif poly_type == "MultiCheb":
-            f = MultiCheb(np.array(coef))
-        else:
-            raise ValueError()
+    f = ms_polynomial(poly_type, dim, MSmatrix)
     if verbose:
         print("\nCoefficients of polynomial whose Moller-Stetter matrix we construt\n", f.coeff)
 
-    #Dictionary of terms in the vector basis their spots in the matrix.
-    VBdict = {}
-    spot = 0
-    for row in VB:
-        VBdict[tuple(row)] = spot
-        spot+=1
-
     # Build multiplication matrix m_f
-    mMatrix = np.zeros((len(VB), len(VB)))
-    for i in range(VB.shape[0]):
-        f_coeff = f.mon_mult(VB[i], returnType = 'Matrix')
-        for term in zip(*np.where(f_coeff != 0)):
-            if term in VBdict:
-                mMatrix[VBdict[term]][i] += f_coeff[term]
-            else:
-                mMatrix[:,i] -= f_coeff[term]*basisDict[term]
-
-    # Construct var_dict
-    var_dict = {}
-    for i in range(len(VB)):
-        mon = VB[i]
-        if np.sum(mon) == 1 or np.sum(mon) == 0:
-            var_dict[tuple(mon)] = i
-
-    return mMatrix, var_dict
-
-def MacaulayReduction(initial_poly_list, max_number_of_roots, accuracy = 1.e-10, verbose=False):
+    VB_index = MonomialIndex(VB)
+    mMatrix = multiplication_matrix(f.coeff, VB_index, basis_index, reductions, poly_type == 'MultiPower')
+
+    return mMatrix, VB_index
+
+def multiplication_batch(coeff_stack, degrees, poly_type, MSmatrix=0, max_memory=None, layout=None):
+    '''
+    Finds the roots of many systems of polynomials with the same degrees using multiplication matrices.
+
+    The Macaulay matrices of all the systems are built at once into one 3D array, and the eigenproblems
+    of all the systems whose vector bases have the same size are solved with one stacked eig call.
+    The pivoted QR reductions are done one system at a time, as the pivots depend on the coefficients.
+
+    Parameters
+    ----------
+    coeff_stack : numpy array
+        Shape (B, dim, ...). coeff_stack[b,i] is the coefficient tensor of the i'th polynomial of the b'th system.
+    degrees : tuple
+        The degree of each polynomial.
+    poly_type : string
+        "MultiCheb" or "MultiPower".
+    MSmatrix : int
+        Controls which Moller-Stetter matrix is constructed, as in multiplication. A random polynomial
+        is shared by all the systems.
+    max_memory : int
+        About how many bytes of working memory the Macaulay reduction may use on top of the matrix.
+    layout : dict
+        The layout of the Macaulay matrix from macaulay_plan, for the degrees in descending order.
+        Found from the plan cache if None.
+
+    Returns
+    -------
+    roots : list of numpy arrays
+        roots[b] holds the common roots of the b'th system. Each row is a root.
+    '''
+    num_systems, dim = coeff_stack.shape[:2]
+    power = poly_type == 'MultiPower'
+    if MSmatrix not in list(range(dim+1)):
+        raise ValueError('MSmatrix must be 0 (random polynomial), or the index of a variable')
+    max_number_of_roots = np.prod(degrees)
+
+    #MacaulayReduction puts the polynomials in order of descending degree.
+    order = np.argsort(degrees)[::-1]
+    if layout is None:
+        layout = macaulay_plan(np.array(degrees)[order], dim, power)
+    matrices = planned_macaulay_matrix_batch(coeff_stack[:,order], layout)
+    cuts = tuple(int(cut) for cut in layout['cuts'])
+    f = ms_polynomial(poly_type, dim, MSmatrix)
+
+    m_fs, VB_indexes = list(), list()
+    for matrix in matrices:
+        basis_index, reductions, VB = reduce_macaulay(matrix, np.array(layout['matrix_terms']), cuts,
+                                                      max_number_of_roots, power, max_memory=max_memory)
+        VB_indexes.append(MonomialIndex(VB))
+        m_fs.append(multiplication_matrix(f.coeff, VB_indexes[-1], basis_index, reductions, power))
+
+    roots = [None]*num_systems
+    sizes = np.array([len(m_f) for m_f in m_fs])
+    for size in np.unique(sizes):
+        systems = np.where(sizes == size)[0]
+        vals, vecs = np.linalg.eig(np.stack([m_fs[system].T for system in systems]))
+        for system, system_vecs in zip(systems, vecs):
+            var_spots = VB_indexes[system][np.eye(dim, dtype=int)]
+            zeros_spot = VB_indexes[system][np.zeros(dim, dtype=int)]
+            roots[system] = (system_vecs[var_spots]/system_vecs[zeros_spot]).T
+            assert roots[system].shape[0] <= max_number_of_roots,"Found too many roots"
+    return roots
+
+def ms_polynomial(poly_type, dim, MSmatrix):
+    '''
+    Finds the polynomial whose Moller-Stetter matrix is constructed.
+
+    Parameters
+    ----------
+    poly_type : string
+        "MultiCheb" or "MultiPower".
+    dim : int
+        The dimension of the polynomial.
+    MSmatrix : int
+        0 for a random polynomial, or i to get x_i.
+
+    Returns
+    -------
+    f : Polynomial
+        The polynomial.
+    '''
+    if MSmatrix==0: #random poly
+        return _random_poly(poly_type, dim)[0]
+    #multiply by x_i where i is determined by MSmatrix
+    xi_ind = np.zeros(dim, dtype=int)
+    xi_ind[MSmatrix-1] = 1
+    coef = np.zeros((2,)*dim)
+    coef[tuple(xi_ind)] = 1
+    if poly_type == "MultiPower":
+        return MultiPower(np.array(coef))
+    elif poly_type == "MultiCheb":
+        return MultiCheb(np.array(coef))
+    else:
+        raise ValueError()
+
+def mon_mult_terms(coeff, mons, power):
+    '''Multiplies a polynomial by every monomial in mons at once.
+
+    Parameters
+    ----------
+    coeff : numpy array
+        The coefficient tensor of the polynomial.
+    mons : 2D numpy array
+        Each row is a monomial to multiply the polynomial by.
+    power : bool
+        If True the polynomial is in the power basis, otherwise in the Chebyshev basis.
+
+    Returns
+    -------
+    cols : numpy array
+        The row of mons each entry comes from.
+    terms : 2D numpy array
+        The term of each entry. Each (col, term) pair appears only once.
+    values : numpy array
+        The nonzero coefficient of each entry.
+    '''
+    f_terms = np.argwhere(coeff != 0)
+    cols, term_spots, terms, weights = mon_mult_entries(f_terms, mons, power)
+    values = coeff[tuple(f_terms.T)][term_spots]*weights
+
+    #Combine the entries that land on the same term of the same product.
+    if len(terms) == 0:
+        return cols, terms, values
+    keys = np.ravel_multi_index(np.vstack([cols, terms.T]), (len(mons),)+tuple(terms.max(axis=0)+1))
+    keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    values = np.bincount(inverse, weights=values)
+    nonzero = values != 0
+    return cols[first][nonzero], terms[first][nonzero], values[nonzero]
+
+def multiplication_matrix(coeff, VB_index, basis_index, reductions, power):
+    '''Assembles the multiplication matrix of a polynomial in the vector basis.
+
+    The product of the polynomial with each term of the vector basis is found at once. Terms that land in it are
+    scattered straight into the matrix, the rest are collected into a weight matrix that is applied to
+    their reductions with one matrix product.
+
+    Parameters
+    ----------
+    coeff : numpy array
+        The coefficient tensor of the polynomial to multiply by.
+    VB_index : MonomialIndex
+        The terms in the vector basis.
+    basis_index : MonomialIndex
+        The terms outside the vector basis that have a reduction.
+    reductions : 2D numpy array
+        Row i is the reduction of the i'th term of basis_index into the vector basis.
+    power : bool
+        If True the polynomial is in the power basis, otherwise in the Chebyshev basis.
+
+    Returns
+    -------
+    mMatrix : 2D numpy array
+        The multiplication matrix. Column i is the product with the i'th term of the vector basis.
+    '''
+    size = len(VB_index)
+    cols, terms, values = mon_mult_terms(coeff, VB_index.terms, power)
+
+    mMatrix = np.zeros((size, size))
+    spots = VB_index.spots(terms)
+    in_vb = spots >= 0
+    np.add.at(mMatrix, (spots[in_vb], cols[in_vb]), values[in_vb])
+
+    rows, inverse = np.unique(basis_index[terms[~in_vb]], return_inverse=True)
+    weights = np.zeros((len(rows), size))
+    np.add.at(weights, (inverse, cols[~in_vb]), values[~in_vb])
+    mMatrix -= reductions[rows].T.dot(weights)
+    return mMatrix
+
+def MacaulayReduction(initial_poly_list, max_number_of_roots, accuracy = 1.e-10, verbose=False, max_memory=None, layout=None,
+                      construction='layout', incremental=False, sparse_matrix=False):
     """Reduces the Macaulay matrix to find a vector basis for the system of polynomials.
 
     Parameters
@@ -170,12 +331,29 @@ def MacaulayReduction(initial_poly_list, max_number_of_roots, accuracy = 1.e-10,
         The polynomials in the system we are solving.
     accuracy: float
         How small we want a number to be before assuming it is zero.
+    max_memory : int
+        About how many bytes of working memory the reduction may use on top of the matrix.
+        See rrqr_reduceMacaulay.
+    layout : dict
+        The layout of the Macaulay matrix from macaulay_plan, for the polynomials sorted by descending degree.
+        Found from the plan cache if None.
+    construction : str
+        'layout' scatters the coefficients into the cached layout. 'permutation' makes each row
+        from the previous one with the permutation arrays of MacaulayReduce.permutation_gathers,
+        and falls back to add_polys if the rows aren't accurate.
+    incremental : bool
+        If True the degrees from the highest degree of the polynomials up are tried until the vector
+        basis stabilizes with incremental_reduction, and the degree find_degree matrix is only made if it doesn't.
+    sparse_matrix : bool
+        If True the degree find_degree matrix is built as a scipy csr matrix with the 'layout' construction,
+        and reduced by rrqr_reduceMacaulaySparse, so the whole matrix is never made dense.
 
     Returns
     -----------
-    basisDict : dict
-        A dictionary of terms not in the vector basis a matrixes of things in the vector basis that the term
-        can be reduced to.
+    basis_index : MonomialIndex
+        The terms not in the vector basis that are needed to build the multiplication matrix.
+    reductions : 2D numpy array
+        Row i is the reduction of the i'th term of basis_index into the vector basis.
     VB : numpy array
         The terms in the vector basis, each row being a term.
     """
@@ -187,33 +365,72 @@ def MacaulayReduction(initial_poly_list, max_number_of_roots, accuracy = 1.e-10,
     #This sorting is required for fast matrix construction. Ascending should be False.
     initial_poly_list = sort_polys_by_degree(initial_poly_list, ascending = False)
 
-    """This is the first construction option, simple monomial multiplication."""
-    for poly in initial_poly_list:
-        poly_coeff_list = add_polys(degree, poly, poly_coeff_list)
-    """This is the second construction option, it uses the fancy triangle method that is faster but less stable."""
+    if incremental:
+        reduced = incremental_reduction(initial_poly_list, power, accuracy=accuracy, verbose=verbose,
+                                        max_memory=max_memory)
+        if reduced is not None:
+            return reduced
+    if construction == 'layout':
+        """This is the first construction option, simple monomial multiplication, scattered into a cached layout."""
+        if layout is None:
+            layout = macaulay_plan([poly.degree for poly in initial_poly_list], dim, power)
+        matrix = planned_macaulay_matrix([poly.coeff for poly in initial_poly_list], layout,
+                                         sparse_matrix=sparse_matrix)
+        matrix_terms, cuts = np.array(layout['matrix_terms']), tuple(int(cut) for cut in layout['cuts'])
+    elif construction == 'permutation':
+        """This is the second construction option, it uses the permutation arrays."""
+        if sparse_matrix:
+            raise ValueError("The sparse matrix is only made with construction='layout'")
+        matrix, matrix_terms, cuts = permutation_matrix(initial_poly_list, degree, dim, power)
+    else:
+        raise ValueError("construction must be 'layout' or 'permutation'")
+    """The fancy triangle method is faster but less stable."""
     #for deg in reversed(range(min([poly.degree for poly in initial_poly_list]), degree+1)):
     #    poly_coeff_list += deg_d_polys(initial_poly_list, deg, dim)
-
-    #Creates the matrix for either of the above two methods. Comment out if using the third method.
-    #try:
-    matrix, matrix_terms, cuts = create_matrix(poly_coeff_list, degree, dim)
     if verbose:
         np.set_printoptions(suppress=False, linewidth=200)
         print('\nStarting Macaulay Matrix\n', matrix)
         print('\nColumns in Macaulay Matrix\nFirst element in tuple is degree of x, Second element is degree of y\n', matrix_terms)
         print('\nLocation of Cuts in the Macaulay Matrix into [ Mb | M1* | M2* ]\n', cuts)
 
-    """This is the thrid matrix construction option, it uses the permutation arrays."""
-    #if power:
-    #    matrix, matrix_terms, cuts = createMatrixFast(initial_poly_list, degree, dim)
-    #else:
-    #    matrix, matrix_terms, cuts = construction(initial_poly_list, degree, dim)
+    return reduce_macaulay(matrix, matrix_terms, cuts, max_number_of_roots, power, accuracy=accuracy, verbose=verbose,
+                           max_memory=max_memory)
 
-    #If bottom left is zero only does the first QR reduction on top part of matrix (for speed). Otherwise does it on the whole thing
-    if np.allclose(matrix[cuts[0]:,:cuts[0]], 0):
-        matrix, matrix_terms = rrqr_reduceMacaulay2(matrix, matrix_terms, cuts, max_number_of_roots, accuracy = accuracy)
-    else:
-        matrix, matrix_terms = rrqr_reduceMacaulay(matrix, matrix_terms, cuts, max_number_of_roots, accuracy = accuracy)
+def reduce_macaulay(matrix, matrix_terms, cuts, max_number_of_roots, power, accuracy = 1.e-10, verbose=False,
+                    max_memory=None):
+    """Reduces a Macaulay matrix to find a vector basis and the reductions of the other terms into it.
+
+    Parameters
+    --------
+    matrix : numpy array or scipy sparse matrix
+        The Macaulay matrix, sorted by row_swap_matrix.
+    matrix_terms : numpy array
+        The ith row is the term represented by the ith column of the matrix.
+    cuts : tuple
+        Where the matrix is split for the reduction.
+    max_number_of_roots : int
+        The number of roots by Bezout's Theorem.
+    power : bool
+        If True the polynomials are MultiPower, otherwise MultiCheb.
+    accuracy: float
+        How small we want a number to be before assuming it is zero.
+    max_memory : int
+        About how many bytes of working memory the reduction may use on top of the matrix.
+        See rrqr_reduceMacaulay.
+
+    Returns
+    -----------
+    basis_index : MonomialIndex
+        The terms not in the vector basis that are needed to build the multiplication matrix.
+    reductions : 2D numpy array
+        Row i is the reduction of the i'th term of basis_index into the vector basis.
+    VB : numpy array
+        The terms in the vector basis, each row being a term.
+    """
+    #The first QR reduction follows the staircase of the rows, so it only touches the band of rows
+    #that are nonzero in each panel whether or not the bottom left is zero.
+    matrix, matrix_terms = rrqr_reduceMacaulay(matrix, matrix_terms, cuts, max_number_of_roots, accuracy = accuracy,\
+                                               max_memory = max_memory)
 
     #Make there are enough rows in the reduced Macaulay matrix, i.e. didn't loose a row
     assert matrix.shape[0] >= matrix.shape[1] - max_number_of_roots
@@ -266,15 +483,141 @@ def MacaulayReduction(initial_poly_list, max_number_of_roots, accuracy = 1.e-10,
     #plt.plot(matrix_terms[:,0],matrix_terms[:,1],'kx')
     #plt.plot(VB[:,0],VB[:,1],'r.')
 
-    basisDict = makeBasisDict(matrix, matrix_terms, VB, power)
+    basis_index, reductions = makeBasisIndex(matrix, matrix_terms, VB, power)
+
+    return basis_index, reductions, VB
+
+def count_top_terms(polys, degree, accuracy = 1.e-10):
+    """Counts the terms of the highest degree in the vector basis of a Macaulay matrix.
+
+    Only the monomial multiples that reach the degree have entries in its highest terms, so
+    this is found from a small QR of just those rows and columns.
+
+    Parameters
+    --------
+    polys : list
+        The polynomials.
+    degree : int
+        The degree of the Macaulay matrix.
+    accuracy: float
+        How small a diagonal entry of R has to be to not be a pivot.
+
+    Returns
+    -----------
+    num_top : int
+        How many of the highest terms aren't pivots.
+    """
+    dim = polys[0].dim
+    highest_terms = np.array(mon_combosHighest([0]*dim, degree)).reshape(-1, dim)
+    rows, terms, values, num_rows = macaulay_entries(degree, polys, layer=True)
+    reflectors, tau, P = householder_qr(entries_matrix(rows, terms, values, num_rows, highest_terms), pivoting=True)
+    return len(highest_terms) - int(np.sum(~np.isclose(np.diag(reflectors), 0, atol=accuracy)))
+
+def incremental_reduction(polys, power, accuracy = 1.e-10, verbose=False, max_memory=None):
+    """Looks for the vector basis in Macaulay matrices of increasing degree, and stops once it stabilizes.
+
+    Each matrix is reduced with rrqr_reduceMacaulayDeficient, so the highest terms don't have to be
+    full rank. The terms of the top degree left in the vector basis are either there for lack of rows,
+    or come from roots at infinity. The rest of the vector basis has stabilized once it and the size of
+    the vector basis are the same as at the degree below, or right away if there are no top degree terms.
+    It can then be used if the terms it is multiplied into are all pivots, and their reductions don't
+    use the top degree terms. This works for systems with roots at infinity, whose highest terms are
+    never full rank.
+
+    The top degree terms are first counted with count_top_terms, and the whole matrix of a degree is
+    only reduced if there are none, or as many as at the degree below or above. If there are none at
+    find_degree the usual reduction is left to do it. Square systems start at find_degree - 1, as their vector basis
+    can't stabilize any lower, and others start at the highest degree of the polynomials.
+
+    Parameters
+    --------
+    polys : list
+        The polynomials, sorted by descending degree.
+    power : bool
+        If True the polynomials are MultiPower, otherwise MultiCheb.
+    accuracy: float
+        How small we want a number to be before assuming it is zero.
+    max_memory : int
+        About how many bytes of working memory the reduction may use on top of the matrix.
+        See rrqr_reduceMacaulayDeficient.
+
+    Returns
+    -----------
+    basis_index : MonomialIndex
+        The terms not in the vector basis that are needed to build the multiplication matrix.
+    reductions : 2D numpy array
+        Row i is the reduction of the i'th term of basis_index into the vector basis.
+    VB : numpy array
+        The terms in the vector basis, each row being a term.
+    None is returned instead if the highest terms are full rank at find_degree, or if the vector basis
+    doesn't stabilize by one degree past find_degree.
+    """
+    dim = polys[0].dim
+    #The multiplication matrix multiplies the vector basis by 1 and the variables.
+    linear_terms = np.vstack([np.zeros(dim, dtype=int), np.eye(dim, dtype=int)])
+    previous = None
+    num_tops = {}
+    last_degree = find_degree(polys)
+    first_degree = max(poly.degree for poly in polys)
+    #The vector basis of a square system with finitely many roots, counting those at infinity, grows at
+    #each degree up to find_degree - 1, and with infinitely many it never stops growing.
+    if len(polys) == dim:
+        first_degree = max(first_degree, last_degree - 1)
+    #1 and the variables are never top degree terms from degree 2 on.
+    for degree in range(max(2, first_degree), last_degree + 2):
+        if degree not in num_tops:
+            num_tops[degree] = count_top_terms(polys, degree, accuracy)
+        num_top = num_tops[degree]
+        #Then the usual reduction of this matrix works, and is quicker.
+        if num_top == 0 and degree == last_degree:
+            return None
+        #The whole matrix is only needed if the basis could stabilize at this degree or the next one.
+        if num_top > 0 and num_top != num_tops.get(degree - 1):
+            if degree > last_degree:
+                continue
+            num_tops[degree + 1] = count_top_terms(polys, degree + 1, accuracy)
+            if num_top != num_tops[degree + 1]:
+                continue
+
+        matrix_terms, cuts = sorted_matrix_terms(degree, dim)
+        rows, terms, values, num_rows = macaulay_entries(degree, polys)
+        matrix = entries_matrix(rows, terms, values, num_rows, matrix_terms)
+        try:
+            matrix, matrix_terms = rrqr_reduceMacaulayDeficient(matrix, matrix_terms, cuts, accuracy=accuracy,
+                                                                max_memory=max_memory)
+        except MacaulayError:
+            #1 and the variables have to be in the vector basis to read the roots off the eigenvectors.
+            continue
+        height = matrix.shape[0]
+        matrix[:,height:] = solve_triangular(matrix[:,:height], matrix[:,height:])
+
+        VB = matrix_terms[height:]
+        top = np.sum(VB, axis=1) == degree
+        basis = set(map(tuple, VB[~top]))
+        stable = not np.any(top) or previous == (degree - 1, len(VB), basis)
+        previous = (degree, len(VB), basis)
+        if not stable:
+            continue
 
-    return basisDict, VB
+        #The terms the basis is multiplied into have to be pivots whose reductions don't use the top terms.
+        VB_index = MonomialIndex(VB[~top])
+        products = mon_mult_entries(linear_terms, VB_index.terms, power)[2]
+        products = np.unique(products[VB_index.spots(products) < 0], axis=0)
+        pivot_spots = MonomialIndex(matrix_terms[:height]).spots(products)
+        if np.any(pivot_spots < 0):
+            continue
+        reductions = matrix[pivot_spots, height:]
+        if not np.allclose(reductions[:,top], 0, atol=accuracy):
+            continue
+        if verbose:
+            print('\nThe vector basis stabilized at degree', degree)
+        return MonomialIndex(products), reductions[:,~top], VB_index.terms
+    return None
 
-def makeBasisDict(matrix, matrix_terms, VB, power):
-    '''Calculates and returns the basisDict.
+def makeBasisIndex(matrix, matrix_terms, VB, power):
+    '''Finds the terms on the diagonal of the reduced Macaulay matrix and their reductions into the Vector Basis.
 
-    This is a dictionary of the terms on the diagonal of the reduced Macaulay matrix to the terms in the Vector Basis.
-    It is used to create the multiplication matrix in root_finder.
+    These are used to create the multiplication matrix in root_finder.
 
     Parameters
     --------
@@ -289,35 +632,20 @@ def makeBasisDict(matrix, matrix_terms, VB, power):
 
     Returns
     -----------
-    basisDict : dict
-        Maps terms on the diagonal of the reduced Macaulay matrix (tuples) to numpy arrays that represent the
-        terms reduction into the Vector Basis.
+    basis_index : MonomialIndex
+        The terms on the diagonal of the reduced Macaulay matrix.
+    reductions : numpy array
+        Row i represents the reduction of the i'th term of basis_index into the Vector Basis.
     '''
-    basisDict = {}
-
-    VBSet = set()
-    for i in VB:
-        VBSet.add(tuple(i))
-
+    rows = np.arange(matrix.shape[0])
     if power: #We don't actually need most of the rows, so we only get the ones we need.
-        neededSpots = set()
-        for term, mon in itertools.product(VB,get_var_list(VB.shape[1])):
-            if tuple(term+mon) not in VBSet:
-                neededSpots.add(tuple(term+mon))
-
-    #spots = list()
-    #for dim in range(VB.shape[1]):
-    #    spots.append(VB.T[dim])
-
-    for i in range(matrix.shape[0]):
-        term = tuple(matrix_terms[i])
-        if power and term not in neededSpots:
-            continue
-        basisDict[term] = matrix[i][matrix.shape[0]:]
+        neededSpots = (VB[:,np.newaxis,:] + np.eye(VB.shape[1], dtype=int)).reshape(-1, VB.shape[1])
+        neededSpots = MonomialIndex(neededSpots[MonomialIndex(VB).spots(neededSpots) < 0])
+        rows = rows[neededSpots.spots(matrix_terms[:matrix.shape[0]]) >= 0]
 
-    return basisDict
+    return MonomialIndex(matrix_terms[rows]), matrix[rows, matrix.shape[0]:]
 
-def create_matrix(poly_coeffs, degree, dim):
+def create_matrix(poly_coeffs, degree, dim, sparse_matrix=False):
     ''' Builds a Macaulay matrix.
 
     Parameters
@@ -328,9 +656,12 @@ def create_matrix(poly_coeffs, degree, dim):
         The degree of the Macaulay Matrix
     dim : int
         The dimension of the polynomials going into the matrix.
+    sparse_matrix : bool
+        If True the matrix is built and returned as a scipy csr matrix. Most of the entries are
+        zero for 3 or more dimensions, so this takes much less memory.
     Returns
     -------
-    matrix : 2D numpy array
+    matrix : 2D numpy array or scipy csr matrix
         The Macaulay matrix.
     matrix_terms : numpy array
         The ith row is the term represented by the ith column of the matrix.
@@ -338,63 +669,41 @@ def create_matrix(poly_coeffs, degree, dim):
         When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
         where those cuts happen.
     '''
-    bigShape = [degree+1]*dim
     matrix_terms, cuts = sorted_matrix_terms(degree, dim)
 
-    #Get the slices needed to pull the matrix_terms from the coeff matrix.
-    matrix_term_indexes = list()
-    for row in matrix_terms.T:
-        matrix_term_indexes.append(row)
-
-    #Adds the poly_coeffs to flat_polys, using added_zeros to make sure every term is in there.
-    added_zeros = np.zeros(bigShape)
-    flat_polys = list()
-    for coeff in poly_coeffs:
-        slices = slice_top(coeff)
-        added_zeros[slices] = coeff
-        flat_polys.append(added_zeros[matrix_term_indexes])
-        added_zeros[slices] = np.zeros_like(coeff)
-        coeff = 0
-    poly_coeffs = 0
-
-    #Make the matrix. Reshape is faster than stacking.
-    matrix = np.reshape(flat_polys, (len(flat_polys),len(matrix_terms)))
-
     #if cuts[0] > matrix.shape[0]: #The matrix isn't tall enough, these can't all be pivot columns.
     #    raise MacaulayError("HIGHEST NOT FULL RANK. TRY HIGHER DEGREE")
 
-    #Sorts the rows of the matrix so it is close to upper triangular.
-    matrix = row_swap_matrix(matrix)
+    matrix = macaulay_matrix(poly_coeffs, matrix_terms, sparse_matrix=sparse_matrix)
     return matrix, matrix_terms, cuts
 
-def sorted_matrix_terms(degree, dim):
-    '''Finds the matrix_terms sorted in the term order needed for Macaulay reduction.
-    So the highest terms come first,the x,y,z etc monomials last.
+def macaulay_plan(degrees, dim, power):
+    '''Finds the layout of the Macaulay matrix of polynomials with the given degrees.
+
+    The layout only depends on the degrees, the dimension and the basis, so it is kept in the plan cache.
+
     Parameters
     ----------
-    degree : int
-        The degree of the Macaulay Matrix
+    degrees : list
+        The degree of each polynomial, in the order they go in the matrix.
     dim : int
-        The dimension of the polynomials going into the matrix.
+        The dimension of the polynomials.
+    power : bool
+        If True the polynomials are MultiPower, otherwise MultiCheb.
+
     Returns
     -------
-    sorted_matrix_terms : numpy array
-        The sorted matrix_terms. The ith row is the term represented by the ith column of the matrix.
-    cuts : tuple
-        When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
-        where those cuts happen.
+    plan : dict
+        The layout from macaulay_layout, with the cuts from sorted_matrix_terms.
     '''
-    highest_mons = mon_combosHighest([0]*dim,degree)[::-1]
-
-    other_mons = list()
-    d = degree - 1
-    while d > 1:
-        other_mons += mon_combosHighest([0]*dim,d)[::-1]
-        d -= 1
-
-    xs_mons = mon_combos([0]*dim,1)[::-1]
-    sorted_matrix_terms = np.reshape(highest_mons+other_mons+xs_mons, (len(highest_mons+other_mons+xs_mons),dim))
-    return sorted_matrix_terms, tuple([len(highest_mons),len(highest_mons)+len(other_mons)])
+    degrees = tuple(int(deg) for deg in degrees)
+    def build():
+        degree = sum(degrees) - len(degrees) + 1
+        matrix_terms, cuts = sorted_matrix_terms(degree, dim)
+        plan = macaulay_layout(degrees, dim, power, matrix_terms)
+        plan['cuts'] = np.array(cuts)
+        return plan
+    return plan_cache.get(('multiplication', degrees, dim, 'MultiPower' if power else 'MultiCheb'), build)
 
 def _random_poly(_type, dim):
     '''
@@ -1,7 +1,12 @@
 import numpy as np
 from scipy.linalg import eig, eigvals
 from numpy import linalg as la
+from numpy.polynomial import chebyshev as cheb, polynomial as power_poly
 from numalgsolve.polynomial import MultiCheb, MultiPower
+from numba import jit
+
+#The degree from which the eigenvalue solvers use aberth instead of a dense matrix.
+STRUCTURED_DEGREE = 200
 
 def solve(poly, MSmatrix=0, eigvals=True, verbose=False):
     """Finds the zeros of a 1-D polynomial.
@@ -44,6 +49,199 @@ def solve(poly, MSmatrix=0, eigvals=True, verbose=False):
         else:
             return divCheb(poly.coeff, eigvals, verbose=verbose)
 
+def solve_batch(coeffs, power, MSmatrix=0):
+    """Finds the zeros of many 1-D polynomials with the same number of coefficients.
+
+    The rotated companion or colleague matrices of the polynomials are stacked into one array and
+    their eigenvalues are found with one call. Polynomials whose matrix would be a different size,
+    because of a zero leading coefficient or (for power polynomials) a zero constant term, and the
+    other MSmatrix options, are solved one at a time with solve.
+
+    Parameters
+    ----------
+    coeffs : numpy array
+        Each row is the coefficients of a polynomial.
+    power : bool
+        If True the polynomials are MultiPower, otherwise MultiCheb.
+    MSmatrix : int
+        Controls which Moller-Stetter matrix is constructed, as in solve.
+
+    Returns
+    -------
+    zeros : list of numpy arrays
+        The zeros of each polynomial.
+    """
+    coeffs = np.asarray(coeffs)
+    n = coeffs.shape[1] - 1
+    stacked = coeffs[:,-1] != 0
+    if power:
+        stacked &= coeffs[:,0] != 0
+    if MSmatrix != 0 or n < 2:
+        stacked[:] = False
+
+    zeros = [None]*len(coeffs)
+    rows = np.where(stacked)[0]
+    if len(rows) > 0:
+        matrices = companion_matrices(coeffs[rows]) if power else colleague_matrices(coeffs[rows])
+        for row, row_zeros in zip(rows, la.eigvals(matrices)):
+            zeros[row] = row_zeros
+    poly_class = MultiPower if power else MultiCheb
+    for row in np.where(~stacked)[0]:
+        zeros[row] = solve(poly_class(coeffs[row]), MSmatrix=MSmatrix)
+    return zeros
+
+def companion_matrices(coeffs):
+    """Stacks the 180 rotated companion matrices of power polynomials, as in multPowerR.
+
+    Parameters
+    ----------
+    coeffs : numpy array
+        Each row is the coefficients of a polynomial with a nonzero leading coefficient.
+
+    Returns
+    -------
+    matrices : numpy array
+        matrices[i] is the rotated companion matrix of the i'th polynomial.
+    """
+    num_polys, n = coeffs.shape[0], coeffs.shape[1] - 1
+    matrices = np.zeros((num_polys, n, n), dtype=np.result_type(float, coeffs))
+    matrices.reshape(num_polys, -1)[:,n::n+1] = 1
+    matrices[:,:,-1] -= coeffs[:,:-1]/coeffs[:,-1:]
+    return matrices[:,::-1,::-1]
+
+def colleague_matrices(coeffs):
+    """Stacks the 180 rotated colleague matrices of chebyshev polynomials, as in multChebR.
+
+    Parameters
+    ----------
+    coeffs : numpy array
+        Each row is the coefficients of a polynomial with a nonzero leading coefficient.
+
+    Returns
+    -------
+    matrices : numpy array
+        matrices[i] is the rotated colleague matrix of the i'th polynomial.
+    """
+    num_polys, n = coeffs.shape[0], coeffs.shape[1] - 1
+    matrices = np.zeros((num_polys, n, n), dtype=np.result_type(float, coeffs))
+    matrices[:,1,0] = 1
+    flat = matrices.reshape(num_polys, -1)
+    flat[:,1::n+1] = 1/2
+    flat[:,2*n+1::n+1] = 1/2
+    matrices[:,:,-1] -= .5*coeffs[:,:-1]/coeffs[:,-1:]
+    return matrices[:,::-1,::-1]
+
+@jit(nopython=True, cache=True)
+def cheb_newton_steps(coeff, points):
+    """Finds p/p' at each point for a chebyshev polynomial p, with Clenshaw recurrences for p and p'.
+
+    Off [-1,1] the recurrences grow like T_n, so they are divided down whenever they get big,
+    and the coefficients still to be added are shrunk by the same amount, which cancels in p/p'.
+    """
+    n = len(coeff) - 1
+    steps = np.empty(len(points), dtype=np.complex128)
+    for j in range(len(points)):
+        x2 = 2*points[j]
+        b1, b2, d1, d2 = 0j, 0j, 0j, 0j
+        #The recurrences are stored divided by 1/shrink.
+        shrink = 1.
+        for k in range(n, 0, -1):
+            b = coeff[k]*shrink + x2*b1 - b2
+            d = 2*b1 + x2*d1 - d2
+            b2, b1 = b1, b
+            d2, d1 = d1, d
+            size = abs(b1.real) + abs(b1.imag) + abs(d1.real) + abs(d1.imag)
+            if size > 1.e100:
+                b1, b2, d1, d2 = b1/size, b2/size, d1/size, d2/size
+                shrink /= size
+        steps[j] = (coeff[0]*shrink + .5*x2*b1 - b2)/(b1 + .5*x2*d1 - d2)
+    return steps
+
+def aberth(coeff, power, tol=1.e-14, maxiter=100, block=256, patience=10):
+    """Finds the zeros of a 1-D polynomial with the Aberth-Ehrlich iteration.
+
+    Each iteration evaluates the polynomial and its derivative at every approximate zero, which
+    is O(n^2) time, and never builds a matrix. The sums over pairs of zeros are done block rows
+    at a time, so it uses O(n) memory instead of the O(n^2) of the companion or colleague matrix.
+
+    Parameters
+    ----------
+    coeff : numpy array
+        The coefficients of the polynomial, with a nonzero leading coefficient.
+    power : bool
+        If True the polynomial is a power polynomial, otherwise a chebyshev polynomial.
+    tol : float
+        A zero has converged when its update is less than tol relative to its size.
+    maxiter : int
+        The most iterations.
+    block : int
+        The number of zeros whose pair sums are done at once.
+    patience : int
+        It gives up if this many iterations in a row don't converge any more zeros while between a tenth
+        and half of them are left, or four times this many while more than half are left.
+
+    Returns
+    -------
+    zeros : numpy array
+        An array of the zeros, or None if it didn't converge.
+    """
+    n = len(coeff) - 1
+    if n < 1 or coeff[-1] == 0:
+        return None
+    coeff = np.asarray(coeff, dtype=np.result_type(float, coeff))
+    #Start on a circle for power polynomials and on an ellipse around [-1,1] for chebyshev ones.
+    circle = np.exp(1j*(2*np.pi*np.arange(n)/n + .4))
+    if power:
+        radius = np.abs(coeff[0]/coeff[-1])**(1/n) if coeff[0] != 0 else 1.
+        zeros = radius*circle
+        deriv = power_poly.polyder(coeff)
+        #Outside the unit circle the reversed polynomial is evaluated at 1/z instead.
+        reverse = coeff[::-1]
+        reverse_deriv = power_poly.polyder(reverse)
+    else:
+        zeros = (1.05*circle + 1/(1.05*circle))/2
+        cheb_coeff = coeff.astype(np.complex128)
+
+    active = np.arange(n)
+    stalled = 0
+    #Overflows and divisions by zero only happen on the way to giving up, so they aren't warned about.
+    with np.errstate(all='ignore'):
+        for i in range(maxiter):
+            current = zeros[active]
+            #The newton step p/p' at each active zero.
+            if power:
+                newton = np.empty(len(current), dtype=complex)
+                inside = np.abs(current) <= 1
+                newton[inside] = power_poly.polyval(current[inside], coeff)/power_poly.polyval(current[inside], deriv)
+                inv = 1/current[~inside]
+                value = power_poly.polyval(inv, reverse)
+                newton[~inside] = value/(inv*(n*value - inv*power_poly.polyval(inv, reverse_deriv)))
+            else:
+                newton = cheb_newton_steps(cheb_coeff, current)
+
+            #The sum of 1/(z_i - z_j) over the other zeros.
+            sums = np.empty(len(current), dtype=complex)
+            for start in range(0, len(current), block):
+                diff = current[start:start+block, np.newaxis] - zeros
+                diff[np.arange(len(diff)), active[start:start+block]] = np.inf
+                sums[start:start+block] = np.sum(1/diff, axis=1)
+
+            step = newton/(1 - newton*sums)
+            if not np.all(np.isfinite(step)):
+                return None
+            zeros[active] = current - step
+            still_active = active[np.abs(step) > tol*np.maximum(1, np.abs(current))]
+            if len(still_active) == 0:
+                return zeros
+            #If many zeros stop converging they are stuck, and the caller's eigensolve is better than more
+            #iterations. Few converge for a while at first, so until half have that gets more time.
+            #A few slow zeros at the end cost little to keep iterating.
+            stalled = stalled + 1 if len(still_active) == len(active) and 10*len(still_active) > n else 0
+            if stalled == (patience if 2*len(still_active) < n else 4*patience):
+                return None
+            active = still_active
+    return None
+
 def multPower(coeff, eigvals=True, verbose=False):
     """Finds the zeros of a 1-D power polynomial using a multiplication matrix.
 
@@ -65,6 +263,11 @@ def multPower(coeff, eigvals=True, verbose=False):
     if n == 1:
         return np.array([-coeff[0]/coeff[1]])
 
+    if eigvals and not verbose and n >= STRUCTURED_DEGREE:
+        zeros = aberth(coeff, power=True)
+        if zeros is not None:
+            return zeros
+
     matrix = np.zeros((n, n), dtype=coeff.dtype)
     bot = matrix.reshape(-1)[n::n+1]
     bot[...] = 1
@@ -104,6 +307,11 @@ def multPowerR(coeff, eigvals=True, verbose=False):
     if n == 1:
         return np.array([-coeff[0]/coeff[1]])
 
+    if eigvals and not verbose and n >= STRUCTURED_DEGREE:
+        zeros = aberth(coeff, power=True)
+        if zeros is not None:
+            return zeros
+
     matrix = np.zeros((n, n), dtype=coeff.dtype)
     bot = matrix.reshape(-1)[n::n+1]
     bot[...] = 1
@@ -145,6 +353,11 @@ def divPower(coeff, eigvals=True, verbose=False):
         return np.array([-coeff[0]/coeff[1]])
 
 
+    if eigvals and not verbose and n >= STRUCTURED_DEGREE:
+        zeros = aberth(coeff, power=True)
+        if zeros is not None:
+            return zeros
+
     matrix = np.zeros((n, n), dtype=coeff.dtype)
     bot = matrix.reshape(-1)[1::n+1]
     bot[...] = 1
@@ -184,6 +397,11 @@ def multCheb(coeff, eigvals=True, verbose=False):
     if n == 1:
         return np.array([-coeff[0]/coeff[1]])
 
+    if eigvals and not verbose and n >= STRUCTURED_DEGREE:
+        zeros = aberth(coeff, power=False)
+        if zeros is not None:
+            return zeros
+
     matrix = np.zeros((n,n), dtype=coeff.dtype)
     matrix[1][0] = 1
     bot = matrix.reshape(-1)[1::n+1]
@@ -226,6 +444,11 @@ def multChebR(coeff, eigvals=True, verbose=False):
     if n == 1:
         return np.array([-coeff[0]/coeff[1]])
 
+    if eigvals and not verbose and n >= STRUCTURED_DEGREE:
+        zeros = aberth(coeff, power=False)
+        if zeros is not None:
+            return zeros
+
     matrix = np.zeros((n,n), dtype=coeff.dtype)
     matrix[1][0] = 1
     bot = matrix.reshape(-1)[1::n+1]
@@ -284,6 +507,11 @@ def divCheb(coeff, eigvals=True, verbose=False):
     if n == 1:
         return np.array([-coeff[0]/coeff[1]])
 
+    if eigvals and not verbose and n >= STRUCTURED_DEGREE:
+        zeros = aberth(coeff, power=False)
+        if zeros is not None:
+            return zeros
+
     matrix = np.zeros((n,n), dtype=coeff.dtype)
 
     sign = 1
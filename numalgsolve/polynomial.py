@@ -3,10 +3,10 @@ import itertools
 from numpy.polynomial import chebyshev as cheb
 from numpy.polynomial import polynomial as poly
 from scipy.signal import fftconvolve, convolve
-from numalgsolve.utils import Term, makePolyCoeffMatrix, match_size, slice_top, slice_bottom
+from numalgsolve.utils import Term, makePolyCoeffMatrix, match_size, slice_top, slice_bottom, PlanCache
 import time
 
-from numba import jit
+from numba import jit, prange
 
 @jit(cache=True)
 def polyval(x, cc): #pragma: no cover
@@ -60,6 +60,250 @@ def chebval2(x, cc): #pragma: no cover
             c1 = tmp + c1*x2
     return c0 + c1*x
 
+@jit(nopython=True, cache=True)
+def _clenshaw_axis(src, dst, n, inner, x): #pragma: no cover
+    #Evaluates the chebyshev series along the leading axis of src, which is stored flat with
+    #n rows of length inner, at x. The results go in the first inner entries of dst, which
+    #can be the same array as src.
+    for j in range(inner):
+        c1 = src[j]*0
+        if n == 1:
+            c0 = src[j]
+        elif n == 2:
+            c0 = src[j]
+            c1 = src[inner + j]
+        else:
+            x2 = 2*x
+            c0 = src[(n-2)*inner + j]
+            c1 = src[(n-1)*inner + j]
+            for i in range(3, n + 1):
+                tmp = c0
+                c0 = src[(n-i)*inner + j] - c1
+                c1 = tmp + c1*x2
+        dst[j] = c0 + c1*x
+
+@jit(nopython=True, cache=True)
+def _horner_axis(src, dst, n, inner, x): #pragma: no cover
+    #The power series version of _clenshaw_axis.
+    for j in range(inner):
+        c0 = src[(n-1)*inner + j]
+        for i in range(2, n + 1):
+            c0 = src[(n-i)*inner + j] + c0*x
+        dst[j] = c0
+
+@jit(nopython=True, parallel=True, cache=True)
+def chebval_nd(points, coeff, shape, out): #pragma: no cover
+    """Evaluates a chebyshev coefficient tensor at each of the points.
+
+    coeff is the tensor flattened in C order and shape is its shape. Each point only
+    needs a buffer the size of one slice of the tensor, and the points are evaluated in parallel.
+    """
+    num_points, dim = points.shape
+    for m in prange(num_points):
+        inner = len(coeff) // shape[0]
+        buf = np.empty_like(coeff[:inner])
+        _clenshaw_axis(coeff, buf, shape[0], inner, points[m,0])
+        for d in range(1, dim):
+            inner = inner // shape[d]
+            _clenshaw_axis(buf, buf, shape[d], inner, points[m,d])
+        out[m] = buf[0]
+
+@jit(nopython=True, parallel=True, cache=True)
+def polyval_nd(points, coeff, shape, out): #pragma: no cover
+    """The power series version of chebval_nd."""
+    num_points, dim = points.shape
+    for m in prange(num_points):
+        inner = len(coeff) // shape[0]
+        buf = np.empty_like(coeff[:inner])
+        _horner_axis(coeff, buf, shape[0], inner, points[m,0])
+        for d in range(1, dim):
+            inner = inner // shape[d]
+            _horner_axis(buf, buf, shape[d], inner, points[m,d])
+        out[m] = buf[0]
+
+@jit(nopython=True, cache=True)
+def _clenshaw_axis_deriv(src, dst, dsrc, n, inner, x): #pragma: no cover
+    #Like _clenshaw_axis, but also puts the derivative with respect to x in dsrc, which
+    #can't be the same array as src. This differentiates each step of the recurrence.
+    for j in range(inner):
+        c1 = src[j]*0
+        dc0 = c1
+        dc1 = c1
+        if n == 1:
+            c0 = src[j]
+        elif n == 2:
+            c0 = src[j]
+            c1 = src[inner + j]
+        else:
+            x2 = 2*x
+            c0 = src[(n-2)*inner + j]
+            c1 = src[(n-1)*inner + j]
+            for i in range(3, n + 1):
+                tmp = c0
+                dtmp = dc0
+                c0 = src[(n-i)*inner + j] - c1
+                dc0 = -dc1
+                dc1 = dtmp + dc1*x2 + 2*c1
+                c1 = tmp + c1*x2
+        dsrc[j] = dc0 + dc1*x + c1
+        dst[j] = c0 + c1*x
+
+@jit(nopython=True, cache=True)
+def _horner_axis_deriv(src, dst, dsrc, n, inner, x): #pragma: no cover
+    #The power series version of _clenshaw_axis_deriv.
+    for j in range(inner):
+        c0 = src[(n-1)*inner + j]
+        dc0 = c0*0
+        for i in range(2, n + 1):
+            dc0 = c0 + dc0*x
+            c0 = src[(n-i)*inner + j] + c0*x
+        dsrc[j] = dc0
+        dst[j] = c0
+
+@jit(nopython=True, parallel=True, cache=True)
+def chebval_grad_nd(points, coeff, shape, out, grad_out): #pragma: no cover
+    """Evaluates a chebyshev coefficient tensor and its gradient at each of the points.
+
+    Works like chebval_nd, but also carries a buffer for the partial derivative with respect
+    to each variable through the sweep over the axes.
+    """
+    num_points, dim = points.shape
+    for m in prange(num_points):
+        inner = len(coeff) // shape[0]
+        buf = np.empty_like(coeff[:inner])
+        grads = np.empty((dim, inner), dtype=buf.dtype)
+        _clenshaw_axis_deriv(coeff, buf, grads[0], shape[0], inner, points[m,0])
+        for d in range(1, dim):
+            inner = inner // shape[d]
+            for e in range(d):
+                _clenshaw_axis(grads[e], grads[e], shape[d], inner, points[m,d])
+            _clenshaw_axis_deriv(buf, buf, grads[d], shape[d], inner, points[m,d])
+        out[m] = buf[0]
+        for d in range(dim):
+            grad_out[m,d] = grads[d,0]
+
+@jit(nopython=True, parallel=True, cache=True)
+def polyval_grad_nd(points, coeff, shape, out, grad_out): #pragma: no cover
+    """The power series version of chebval_grad_nd."""
+    num_points, dim = points.shape
+    for m in prange(num_points):
+        inner = len(coeff) // shape[0]
+        buf = np.empty_like(coeff[:inner])
+        grads = np.empty((dim, inner), dtype=buf.dtype)
+        _horner_axis_deriv(coeff, buf, grads[0], shape[0], inner, points[m,0])
+        for d in range(1, dim):
+            inner = inner // shape[d]
+            for e in range(d):
+                _horner_axis(grads[e], grads[e], shape[d], inner, points[m,d])
+            _horner_axis_deriv(buf, buf, grads[d], shape[d], inner, points[m,d])
+        out[m] = buf[0]
+        for d in range(dim):
+            grad_out[m,d] = grads[d,0]
+
+@jit(nopython=True, cache=True)
+def scatter_add(out, targets, values, sources, weight): #pragma: no cover
+    """Adds weight*values[sources[j]] to out[targets[j]] for each j, in place."""
+    for j in range(len(targets)):
+        out[targets[j]] += weight*values[sources[j]]
+
+#The gather/scatter maps of MultiCheb.mon_mult, keyed by the shapes and the monomial.
+mon_mult_maps = PlanCache(maxsize=4096)
+
+def cheb_mon_mult_map(shape, mon, out_shape):
+    """Finds where each coefficient of a chebyshev tensor goes when it is multiplied by a monomial.
+
+    In each variable T_a*T_m = (T_{a+m} + T_{|a-m|})/2, so every coefficient lands in 2^k spots,
+    where k is the number of variables in the monomial. The maps are kept in mon_mult_maps.
+
+    Parameters
+    ----------
+    shape : tuple
+        The shape of the coefficient tensor.
+    mon : tuple
+        The exponents of the monomial.
+    out_shape : tuple
+        The shape of the tensor the product goes in. At least shape + mon in each dimension.
+
+    Returns
+    -------
+    sources : numpy array
+        Flat indices into the coefficient tensor.
+    targets : numpy array
+        Flat indices into the product tensor.
+    weight : float
+        What every coefficient is multiplied by.
+    """
+    shape, mon, out_shape = [tuple(int(i) for i in t) for t in (shape, mon, out_shape)]
+    def build():
+        sources, targets = [], []
+        for size, m in zip(shape, mon):
+            spots = np.arange(size)
+            if m == 0:
+                sources.append(spots)
+                targets.append(spots)
+            else:
+                sources.append(np.concatenate((spots, spots)))
+                targets.append(np.concatenate((spots + m, np.abs(spots - m))))
+        sources = np.meshgrid(*sources, indexing='ij')
+        targets = np.meshgrid(*targets, indexing='ij')
+        return {'sources' : np.ravel_multi_index(sources, shape).ravel(),
+                'targets' : np.ravel_multi_index(targets, out_shape).ravel(),
+                'weight' : np.array(.5**np.count_nonzero(mon))}
+    maps = mon_mult_maps.get((shape, mon, out_shape), build)
+    return maps['sources'], maps['targets'], float(maps['weight'])
+
+def evaluate_nd(kernel, points, coeff):
+    """Evaluates a coefficient tensor at an array of points with chebval_nd or polyval_nd.
+
+    Parameters
+    ----------
+    kernel : function
+        chebval_nd or polyval_nd.
+    points : numpy array
+        The points to evaluate at. Each row is a point.
+    coeff : numpy array
+        The coefficient tensor.
+
+    Returns
+    -------
+    values : numpy array
+        The value at each point.
+    """
+    dtype = np.result_type(points, coeff, np.float64)
+    points = np.ascontiguousarray(points, dtype=dtype)
+    flat_coeff = np.ascontiguousarray(coeff, dtype=dtype).ravel()
+    values = np.empty(len(points), dtype=dtype)
+    kernel(points, flat_coeff, np.array(coeff.shape, dtype=np.int64), values)
+    return values
+
+def evaluate_grad_nd(kernel, points, coeff):
+    """Evaluates a coefficient tensor and its gradient at an array of points with
+    chebval_grad_nd or polyval_grad_nd.
+
+    Parameters
+    ----------
+    kernel : function
+        chebval_grad_nd or polyval_grad_nd.
+    points : numpy array
+        The points to evaluate at. Each row is a point.
+    coeff : numpy array
+        The coefficient tensor.
+
+    Returns
+    -------
+    values : numpy array
+        The value at each point.
+    grads : numpy array
+        grads[i] is the gradient at the ith point.
+    """
+    dtype = np.result_type(points, coeff, np.float64)
+    points = np.ascontiguousarray(points, dtype=dtype)
+    flat_coeff = np.ascontiguousarray(coeff, dtype=dtype).ravel()
+    values = np.empty(len(points), dtype=dtype)
+    grads = np.empty(points.shape, dtype=dtype)
+    kernel(points, flat_coeff, np.array(coeff.shape, dtype=np.int64), values, grads)
+    return values, grads
+
 def getPoly(deg,dim,power):
     '''
     A helper function for testing. Returns a random upper triangular polynomial of the given dimension and degree.
@@ -152,7 +396,6 @@ class Polynomial(object):
         self.dim = self.coeff.ndim
         self.order = order
         self.shape = self.coeff.shape
-        self.jac = None
         if lead_term is None:
             self.update_lead_term()
         else:
@@ -352,132 +595,22 @@ class MultiCheb(Polynomial):
             new_self, new_other = self.coeff, other.coeff
         return MultiCheb((new_self - (new_other)), clean_zeros = False)
 
-    def _fold_in_i_dir(solution_matrix, dim, fdim, size_in_fdim, fold_idx):
-        """
-        Finds T_|m-n| (Referred to as folding in proceeding documentation)
-        for a given dimension of a matrix.
-
-        Parameters
-        ----------
-        solution_matrix : ndarray
-            Polynomial to by folded.
-        dim : int
-            The number of dimensions in solution_matrix.
-        fdim : int
-            The dimension being folded.
-        size_in_fdim : int
-            The size of the solution matrix in the dimension being folded.
-        fold_idx : int
-            The index to fold around.
-
-        Returns
-        -------
-        sol : ndarray
-
-        """
-        if fold_idx == 0:
-            return solution_matrix
-
-        sol = np.zeros_like(solution_matrix) #Matrix of zeroes used to insert the new values..
-        slice_0 = slice(None, 1, None) # index to take first slice
-        slice_1 = slice(fold_idx, fold_idx+1, None) # index to take slice that contains the axis folding around.
-
-        #indexers are made with a slice index for every dimension.
-        indexer1 = [slice(None)]*dim
-        indexer2 = [slice(None)]*dim
-        indexer3 = [slice(None)]*dim
-
-        #Changes the index in each indexer for the correct dimension
-        indexer1[fdim] = slice_0
-        indexer2[fdim] = slice_1
-
-        #makes first slice in sol equal to the slice we fold around in solution_matrix
-        sol[indexer1] = solution_matrix[indexer2]
-
-        #Loop adds the slices above and below the slice we rotate around and inserts solutions in sol.
-        for n in range(size_in_fdim):
-
-            slice_2 = slice(n+1, n+2, None) #Used to imput new values in sol.
-            slice_3 = slice(fold_idx+n+1, fold_idx+n+2, None) #Used to find slices that are n above fold_idx
-            slice_4 = slice(fold_idx-n-1, fold_idx-n, None) #Used to find slices that are n below fold_idx
-
-            indexer1[fdim] = slice_2
-            indexer2[fdim] = slice_3
-            indexer3[fdim] = slice_4
-
-            #if statement checks to ensure that slices to be added are contained in the matrix.
-            if fold_idx-n-1 < 0:
-                if fold_idx+n+2 > size_in_fdim:
-                    break
-                else:
-                    sol[indexer1] = solution_matrix[indexer2]
-            else:
-                if fold_idx+n+2 > size_in_fdim:
-                    sol[indexer1] = solution_matrix[indexer3]
-                else:
-                    sol[indexer1] = solution_matrix[indexer3] + solution_matrix[indexer2]
-
-        return sol
-
-    def _mon_mult1(initial_matrix, idx, dim_mult):
-        """
-        Executes monomial multiplication in one dimension.
-
-        Parameters
-        ----------
-        initial_matrix : array_like
-            Matrix of coefficients that represent a Chebyshev polynomial.
-        idx : tuple of ints
-            The index of a monomial of one variable to multiply by initial_matrix.
-        dim_mult : int
-            The location of the non-zero value in idx.
-
-        Returns
-        -------
-        ndarray
-            Coeff that are the result of the one dimensial monomial multiplication.
-
-        """
-
-        p1 = np.zeros(initial_matrix.shape + idx)
-        p1[slice_bottom(initial_matrix)] = initial_matrix
-
-        largest_idx = [i-1 for i in initial_matrix.shape]
-        new_shape = [max(i,j) for i,j in itertools.zip_longest(largest_idx, idx, fillvalue = 0)] #finds the largest length in each dimmension
-        if initial_matrix.shape[dim_mult] <= idx[dim_mult]:
-            add_a = [i-j for i,j in itertools.zip_longest(new_shape, largest_idx, fillvalue = 0)]
-            add_a_list = np.zeros((len(new_shape),2))
-            #changes the second column to the values of add_a and add_b.
-            add_a_list[:,1] = add_a
-            #uses add_a_list and add_b_list to pad each polynomial appropriately.
-            initial_matrix = np.pad(initial_matrix,add_a_list.astype(int),'constant')
-
-        number_of_dim = initial_matrix.ndim
-        shape_of_self = initial_matrix.shape
-
-        #Loop iterates through each dimension of the polynomial and folds in that dimension
-        for i in range(number_of_dim):
-            if idx[i] != 0:
-                initial_matrix = MultiCheb._fold_in_i_dir(initial_matrix, number_of_dim, i, shape_of_self[i], idx[i])
-        if p1.shape != initial_matrix.shape:
-            idx = [i-j for i,j in zip(p1.shape,initial_matrix.shape)]
-
-            result = np.zeros(np.array(initial_matrix.shape) + idx)
-            result[slice_top(initial_matrix)] = initial_matrix
-            initial_matrix = result
-        Pf = p1 + initial_matrix
-        return .5*Pf
-
-    def mon_mult(self, idx, returnType = 'Poly'):
+    def mon_mult(self, idx, returnType = 'Poly', out = None):
         """
         Multiplies a Chebyshev polynomial by a monomial
 
+        The coefficients are scattered with the cached maps of cheb_mon_mult_map, so nothing but
+        the product is allocated, and not even that when out is given.
+
         Parameters
         ----------
         idx : tuple of ints
             The index of the monomial to multiply self by.
         returnType : str
             If 'Poly' then returns a polynomial object.
+        out : ndarray
+            A C contiguous array the product is written into, of at least the shape of the
+            coefficients plus idx in each dimension. Anything in it is overwritten.
 
         Returns
         -------
@@ -485,16 +618,19 @@ class MultiCheb(Polynomial):
         ndarray if returnType is "Matrix".
 
         """
-        initial_matrix = self.coeff
-        idx_zeros = np.zeros(len(idx),dtype = int)
-        for i in range(len(idx)):
-            idx_zeros[i] = idx[i]
-            initial_matrix = MultiCheb._mon_mult1(initial_matrix, idx_zeros, i)
-            idx_zeros[i] = 0
+        shape = np.array(self.shape) + np.array(idx, dtype=int)
+        if out is None:
+            out = np.zeros(shape, dtype=np.result_type(float, self.coeff))
+        else:
+            if out.ndim != self.dim or np.any(np.array(out.shape) < shape) or not out.flags.c_contiguous:
+                raise ValueError('out must be C contiguous with at least shape {}'.format(tuple(shape)))
+            out[...] = 0
+        sources, targets, weight = cheb_mon_mult_map(self.shape, idx, out.shape)
+        scatter_add(out.reshape(-1), targets, np.ascontiguousarray(self.coeff).reshape(-1), sources, weight)
         if returnType == 'Poly':
-            return MultiCheb(initial_matrix, lead_term = self.lead_term + np.array(idx), clean_zeros = False)
+            return MultiCheb(out, lead_term = self.lead_term + np.array(idx), clean_zeros = False)
         elif returnType == 'Matrix':
-            return initial_matrix
+            return out
 
     def __call__(self, points):
         '''
@@ -512,11 +648,7 @@ class MultiCheb(Polynomial):
         '''
         points = super(MultiCheb, self).__call__(points)
 
-        c = self.coeff
-        n = c.ndim
-        c = chebval2(points[:,0],c)
-        for i in range(1,n):
-            c = chebval(points[:,i],c)
+        c = evaluate_nd(chebval_nd, points, self.coeff)
         if len(c) == 1:
             return c[0]
         else:
@@ -568,18 +700,28 @@ class MultiCheb(Polynomial):
         super(MultiCheb, self).__call__(point)
 
         out = np.empty(self.dim,dtype="complex_")
-        if self.jac is None:
-            jac = list()
-            for i in range(self.dim):
-                jac.append(cheb.chebder(self.coeff,axis=i))
-            self.jac = jac
-        spot = 0
-        for i in self.jac:
-            out[spot] = chebvalnd(point,i)
-            spot+=1
-
+        out[:] = self.value_and_grad(point)[1][0]
         return out
 
+    def value_and_grad(self, points):
+        '''
+        Evaluates the polynomial and its gradient at the given points in one pass.
+
+        Parameters
+        ----------
+        points : array-like
+            the points at which to evaluate the polynomial
+
+        Returns
+        -------
+        values : ndarray
+            The value of the polynomial at each point.
+        grads : ndarray
+            grads[i] is the gradient of the polynomial at the ith point.
+        '''
+        points = super(MultiCheb, self).__call__(points)
+        return evaluate_grad_nd(chebval_grad_nd, points, self.coeff)
+
 ###############################################################################
 
 #### MULTI_POWER ##############################################################
@@ -774,11 +916,7 @@ class MultiPower(Polynomial):
         '''
         points = super(MultiPower, self).__call__(points)
 
-        c = self.coeff
-        n = c.ndim
-        c = polyval2(points[:,0],c)
-        for i in range(1,n):
-            c = polyval(points[:,i],c)
+        c = evaluate_nd(polyval_nd, points, self.coeff)
         if len(c) == 1:
             return c[0]
         else:
@@ -831,18 +969,28 @@ class MultiPower(Polynomial):
         super(MultiPower, self).__call__(point)
 
         out = np.empty(self.dim,dtype="complex_")
-        if self.jac is None:
-            jac = list()
-            for i in range(self.dim):
-                jac.append(poly.polyder(self.coeff,axis=i))
-            self.jac = jac
-        spot = 0
-        for i in self.jac:
-            out[spot] = polyvalnd(point,i)
-            spot+=1
-
+        out[:] = self.value_and_grad(point)[1][0]
         return out
 
+    def value_and_grad(self, points):
+        '''
+        Evaluates the polynomial and its gradient at the given points in one pass.
+
+        Parameters
+        ----------
+        points : array-like
+            the points at which to evaluate the polynomial
+
+        Returns
+        -------
+        values : ndarray
+            The value of the polynomial at each point.
+        grads : ndarray
+            grads[i] is the gradient of the polynomial at the ith point.
+        '''
+        points = super(MultiPower, self).__call__(points)
+        return evaluate_grad_nd(polyval_grad_nd, points, self.coeff)
+
 ###############################################################################
 
 #### CONVERT_POLY #############################################################
@@ -1,9 +1,14 @@
 import numpy as np
 import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from numalgsolve import OneDimension as oneD
 from numalgsolve.polynomial import MultiCheb, MultiPower, is_power
-from numalgsolve.Division import division
-from numalgsolve.Multiplication import multiplication
+from numalgsolve.Division import division, division_plan
+from numalgsolve.Multiplication import multiplication, multiplication_batch, macaulay_plan
+from numalgsolve.transport import ArrayArena, MIN_SHARED_BYTES, encode_polys, decode_polys, is_encodable, open_array
 from numalgsolve.utils import Term, get_var_list, divides, MacaulayError, InstabilityWarning, match_size, match_poly_dimensions
 
 def solve(polys, MSmatrix=0, eigvals=True, verbose=False):
@@ -63,3 +68,412 @@ def solve(polys, MSmatrix=0, eigvals=True, verbose=False):
             return division(polys, verbose=verbose, divisor_var=-MSmatrix-1)
         else:
             return multiplication(polys, verbose=verbose, MSmatrix=MSmatrix)
+
+def solve_stream(systems, workers=None, prefetch=None, ordered=False, executor='process', parse=None, with_ids=False,
+                 MSmatrix=0, shared_min_bytes=MIN_SHARED_BYTES):
+    '''
+    Finds the roots of a stream of polynomial systems, yielding them as they are solved.
+
+    The systems are parsed and solved in a pool of workers. At most prefetch systems are read from
+    the stream and in flight at once, so the stream can be endless and is never held in memory.
+    With a process pool, large coefficient tensors and roots are passed through shared memory
+    (see numalgsolve.transport) instead of being pickled.
+
+    Parameters
+    ----------
+    systems : iterable
+        The systems. Each item is a list of polynomial objects, or anything parse turns into one.
+    workers : int
+        The number of workers. Defaults to the number of cpus.
+    prefetch : int
+        The most systems in flight at once. Defaults to twice the number of workers.
+    ordered : bool
+        If True the systems are yielded in the order of the stream, otherwise as they finish.
+    executor : str or concurrent.futures.Executor
+        'process' to use a process pool, 'thread' to use a thread pool, or an existing Executor,
+        which is not shut down afterwards.
+    parse : callable
+        Called in the worker on each item to get the list of polynomials, for example to load
+        a .mat file from its filename. It must be picklable when using a process pool.
+    with_ids : bool
+        If True each item of systems is a (system_id, system) pair. Otherwise the system_id is
+        the position of the system in the stream.
+    MSmatrix : int
+        Controls which Moller-Stetter matrix is constructed, as in solve.
+    shared_min_bytes : int
+        Arrays with fewer bytes than this are pickled instead of shared. None pickles everything.
+
+    yields
+    ------
+    system_id : object
+        Which system was solved.
+    roots : numpy array
+        The common roots of the polynomials, or None if solving failed.
+    diagnostics : dict
+        'parse_time' and 'solve_time' in seconds, the 'number_of_roots', the largest absolute
+        value of the polynomials at the roots as 'residual', the 'worker' process id, and the
+        'error' that stopped the solve, or None.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if prefetch is None:
+        prefetch = 2*workers
+    if prefetch < 1:
+        raise ValueError('prefetch must be at least 1')
+    if isinstance(executor, Executor):
+        pool = executor
+    elif executor == 'process':
+        pool = ProcessPoolExecutor(max_workers=workers)
+    elif executor == 'thread':
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError("executor must be 'process', 'thread' or a concurrent.futures.Executor")
+
+    #Only process pools need to move the arrays between address spaces.
+    arena = None
+    if shared_min_bytes is not None and isinstance(pool, ProcessPoolExecutor):
+        arena = ArrayArena(min_bytes=shared_min_bytes)
+    share = None if arena is None else (arena.directory, arena.min_bytes)
+
+    def submit(system):
+        if arena is not None and parse is None and is_encodable(system):
+            encoded = encode_polys(system, arena)
+            future = pool.submit(_solve_stream_item, encoded, parse, MSmatrix, True, share)
+            return future, [descriptor for _, descriptor in encoded]
+        return pool.submit(_solve_stream_item, system, parse, MSmatrix, False, share), []
+
+    def result(future, descriptors):
+        roots, diagnostics = future.result()
+        for descriptor in descriptors:
+            arena.release(descriptor)
+        if share is not None and diagnostics.pop('shared_roots'):
+            roots = open_array(roots, take=True)
+        return roots, diagnostics
+
+    stream = iter(systems) if with_ids else enumerate(systems)
+    #In flight futures in the order they were submitted, each tagged with its system_id and shared inputs.
+    in_flight = deque()
+    try:
+        for system_id, system in itertools.islice(stream, prefetch):
+            in_flight.append((system_id,) + submit(system))
+        while in_flight:
+            if ordered:
+                system_id, future, descriptors = in_flight.popleft()
+            else:
+                done, _ = wait([item[1] for item in in_flight], return_when=FIRST_COMPLETED)
+                item = next(item for item in in_flight if item[1] in done)
+                in_flight.remove(item)
+                system_id, future, descriptors = item
+            roots, diagnostics = result(future, descriptors)
+            for next_id, next_system in itertools.islice(stream, 1):
+                in_flight.append((next_id,) + submit(next_system))
+            yield system_id, roots, diagnostics
+    finally:
+        for _, future, descriptors in in_flight:
+            #Running solves may still write shared roots, which have to be cleaned up.
+            if not future.cancel() and arena is not None:
+                try:
+                    result(future, descriptors)
+                except Exception:
+                    pass
+        if pool is not executor:
+            pool.shutdown()
+        if arena is not None:
+            arena.close()
+
+def _solve_stream_item(system, parse, MSmatrix, encoded=False, share=None):
+    '''
+    Parses and solves one system of solve_stream in a worker.
+
+    If encoded, system comes from transport.encode_polys. If share is a (directory, min_bytes) pair,
+    large roots are put in shared memory there and their descriptor is returned instead.
+
+    returns
+    -------
+    roots : numpy array
+        The roots, or None if an error was raised.
+    diagnostics : dict
+        See solve_stream. With share it also has 'shared_roots', whether roots is a descriptor.
+    '''
+    diagnostics = {'parse_time' : 0., 'solve_time' : 0., 'number_of_roots' : 0, 'residual' : None,
+                   'worker' : os.getpid(), 'error' : None}
+    roots = None
+    try:
+        start = time.time()
+        if encoded:
+            polys = decode_polys(system)
+        else:
+            polys = system if parse is None else parse(system)
+        diagnostics['parse_time'] = time.time() - start
+
+        start = time.time()
+        roots = solve(polys, MSmatrix=MSmatrix)
+        diagnostics['solve_time'] = time.time() - start
+        diagnostics['number_of_roots'] = len(roots)
+        if len(roots) > 0:
+            points = np.asarray(roots).reshape(len(roots), -1)
+            diagnostics['residual'] = max(np.max(np.abs(poly(points))) for poly in polys)
+    except Exception as e:
+        diagnostics['error'] = repr(e)
+    if share is not None:
+        diagnostics['shared_roots'] = isinstance(roots, np.ndarray)
+        if diagnostics['shared_roots']:
+            roots = ArrayArena(*share).put(roots, owned=False)
+    return roots, diagnostics
+
+def solve_batch(coeff_stack, basis='cheb', method='mult', MSmatrix=0, max_memory=None):
+    '''
+    Finds the roots of many systems of polynomials with the same shape.
+
+    The systems are grouped by the degrees of their polynomials, and each group is solved with
+    Plan.solve_batch.
+
+    Parameters
+    ----------
+    coeff_stack : numpy array
+        Shape (B, n_polys, d+1, ..., d+1). coeff_stack[b,i] is the coefficient tensor of the i'th
+        polynomial of the b'th system. There is one polynomial for each variable.
+    basis : string
+        'cheb' for MultiCheb polynomials or 'power' for MultiPower polynomials.
+    method : string
+        'mult' to use a multiplication matrix, or 'div' to use a division matrix.
+    MSmatrix : int
+        Controls which Moller-Stetter matrix is constructed, as in solve.
+    max_memory : int
+        About how many bytes of working memory the Macaulay reduction may use on top of the matrix.
+
+    returns
+    -------
+    roots : RaggedRoots
+        roots[b] holds the common roots of the b'th system.
+    '''
+    coeff_stack = np.asarray(coeff_stack)
+    roots = [None]*len(coeff_stack)
+    signatures, inverse = np.unique(coeff_degrees(coeff_stack), axis=0, return_inverse=True)
+    for i, degrees in enumerate(signatures):
+        systems = np.where(inverse == i)[0]
+        system_plan = plan(degrees, basis=basis, method=method, MSmatrix=MSmatrix, max_memory=max_memory)
+        for system, system_roots in zip(systems, system_plan.solve_batch(coeff_stack[systems])):
+            roots[system] = system_roots
+    return RaggedRoots(roots)
+
+def coeff_degrees(coeff_stack):
+    '''
+    Finds the degree of each polynomial in a stack of systems.
+
+    Parameters
+    ----------
+    coeff_stack : numpy array
+        Shape (B, n_polys, ...). coeff_stack[b,i] is the coefficient tensor of the i'th polynomial of the b'th system.
+
+    returns
+    -------
+    degrees : numpy array
+        Shape (B, n_polys). The total degree of each polynomial, -1 for zero polynomials.
+    '''
+    total_degrees = np.indices(coeff_stack.shape[2:]).sum(axis=0)
+    return np.where(coeff_stack != 0, total_degrees, -1).reshape(coeff_stack.shape[:2]+(-1,)).max(axis=2)
+
+class RaggedRoots(object):
+    '''
+    The roots of a batch of systems. Each system can have a different number of roots.
+
+    Parameters
+    ----------
+    roots_list : list of numpy arrays
+        The roots of each system.
+
+    Attributes
+    ----------
+    roots : numpy array
+        The roots of all the systems, one system after another.
+    offsets : numpy array
+        The roots of the i'th system are roots[offsets[i]:offsets[i+1]].
+    '''
+    def __init__(self, roots_list):
+        self.offsets = np.cumsum([0] + [len(roots) for roots in roots_list])
+        if len(roots_list) > 0:
+            self.roots = np.concatenate([np.asarray(roots, dtype=complex) for roots in roots_list])
+        else:
+            self.roots = np.zeros(0, dtype=complex)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('system index out of range')
+        return self.roots[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return 'RaggedRoots({} systems, {} roots)'.format(len(self), len(self.roots))
+
+def plan(degrees, basis='cheb', method='mult', MSmatrix=0, max_memory=None):
+    '''
+    Does the symbolic work of solving systems of polynomials with the given degrees.
+
+    The returned plan solves any system with those degrees, doing only the numeric work.
+    See Plan.
+
+    Parameters
+    ----------
+    degrees : tuple of ints
+        The degree of each polynomial. There is one polynomial for each variable.
+    basis : string
+        'cheb' for MultiCheb polynomials or 'power' for MultiPower polynomials.
+    method : string
+        'mult' to use a multiplication matrix, or 'div' to use a division matrix.
+    MSmatrix : int
+        Controls which Moller-Stetter matrix is constructed, as in solve.
+    max_memory : int
+        About how many bytes of working memory the Macaulay reduction may use on top of the matrix.
+
+    returns
+    -------
+    plan : Plan
+        The plan. Call plan.solve(coeffs) to find the roots of a system.
+    '''
+    return Plan(degrees, basis=basis, method=method, MSmatrix=MSmatrix, max_memory=max_memory)
+
+class Plan(object):
+    '''
+    The symbolic work of solving systems of polynomials with fixed degrees.
+
+    The term ordering and layout of the Macaulay matrix only depend on the degrees, the dimension
+    and the basis. A plan finds them once, holds on to them so they never leave the plan cache,
+    and then solve only scatters the coefficients into the layout and does the linear algebra.
+
+    Parameters
+    ----------
+    degrees : tuple of ints
+        The degree of each polynomial. There is one polynomial for each variable.
+    basis : string
+        'cheb' for MultiCheb polynomials or 'power' for MultiPower polynomials.
+    method : string
+        'mult' to use a multiplication matrix, or 'div' to use a division matrix.
+    MSmatrix : int
+        Controls which Moller-Stetter matrix is constructed, as in solve. For method 'div' a
+        negative MSmatrix i divides by x_{-i}, otherwise by x_1.
+    max_memory : int
+        About how many bytes of working memory the Macaulay reduction may use on top of the matrix.
+
+    Attributes
+    ----------
+    dim : int
+        The number of variables.
+    poly_class : class
+        MultiCheb or MultiPower.
+    number_of_roots : int
+        The number of roots by Bezout's Theorem.
+    layout : dict
+        The layout of the Macaulay matrix.
+    '''
+    def __init__(self, degrees, basis='cheb', method='mult', MSmatrix=0, max_memory=None):
+        self.degrees = tuple(int(deg) for deg in degrees)
+        self.dim = len(self.degrees)
+        if basis in ('cheb', 'MultiCheb'):
+            self.poly_class = MultiCheb
+        elif basis in ('power', 'MultiPower'):
+            self.poly_class = MultiPower
+        else:
+            raise ValueError("basis must be 'cheb' or 'power'")
+        if method not in ('mult', 'div'):
+            raise ValueError("method must be 'mult' or 'div'")
+        if method == 'mult' and self.dim > 1 and MSmatrix not in list(range(self.dim+1)):
+            raise ValueError('MSmatrix must be 0 (random polynomial), or the index of a variable')
+        self.method = method
+        self.MSmatrix = MSmatrix
+        self.max_memory = max_memory
+        self.number_of_roots = int(np.prod(self.degrees))
+
+        power = self.poly_class is MultiPower
+        if self.dim == 1:
+            self.layout = None
+        elif method == 'mult':
+            #MacaulayReduction puts the polynomials in order of descending degree.
+            self.layout = macaulay_plan(sorted(self.degrees, reverse=True), self.dim, power)
+        else:
+            self.divisor_var = -MSmatrix-1 if MSmatrix < 0 else 0
+            self.layout = division_plan(self.degrees, self.dim, self.divisor_var, True, power)
+
+    def __repr__(self):
+        return 'Plan(degrees={}, basis={}, method={})'.format(self.degrees, self.poly_class.__name__, self.method)
+
+    def polys(self, coeffs):
+        '''Makes the polynomials of a system and checks they fit the plan.
+
+        Parameters
+        ----------
+        coeffs : list of numpy arrays
+            The coefficient tensor of each polynomial.
+
+        returns
+        -------
+        polys : list of polynomial objects
+            The polynomials.
+        '''
+        polys = [self.poly_class(np.asarray(coeff)) for coeff in coeffs]
+        if tuple(poly.degree for poly in polys) != self.degrees or any(poly.dim != self.dim for poly in polys):
+            raise ValueError('The polynomials have degrees {} but the plan is for degrees {}'.format(
+                             tuple(poly.degree for poly in polys), self.degrees))
+        return polys
+
+    def solve(self, coeffs):
+        '''
+        Finds the common roots of a system of polynomials with the planned degrees.
+
+        Parameters
+        ----------
+        coeffs : list of numpy arrays
+            The coefficient tensor of each polynomial.
+
+        returns
+        -------
+        roots : numpy array
+            The common roots of the polynomials. Each row is a root.
+        '''
+        polys = self.polys(coeffs)
+        if self.dim == 1:
+            return oneD.solve(polys[0], MSmatrix=self.MSmatrix)
+        elif self.method == 'mult':
+            return multiplication(polys, MSmatrix=self.MSmatrix, max_memory=self.max_memory, layout=self.layout)
+        else:
+            return division(polys, divisor_var=self.divisor_var, layout=self.layout)
+
+    def solve_batch(self, coeff_stack):
+        '''
+        Finds the common roots of many systems of polynomials with the planned degrees.
+
+        With method 'mult' the Macaulay matrices are built together and the eigenproblems are stacked,
+        see multiplication_batch. One dimensional polynomials have their companion or colleague
+        matrices stacked, see OneDimension.solve_batch. With method 'div' the systems are solved one at a time.
+
+        Parameters
+        ----------
+        coeff_stack : numpy array
+            Shape (B, n_polys, ...). coeff_stack[b,i] is the coefficient tensor of the i'th polynomial
+            of the b'th system.
+
+        returns
+        -------
+        roots : list of numpy arrays
+            roots[b] holds the common roots of the b'th system.
+        '''
+        coeff_stack = np.asarray(coeff_stack)
+        degrees = coeff_degrees(coeff_stack)
+        if np.any(degrees != self.degrees) or coeff_stack.ndim != self.dim + 2:
+            raise ValueError('The polynomials do not have the degrees {} of the plan'.format(self.degrees))
+        if self.dim == 1:
+            return oneD.solve_batch(coeff_stack[:,0,:self.degrees[0]+1], self.poly_class is MultiPower,
+                                    MSmatrix=self.MSmatrix)
+        elif self.method == 'mult':
+            return multiplication_batch(coeff_stack, self.degrees, self.poly_class.__name__, MSmatrix=self.MSmatrix,
+                                        max_memory=self.max_memory, layout=self.layout)
+        else:
+            return [self.solve(coeffs) for coeffs in coeff_stack]
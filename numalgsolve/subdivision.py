@@ -9,6 +9,7 @@ the approximation degree is small enough to be solved efficiently.
 import numpy as np
 from numpy.fft.fftpack import fftn
 from numalgsolve.OneDimension import divCheb,divPower,multCheb,multPower,solve
+from numalgsolve import OneDimension as oneD
 from numalgsolve.Division import division
 from numalgsolve.utils import clean_zeros_from_matrix, slice_top
 from numalgsolve.polynomial import MultiCheb
@@ -16,8 +17,16 @@ from itertools import product
 from matplotlib import pyplot as plt
 from matplotlib import patches
 import itertools
-
-def solve(funcs, a, b, interval_data = False):
+import os
+import time
+import heapq
+import warnings
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from numalgsolve.transport import ArrayArena, MIN_SHARED_BYTES, default_arena_directory, open_array
+
+def solve(funcs, a, b, interval_data = False, workers = None, executor = 'process', priority = 'depth_first',\
+          max_depth = None, max_intervals = None, time_budget = None, batch_size = 1):
     '''
     Finds the real roots of the given list of functions on a given interval.
 
@@ -29,6 +38,27 @@ def solve(funcs, a, b, interval_data = False):
         The lower bound on the interval.
     b : numpy array
         The upper bound on the interval.
+    interval_data : bool
+        Whether to print and plot what happened to the intervals.
+    workers : int
+        The number of workers to solve the subintervals of a multi-dimensional interval with.
+        Defaults to None, which solves them serially in this process.
+    executor : str or concurrent.futures.Executor
+        'process' (default) to solve the subintervals in a process pool, 'thread' to use a
+        thread pool for functions that release the GIL, or an existing Executor to submit them to.
+        Passing an Executor turns on parallel solving even if workers is None.
+    priority : str or callable
+        The order the serial solve works through the intervals in. See frontier_priority.
+        Only matters when the solve is limited by one of the budgets below.
+    max_depth : int
+        The most times an interval may be subdivided. Deeper intervals are left unsolved.
+    max_intervals : int
+        The most intervals to solve for each function (one dimensional) or for the system.
+    time_budget : float
+        The most seconds to spend on the solve.
+    batch_size : int
+        How many intervals the serial multi-dimensional solve approximates at once. Each function
+        is then called on the points of all of them together, which helps vectorized functions.
     returns
     -------
     roots : numpy array
@@ -40,15 +70,28 @@ def solve(funcs, a, b, interval_data = False):
     for i in range(len(interval_checks) + len(subinterval_checks) + 1):
         interval_results.append([])
 
+    budgets = dict(max_depth=max_depth, max_intervals=max_intervals, time_budget=time_budget)
+    if (workers is not None or isinstance(executor, Executor)) and \
+       any(budget is not None for budget in budgets.values()):
+        raise ValueError("The subdivision budgets can't be used with a parallel solve")
+
     dim = len(a)
     if dim == 1:
         #one dimensional case
-        zeros = np.unique(subdivision_solve_1d(funcs[0],a,b))
+        start = time.time()
+        def solve_1d(func):
+            #Without limits every leaf is solved, so they can all be solved together at the end.
+            if all(budget is None for budget in budgets.values()):
+                return np.unique(subdivision_solve_1d(func,a,b))
+            if time_budget is not None:
+                budgets['time_budget'] = max(0, time_budget - (time.time() - start))
+            return np.unique(np.hstack([np.zeros(0)] + list(subdivision_solve_1d_iter(func,a,b,priority=priority,**budgets))))
+        zeros = solve_1d(funcs[0])
         #Finds the roots of each succesive function and checks which roots are common.
         for func in funcs[1:]:
             if len(zeros) == 0:
                 break
-            zeros2 = np.unique(subdivision_solve_1d(func,a,b))
+            zeros2 = solve_1d(func)
             common_zeros = []
             tol = 1.e-10
             for zero in zeros2:
@@ -67,7 +110,14 @@ def solve(funcs, a, b, interval_data = False):
             deg = deg_dim[dim]
 
         #Output the interval percentages
-        result = subdivision_solve_nd(funcs,a,b,deg,interval_results,interval_checks,subinterval_checks)
+        eval_stats = {'evaluations':0, 'saved':0}
+        if workers is None and not isinstance(executor, Executor):
+            result = np.vstack([np.zeros([0,dim])] + list(subdivision_solve_nd_iter(funcs,a,b,deg,interval_results,\
+                               interval_checks,subinterval_checks,priority=priority,eval_stats=eval_stats,\
+                               batch_size=batch_size,**budgets)))
+        else:
+            result = parallel_subdivision_solve_nd(funcs,a,b,deg,interval_results,interval_checks,subinterval_checks,\
+                                                   workers=workers,executor=executor,eval_stats=eval_stats)
 
         #Plot what happened
         if interval_data:
@@ -78,6 +128,8 @@ def solve(funcs, a, b, interval_data = False):
 
             print("Total intervals checked was {}".format(total_intervals))
             print("Methods used were {}".format(checkers))
+            print("Function evaluations were {}, {} were saved by reusing the coarse grid"\
+                  .format(eval_stats['evaluations'],eval_stats['saved']))
             print("The percent solved by each was {}".format((100*results_numbers / total_intervals).round(2)))
 
             if dim == 2:
@@ -136,6 +188,64 @@ def solve(funcs, a, b, interval_data = False):
 
         return result
 
+def solve_iter(funcs, a, b, priority = 'depth_first', max_depth = None, max_intervals = None, time_budget = None,\
+               unresolved = None):
+    '''
+    Finds the real roots of the given list of functions on a given interval, yielding them as they are found.
+
+    Parameters
+    ----------
+    funcs : list of callable functions
+        Functions to find the common roots of.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    priority : str or callable
+        The order to work through the intervals in. See frontier_priority. Defaults to 'depth_first' like
+        solve, which yields the roots in the order of the recursive subdivision. 'volume' spreads the
+        work out more evenly when the solve is cut short by one of the limits below.
+    max_depth : int
+        The most times an interval may be subdivided. Deeper intervals are left unsolved.
+    max_intervals : int
+        The most intervals to solve.
+    time_budget : float
+        The most seconds to spend on the solve.
+    unresolved : list
+        If given, the [a,b] of each interval left unsolved because of the limits above is appended to it.
+    yields
+    ------
+    roots : numpy array
+        The common roots found on one interval. Each row is a root.
+        For one dimensional systems of more than one function the roots can only be compared
+        once they are all found, so they are yielded all at once at the end.
+    '''
+    dim = len(a)
+    if dim == 1:
+        if len(funcs) == 1:
+            for zeros in subdivision_solve_1d_iter(funcs[0],a,b,priority=priority,max_depth=max_depth,\
+                                                   max_intervals=max_intervals,time_budget=time_budget,unresolved=unresolved):
+                yield zeros
+        else:
+            zeros = solve(funcs,a,b,priority=priority,max_depth=max_depth,max_intervals=max_intervals,time_budget=time_budget)
+            if len(zeros) > 0:
+                yield np.array(zeros)
+        return
+
+    interval_checks = [constant_term_check,full_quad_check]
+    subinterval_checks = [linear_check,quadratic_check1,quadratic_check2,quadratic_check3]
+    interval_results = [[] for i in range(len(interval_checks) + len(subinterval_checks) + 1)]
+    deg_dim = {2:5, 3:4, 4:3}
+    if dim > 4:
+        deg = 2
+    else:
+        deg = deg_dim[dim]
+    for zeros in subdivision_solve_nd_iter(funcs,a,b,deg,interval_results,interval_checks,subinterval_checks,\
+                                           priority=priority,max_depth=max_depth,max_intervals=max_intervals,\
+                                           time_budget=time_budget,unresolved=unresolved):
+        if len(zeros) > 0:
+            yield zeros
+
 def transform(x,a,b):
     """Transforms points from the interval [-1,1] to the interval [a,b].
 
@@ -174,7 +284,7 @@ def inv_transform(x,a,b):
     """
     return (2*x-b-a)/(b-a)
 
-def chebyshev_block_copy(values_block):
+def chebyshev_block_copy(values_block, batch_dims=0):
     """This functions helps avoid double evaluation of functions at
     interpolation points. It takes in a tensor of function evaluation values
     and copies these values to a new tensor appropriately to prepare for
@@ -184,20 +294,22 @@ def chebyshev_block_copy(values_block):
     ----------
     block_values : numpy array
       block of values from function evaluation
+    batch_dims : int
+      The number of leading axes that index separate blocks. Only the axes after them are copied.
 
     Returns
     -------
     cheb_values : numpy array
       chebyshev interpolation values
     """
-    dim = values_block.ndim
-    deg = values_block.shape[0] - 1
-    values_cheb = np.empty(tuple([2*deg])*dim, dtype=values_block.dtype)
+    dim = values_block.ndim - batch_dims
+    deg = values_block.shape[batch_dims] - 1
+    values_cheb = np.empty(values_block.shape[:batch_dims] + tuple([2*deg])*dim, dtype=values_block.dtype)
 
     for block in product([False,True],repeat=dim):
-        cheb_idx = [slice(0,deg+1)]*dim
-        block_idx = [slice(None)]*dim
-        for i,flip_dim in enumerate(block):
+        cheb_idx = [slice(None)]*batch_dims + [slice(0,deg+1)]*dim
+        block_idx = [slice(None)]*(batch_dims + dim)
+        for i,flip_dim in enumerate(block, batch_dims):
             if flip_dim:
                 cheb_idx[i] = slice(deg+1,None)
                 block_idx[i] = slice(deg-1,0,-1)
@@ -252,27 +364,64 @@ def interval_approximate_nd(f,a,b,degs):
     if len(a)!=len(b):
         raise ValueError("Interval dimensions must be the same!")
 
+    values_block = interval_values_nd(f,a,b,degs[0])
+    return interval_coeffs_nd(values_block,degs)
+
+def interval_values_nd(f,a,b,deg):
+    """Evaluates an n-dimensional function on the grid of chebyshev extrema of an interval.
+
+    Parameters
+    ----------
+    f : function from R^n -> R
+        The function to evaluate.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    deg : int
+        The degree of the interpolation. The grid has deg+1 points in each dimension.
+
+    Returns
+    -------
+    values_block : numpy array
+        The values of f at the grid points. values_block[i,j,...] is the value at the point
+        whose coordinates are the ith, jth, ... chebyshev extrema.
+    """
     dim = len(a)
-    deg = degs[0]
+    cheb_values = np.cos(np.arange(deg+1)*np.pi/deg)
 
     if hasattr(f,"evaluate_grid"):
         #for polynomials, we can quickly evaluate all points in a grid
         #xyz does not contain points, but the nth column of xyz has the values needed
         #along the nth axis. The direct product of these values procuces the grid
-        cheb_values = np.cos(np.arange(deg+1)*np.pi/deg)
         xyz = transform(np.column_stack([cheb_values]*dim), a, b)
-        values_block = f.evaluate_grid(xyz)
+        return f.evaluate_grid(xyz)
 
     else:
         #if function f has no "evaluate_grid" method,
         #we evaluate each point individually
-        cheb_values = np.cos(np.arange(deg+1)*np.pi/deg)
         cheb_grids = np.meshgrid(*([cheb_values]*dim), indexing='ij')
 
         flatten = lambda x: x.flatten()
         cheb_points = transform(np.column_stack(map(flatten, cheb_grids)), a, b)
-        values_block = f(cheb_points).reshape(*([deg+1]*dim))
+        return f(cheb_points).reshape(*([deg+1]*dim))
 
+def interval_coeffs_nd(values_block,degs):
+    """Finds the chebyshev coefficients from the values on the grid of chebyshev extrema.
+
+    Parameters
+    ----------
+    values_block : numpy array
+        The values from interval_values_nd.
+    degs : numpy array
+        The degree of the interpolation in each dimension.
+
+    Returns
+    -------
+    coeffs : numpy array
+        The coefficient of the chebyshev interpolating polynomial.
+    """
+    dim = values_block.ndim
     values = chebyshev_block_copy(values_block)
     coeffs = np.real(fftn(values/np.product(degs)))
 
@@ -285,14 +434,114 @@ def interval_approximate_nd(f,a,b,degs):
         idx_deg[i] = degs[i]
 
         #halve the coefficients in each slice
-        coeffs[idx0] /= 2
-        coeffs[idx_deg] /= 2
+        coeffs[tuple(idx0)] /= 2
+        coeffs[tuple(idx_deg)] /= 2
 
     slices = []
     for i in range(dim):
         slices.append(slice(0,degs[i]+1))
 
-    return coeffs[slices]
+    return coeffs[tuple(slices)]
+
+def interval_approximate_nd_batch(f,a,b,degs):
+    """Finds the chebyshev approximations of an n-dimensional function on a stack of intervals.
+
+    The function is called once on the points of all the intervals, and the coefficients of
+    all the intervals come from one fft.
+
+    Parameters
+    ----------
+    f : function from R^n -> R
+        The function to interpolate.
+    a : numpy array
+        The lower bounds on the intervals. Each row is an interval.
+    b : numpy array
+        The upper bounds on the intervals. Each row is an interval.
+    degs : numpy array
+        The degree of the interpolation in each dimension.
+
+    Returns
+    -------
+    coeffs : numpy array
+        coeffs[k] is the coefficient of the chebyshev interpolating polynomial on the kth interval.
+    """
+    if a.shape!=b.shape:
+        raise ValueError("Interval dimensions must be the same!")
+
+    values_blocks = interval_values_nd_batch(f,a,b,degs[0])
+    return interval_coeffs_nd_batch(values_blocks,degs)
+
+def interval_values_nd_batch(f,a,b,deg):
+    """Evaluates an n-dimensional function on the grids of chebyshev extrema of a stack of intervals.
+
+    Parameters
+    ----------
+    f : function from R^n -> R
+        The function to evaluate.
+    a : numpy array
+        The lower bounds on the intervals. Each row is an interval.
+    b : numpy array
+        The upper bounds on the intervals. Each row is an interval.
+    deg : int
+        The degree of the interpolation. Each grid has deg+1 points in each dimension.
+
+    Returns
+    -------
+    values_blocks : numpy array
+        values_blocks[k] is the values_block of the kth interval. See interval_values_nd.
+    """
+    num_intervals, dim = a.shape
+
+    if hasattr(f,"evaluate_grid"):
+        #polynomials are already fast on a grid, so evaluate them one grid at a time
+        return np.array([interval_values_nd(f,a[k],b[k],deg) for k in range(num_intervals)])
+
+    else:
+        cheb_values = np.cos(np.arange(deg+1)*np.pi/deg)
+        cheb_grids = np.meshgrid(*([cheb_values]*dim), indexing='ij')
+        cheb_points = np.column_stack([grid.flatten() for grid in cheb_grids])
+
+        #Every interval's points are transformed at once and passed to f in one call.
+        points = ((b-a)[:,np.newaxis,:]*cheb_points + (b+a)[:,np.newaxis,:])/2
+        values = f(points.reshape(-1,dim))
+        return np.reshape(values, [num_intervals] + [deg+1]*dim)
+
+def interval_coeffs_nd_batch(values_blocks,degs):
+    """Finds the chebyshev coefficients of a stack of values blocks.
+
+    Parameters
+    ----------
+    values_blocks : numpy array
+        The values from interval_values_nd_batch.
+    degs : numpy array
+        The degree of the interpolation in each dimension.
+
+    Returns
+    -------
+    coeffs : numpy array
+        coeffs[k] is the coefficient of the chebyshev interpolating polynomial of values_blocks[k].
+    """
+    dim = values_blocks.ndim - 1
+    values = chebyshev_block_copy(values_blocks, batch_dims=1)
+    coeffs = np.real(fftn(values/np.product(degs), axes=range(1,dim+1)))
+
+    for i in range(1,dim+1):
+        #construct slices for the first and degs[i] entry in each dimension
+        idx0 = [slice(None)] * (dim+1)
+        idx0[i] = 0
+
+        idx_deg = [slice(None)] * (dim+1)
+        idx_deg[i] = degs[i-1]
+
+        #halve the coefficients in each slice
+        coeffs[tuple(idx0)] /= 2
+        coeffs[tuple(idx_deg)] /= 2
+
+    slices = [slice(None)]
+    for i in range(dim):
+        slices.append(slice(0,degs[i]+1))
+
+    return coeffs[tuple(slices)]
 
 def get_subintervals(a,b,dimensions,subinterval_checks,interval_results,polys,check_subintervals=False):
     """Gets the subintervals to divide a matrix into.
@@ -325,27 +574,28 @@ def get_subintervals(a,b,dimensions,subinterval_checks,interval_results,polys,ch
         subintervals.append((aTemp,bTemp))
 
     if check_subintervals:
-        scaled_subintervals = get_subintervals(-np.ones_like(a),np.ones_like(a),dimensions,None,None,None)
+        scaled_subintervals = np.array(get_subintervals(-np.ones_like(a),np.ones_like(a),dimensions,None,None,None))
+        keep = np.arange(len(subintervals))
         for check_num, check in enumerate(subinterval_checks):
+            #Use the vectorized version of the check when there is one
+            check = batch_checks.get(check, check)
             for poly in polys:
-                mask = check(poly.coeff, scaled_subintervals)
-                new_scaled_subintervals = []
-                new_subintervals = []
-                for i, result in enumerate(mask):
-                    if result:
-                        new_scaled_subintervals.append(scaled_subintervals[i])
-                        new_subintervals.append(subintervals[i])
-                    else:
-                        interval_results[check_num-(1+len(subinterval_checks))].append(subintervals[i])
-                scaled_subintervals = new_scaled_subintervals
-                subintervals = new_subintervals
+                if len(keep) == 0:
+                    break
+                mask = np.array(check(poly.coeff, scaled_subintervals[keep]), dtype=bool)
+                for i in keep[~mask]:
+                    interval_results[check_num-(1+len(subinterval_checks))].append(subintervals[i])
+                keep = keep[mask]
+        subintervals = [subintervals[i] for i in keep]
 
     return subintervals
 
-def full_cheb_approximate(f,a,b,deg,tol=1.e-8):
+def full_cheb_approximate(f,a,b,deg,tol=1.e-8,eval_stats=None):
     """Gives the full chebyshev approximation and checks if it's good enough.
 
-    Called recursively.
+    The function is only evaluated on the grid for degree 2*deg. Every other point of that
+    grid is a point of the degree deg grid, so those values are reused for the approximation
+    of degree deg instead of evaluating the function there again.
 
     Parameters
     ----------
@@ -359,22 +609,55 @@ def full_cheb_approximate(f,a,b,deg,tol=1.e-8):
         The degree to approximate with.
     tol : float
         How small the high degree terms must be to consider the approximation accurate.
+    eval_stats : dict
+        If given, the number of function evaluations done is added to eval_stats['evaluations']
+        and the number saved by reusing the coarse grid is added to eval_stats['saved'].
 
     Returns
     -------
     coeff : numpy array
         The coefficient array of the interpolation. If it can't get a good approximation and needs to subdivide, returns None.
     """
-    dim = len(a)
+    return full_cheb_approximate_batch(f,a[np.newaxis],b[np.newaxis],deg,tol=tol,eval_stats=eval_stats)[0]
+
+def full_cheb_approximate_batch(f,a,b,deg,tol=1.e-8,eval_stats=None):
+    """Gives the full chebyshev approximation on each of a stack of intervals and checks if it's good enough.
+
+    Like full_cheb_approximate, but the function is called once on the grids of all the intervals.
+
+    Parameters
+    ----------
+    f : function
+        The function we approximate.
+    a : numpy array
+        The lower bounds on the intervals. Each row is an interval.
+    b : numpy array
+        The upper bounds on the intervals. Each row is an interval.
+    deg : int
+        The degree to approximate with.
+    tol : float
+        How small the high degree terms must be to consider the approximation accurate.
+    eval_stats : dict
+        If given, counts the function evaluations. See full_cheb_approximate.
+
+    Returns
+    -------
+    coeffs : list
+        The coefficient array of the interpolation on each interval, or None for the intervals
+        without a good approximation that need to subdivide.
+    """
+    dim = a.shape[1]
     degs = np.array([deg]*dim)
-    coeff = interval_approximate_nd(f,a,b,degs)
-    coeff2 = interval_approximate_nd(f,a,b,degs*2)
-    coeff2[slice_top(coeff)] -= coeff
+    values2 = interval_values_nd_batch(f,a,b,2*deg)
+    values = values2[tuple([slice(None)] + [slice(None,None,2)]*dim)]
+    if eval_stats is not None:
+        eval_stats['evaluations'] = eval_stats.get('evaluations',0) + values2.size
+        eval_stats['saved'] = eval_stats.get('saved',0) + values.size
+    coeff = interval_coeffs_nd_batch(values,degs)
+    coeff2 = interval_coeffs_nd_batch(values2,degs*2)
+    coeff2[(slice(None),) + slice_top(coeff[0])] -= coeff
     clean_zeros_from_matrix(coeff2,1.e-16)
-    if np.sum(np.abs(coeff2)) > tol:
-        return None
-    else:
-        return coeff
+    return [None if np.sum(np.abs(coeff2[k])) > tol else coeff[k] for k in range(len(coeff))]
 
 def good_zeros_nd(zeros, imag_tol = 1.e-10):
     """Get the real zeros in the -1 to 1 interval in each dimension.
@@ -641,7 +924,7 @@ def linear_check(test_coeff_in, intervals):
         # abs_smallest_corner = test_coeff[tuple(spot)]
 
         idx = [0]*dim
-        const = test_coeff_in[idx]
+        const = test_coeff_in[tuple(idx)]
         lin_coeff = np.zeros(dim)
         for cur_dim in range(dim):
             if test_coeff_in.shape[cur_dim] < 2:
@@ -933,6 +1216,283 @@ def quadratic_check3(test_coeff, intervals,tol=1e-12):
 
     return mask
 
+def _coeff_stack(test_coeffs, num_intervals, dim, min_size=1):
+    """Makes a stack of coefficient tensors, one for each interval, for the vectorized checks.
+
+    Parameters
+    ----------
+    test_coeffs : numpy array
+        Either one coefficient tensor to use for every interval or a stack of them.
+    num_intervals : int
+        The number of intervals.
+    dim : int
+        The dimension of the polynomials.
+    min_size : int
+        The coefficient tensors are padded with zeros to at least this size in each dimension.
+
+    Returns
+    -------
+    test_coeffs : numpy array
+        A stack of coefficient tensors with shape (num_intervals, ...).
+    """
+    if test_coeffs.ndim == dim:
+        test_coeffs = np.broadcast_to(test_coeffs, (num_intervals,) + test_coeffs.shape)
+    padding = [(0,0)] + [(0,max(0,min_size-i)) for i in test_coeffs.shape[1:]]
+    if any(pad[1] > 0 for pad in padding):
+        test_coeffs = np.pad(test_coeffs, padding, mode='constant')
+    return test_coeffs
+
+def _corners(intervals):
+    """Gets the corners of a stack of intervals.
+
+    Parameters
+    ----------
+    intervals : numpy array
+        The intervals, with shape (K, 2, dim). intervals[k,0] is the lower bound and intervals[k,1] the upper bound.
+
+    Returns
+    -------
+    corners : numpy array
+        The corners of each interval, with shape (K, 2**dim, dim).
+    """
+    dim = intervals.shape[2]
+    choices = np.array(list(product([0,1], repeat=dim)))
+    return intervals[:, choices, np.arange(dim)]
+
+def _abs_sums(test_coeffs):
+    """The sum of the absolute values of each coefficient tensor in a stack."""
+    return np.sum(np.abs(test_coeffs).reshape(len(test_coeffs),-1), axis=1)
+
+def _strictly_between(low, values, high):
+    return (low < values) & (values < high)
+
+def linear_check_batch(test_coeffs, intervals):
+    """Vectorized linear_check.
+
+    Parameters
+    ----------
+    test_coeffs : numpy array
+        The coefficient matrix of the polynomial to check, or a stack of them with one for each interval.
+    intervals : numpy array
+        The intervals we want to check before subdividing them, with shape (K, 2, dim).
+
+    Returns
+    -------
+    mask : numpy array
+        Boolean array that masks out the intervals we don't want. The same as linear_check.
+    """
+    intervals = np.asarray(intervals, dtype=float)
+    num_intervals, _, dim = intervals.shape
+    test_coeffs = _coeff_stack(test_coeffs, num_intervals, dim)
+    coeff_abs_sum = _abs_sums(test_coeffs)
+
+    idx = [slice(None)] + [0]*dim
+    const = test_coeffs[tuple(idx)]
+    lin_coeff = np.zeros((num_intervals,dim))
+    for cur_dim in range(dim):
+        if test_coeffs.shape[cur_dim+1] < 2:
+            continue
+        idx[cur_dim+1] = 1
+        lin_coeff[:,cur_dim] = test_coeffs[tuple(idx)]
+        idx[cur_dim+1] = 0
+
+    corner_vals = const[:,np.newaxis] + np.sum(_corners(intervals)*lin_coeff[:,np.newaxis,:], axis=2)
+
+    # check if corners have mixed signs
+    mixed_signs = (corner_vals.min(axis=1) < 0) & (0 < corner_vals.max(axis=1))
+    # case: corner is far enough from 0
+    far = 2*np.min(np.abs(corner_vals), axis=1) > coeff_abs_sum
+    return ~(mixed_signs & far)
+
+def quadratic_check1_batch(test_coeffs, intervals, tol=1e-12):
+    """Vectorized quadratic_check1.
+
+    Parameters
+    ----------
+    test_coeffs : numpy array
+        The coefficient matrix of the polynomial to check, or a stack of them with one for each interval.
+    intervals : numpy array
+        The intervals we want to check before subdividing them, with shape (K, 2, dim).
+
+    Returns
+    -------
+    mask : numpy array
+        Boolean array that masks out the intervals we don't want. The same as quadratic_check1.
+    """
+    intervals = np.asarray(intervals, dtype=float)
+    num_intervals, _, dim = intervals.shape
+    if dim > 2:
+        return np.ones(num_intervals, dtype=bool)
+    test_coeffs = _coeff_stack(test_coeffs, num_intervals, dim, min_size=3)
+    #check using |c0 + c1x + c2y + c3x^2| like quadratic_check1
+    constant = test_coeffs[:,0,0] - test_coeffs[:,2,0]
+    c1 = test_coeffs[:,1,0]
+    c2 = test_coeffs[:,0,1]
+    c3 = 2*test_coeffs[:,2,0]
+    a0, a1 = intervals[:,0,0], intervals[:,0,1]
+    b0, b1 = intervals[:,1,0], intervals[:,1,1]
+
+    #if c3 != 0, same as a linear check
+    useless = np.isclose(c3, 0, atol=tol) | np.isclose(c2, 0, atol=tol)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        def quadratic_formula_check(y):
+            #given a fixed value of y, sees if constant + c1x + c2y +c3x^2 = 0 for some x in [a0, b0]
+            discriminant = c1**2 - 4*(c2*y+constant)*c3
+            root = np.sqrt(np.where(discriminant > 0, discriminant, 0))
+            return (np.isclose(discriminant, 0, atol=tol) & _strictly_between(a0, -c1/2/c3, b0)) | \
+                   ((discriminant > 0) & (_strictly_between(a0, (-c1+root)/2/c3, b0) | \
+                                          _strictly_between(a0, (-c1-root)/2/c3, b0)))
+
+        #If constant + c1x + c2y +c3x^2 = 0 in the region, useless check.
+        y = lambda x: (-c3 *x**2 - c1 * x - constant)/c2
+        useless |= _strictly_between(a1, y(a0), b1) | _strictly_between(a1, y(b0), b1)
+        useless |= quadratic_formula_check(a0) | quadratic_formula_check(b0)
+
+        #Extrema only occur on the edges. They are at the corners, or on the edges y = a1, b1
+        #at x0 = -c1/2c3 if that's in [a0, b0]
+        corners = _corners(intervals)
+        evals = np.abs(constant[:,np.newaxis] + c1[:,np.newaxis]*corners[:,:,0] + c2[:,np.newaxis]*corners[:,:,1]\
+                       + c3[:,np.newaxis]*corners[:,:,0]**2)
+        min_eval = evals.min(axis=1)
+        x0 = -c1/2/c3
+        for edge in [a1, b1]:
+            edge_eval = np.abs(constant + c1*x0 + c2*edge + c3*x0**2)
+            min_eval = np.where(_strictly_between(a0, x0, b0), np.minimum(min_eval, edge_eval), min_eval)
+
+    #if min{|constant + c1x + c2y +c3x^2|} > sum of other terms in test_coeff, no roots in the region
+    other_terms = _abs_sums(test_coeffs) - np.abs(constant) - np.abs(c1) - np.abs(c2) - np.abs(c3)
+    return useless | ~(min_eval > other_terms)
+
+def quadratic_check2_batch(test_coeffs, intervals, tol=1e-12):
+    """Vectorized quadratic_check2.
+
+    Parameters
+    ----------
+    test_coeffs : numpy array
+        The coefficient matrix of the polynomial to check, or a stack of them with one for each interval.
+    intervals : numpy array
+        The intervals we want to check before subdividing them, with shape (K, 2, dim).
+
+    Returns
+    -------
+    mask : numpy array
+        Boolean array that masks out the intervals we don't want. The same as quadratic_check2.
+    """
+    intervals = np.asarray(intervals, dtype=float)
+    num_intervals, _, dim = intervals.shape
+    if dim > 2:
+        return np.ones(num_intervals, dtype=bool)
+    test_coeffs = _coeff_stack(test_coeffs, num_intervals, dim, min_size=3)
+    #check using |c0 + c1x + c2y + c3y^2| like quadratic_check2
+    constant = test_coeffs[:,0,0] - test_coeffs[:,0,2]
+    c1 = test_coeffs[:,1,0]
+    c2 = test_coeffs[:,0,1]
+    c3 = 2*test_coeffs[:,0,2]
+    a0, a1 = intervals[:,0,0], intervals[:,0,1]
+    b0, b1 = intervals[:,1,0], intervals[:,1,1]
+
+    #if c3 != 0, same as a linear check
+    useless = np.isclose(c3, 0, atol=tol) | np.isclose(c1, 0, atol=tol)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        def quadratic_formula_check(x):
+            #given a fixed value of x, sees if constant + c1x + c2y +c3y^2 = 0 for some y in [a1, b1]
+            discriminant = c2**2 - 4*(c1*x+constant)*c3
+            root = np.sqrt(np.where(discriminant > 0, discriminant, 0))
+            return (np.isclose(discriminant, 0, atol=tol) & _strictly_between(a1, -c2/2/c3, b1)) | \
+                   ((discriminant > 0) & (_strictly_between(a1, (-c2+root)/2/c3, b1) | \
+                                          _strictly_between(a1, (-c2-root)/2/c3, b1)))
+
+        #If constant + c1x + c2y +c3y^2 = 0 in the region, useless
+        useless |= np.isclose(c1, 0) & quadratic_formula_check(0)
+        x = lambda y: (-c3 *y**2 - c2 * y - constant)/c1
+        useless |= _strictly_between(a0, x(a1), b0) | _strictly_between(a0, x(b1), b0)
+        useless |= quadratic_formula_check(a1) | quadratic_formula_check(b1)
+
+        #Extrema only occur on the edges. They are at the corners, or on the edges x = a0, b0
+        #at y0 = -c2/2c3 if that's in [a1, b1]
+        corners = _corners(intervals)
+        evals = np.abs(constant[:,np.newaxis] + c1[:,np.newaxis]*corners[:,:,0] + c2[:,np.newaxis]*corners[:,:,1]\
+                       + c3[:,np.newaxis]*corners[:,:,1]**2)
+        min_eval = evals.min(axis=1)
+        y0 = -c2/2/c3
+        for edge in [a0, b0]:
+            edge_eval = np.abs(constant + c1*edge + c2*y0 + c3*y0**2)
+            min_eval = np.where(_strictly_between(a1, y0, b1), np.minimum(min_eval, edge_eval), min_eval)
+
+    #if min{|constant + c1x + c2y +c3y^2|} > sum of other terms in test_coeff, no roots in the region
+    other_terms = _abs_sums(test_coeffs) - np.abs(constant) - np.abs(c1) - np.abs(c2) - np.abs(c3)
+    return useless | ~(min_eval > other_terms)
+
+def quadratic_check3_batch(test_coeffs, intervals, tol=1e-12):
+    """Vectorized quadratic_check3.
+
+    Parameters
+    ----------
+    test_coeffs : numpy array
+        The coefficient matrix of the polynomial to check, or a stack of them with one for each interval.
+    intervals : numpy array
+        The intervals we want to check before subdividing them, with shape (K, 2, dim).
+
+    Returns
+    -------
+    mask : numpy array
+        Boolean array that masks out the intervals we don't want. The same as quadratic_check3.
+    """
+    intervals = np.asarray(intervals, dtype=float)
+    num_intervals, _, dim = intervals.shape
+    if dim > 2:
+        return np.ones(num_intervals, dtype=bool)
+    test_coeffs = _coeff_stack(test_coeffs, num_intervals, dim, min_size=3)
+    #check using |constant + c1x + c2y +c3xy| like quadratic_check3
+    constant = test_coeffs[:,0,0]
+    c1 = test_coeffs[:,1,0]
+    c2 = test_coeffs[:,0,1]
+    c3 = test_coeffs[:,1,1]
+    a0, a1 = intervals[:,0,0], intervals[:,0,1]
+    b0, b1 = intervals[:,1,0], intervals[:,1,1]
+
+    #if c3 != 0, same as a linear check
+    useless = np.isclose(c3, 0, atol=tol)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        #If constant + c1x + c2y +c3xy = 0 in the region, useless
+        #testing the vertical sides of the interval
+        vert_asymptote = -c2/c3
+        x = lambda y: (-constant + c2*y)/(c1 + c3*y)
+        at_a1 = np.isclose(a1, vert_asymptote)
+        at_b1 = ~at_a1 & np.isclose(b1, vert_asymptote)
+        neither = ~at_a1 & ~at_b1
+        useless |= at_a1 & _strictly_between(a0, x(b1), b0)
+        useless |= at_b1 & _strictly_between(a0, x(a1), b0)
+        useless |= neither & (_strictly_between(a0, x(a1), b0) | _strictly_between(a0, x(b1), b0))
+
+        #testing the horizontal sides of the interval
+        horiz_asymptote = -c1/c3
+        y = lambda x: (-constant + c1*x)/(c2 + c3*x)
+        at_a0 = np.isclose(a0, horiz_asymptote)
+        at_b0 = ~at_a0 & np.isclose(b0, horiz_asymptote)
+        neither = ~at_a0 & ~at_b0
+        useless |= at_a0 & _strictly_between(a1, y(b0), b1)
+        useless |= at_b0 & _strictly_between(a1, y(a0), b1)
+        useless |= neither & (_strictly_between(a1, y(a0), b1) | _strictly_between(a1, y(b0), b1))
+
+    #The only critical point is a saddle point, so the minimum is at a corner
+    corners = _corners(intervals)
+    evals = np.abs(constant[:,np.newaxis] + c1[:,np.newaxis]*corners[:,:,0] + c2[:,np.newaxis]*corners[:,:,1]\
+                   + c3[:,np.newaxis]*corners[:,:,0]*corners[:,:,1])
+
+    #if min{|constant + c1x + c2y +c3xy|} > sum of other terms in test_coeff, no roots in the region
+    other_terms = _abs_sums(test_coeffs) - _abs_sums(test_coeffs[:,:2,:2])
+    return useless | ~(evals.min(axis=1) > other_terms)
+
+#The vectorized version of each subinterval check, used by get_subintervals.
+batch_checks = {linear_check : linear_check_batch,
+                quadratic_check1 : quadratic_check1_batch,
+                quadratic_check2 : quadratic_check2_batch,
+                quadratic_check3 : quadratic_check3_batch}
+
 #This is all for Tyler's new function
 from mpmath import iv
 from itertools import product
@@ -1053,8 +1613,12 @@ def curvature_check(coeff):
     b = np.array([1.]*poly.dim)
     return not can_eliminate(poly, a, b)
 
-def subdivision_solve_nd(funcs,a,b,deg,interval_results,interval_checks = [],subinterval_checks=[],tol=1.e-3):
-    """Finds the common zeros of the given functions.
+def subdivision_step_nd(funcs,a,b,deg,interval_results,interval_checks = [],subinterval_checks=[],tol=1.e-3,\
+                        eval_stats=None):
+    """Runs a single step of the subdivision on one interval.
+
+    The interval is either solved, thrown out by one of the checks, or split into subintervals
+    that still need to be solved.
 
     Parameters
     ----------
@@ -1066,60 +1630,303 @@ def subdivision_solve_nd(funcs,a,b,deg,interval_results,interval_checks = [],sub
         The upper bound on the interval.
     deg : int
         The degree to approximate with in the chebyshev approximation.
+    interval_results : list
+        A list of lists, one for each check and one for the division solve. The interval is
+        appended to the list of whatever method resolved it.
+    eval_stats : dict
+        If given, counts the function evaluations. See full_cheb_approximate.
 
     Returns
     -------
-    good_zeros : numpy array
-        The real zero in [-1,1] of the input zeros.
+    zeros : numpy array
+        The zeros found on the interval. None if the interval needs to be subdivided.
+    intervals : list
+        The subintervals that still need to be solved. None if the interval was resolved.
     """
-    division_var = 0
-    cheb_approx_list = []
-    try:
-        if np.random.rand() > .999:
-            print("Interval - ",a,b)
-        dim = len(a)
-        for func in funcs:
-            coeff = full_cheb_approximate(func,a,b,deg,tol=tol)
+    return subdivision_step_nd_batch(funcs,a[np.newaxis],b[np.newaxis],deg,interval_results,interval_checks,\
+                                     subinterval_checks,tol=tol,eval_stats=eval_stats)[0]
 
-            #Subdivides if needed.
-            if coeff is None:
-                intervals = get_subintervals(a,b,np.arange(dim),None,None,None)
+def subdivision_step_nd_batch(funcs,a,b,deg,interval_results,interval_checks = [],subinterval_checks=[],tol=1.e-3,\
+                              eval_stats=None):
+    """Runs a single step of the subdivision on each of a stack of intervals.
+
+    Each function is approximated on all the intervals that are still unresolved at once with
+    full_cheb_approximate_batch, so the functions are only called once per function per step.
+    The intervals are then resolved in order exactly as subdivision_step_nd would resolve them.
+
+    Parameters
+    ----------
+    funcs : list
+        Each element of the list is a callable function.
+    a : numpy array
+        The lower bounds on the intervals. Each row is an interval.
+    b : numpy array
+        The upper bounds on the intervals. Each row is an interval.
+    deg : int
+        The degree to approximate with in the chebyshev approximation.
+    interval_results : list
+        A list of lists, one for each check and one for the division solve.
+    eval_stats : dict
+        If given, counts the function evaluations. See full_cheb_approximate.
 
-                return np.vstack([subdivision_solve_nd(funcs,interval[0],interval[1],deg,interval_results\
-                                                       ,interval_checks,subinterval_checks,tol=tol)
-                                  for interval in intervals])
+    Returns
+    -------
+    steps : list
+        One (zeros, intervals) pair for each interval. See subdivision_step_nd.
+    """
+    num_intervals, dim = a.shape
+    cheb_approx_lists = [[] for k in range(num_intervals)]
+    #None while the interval is unresolved, 'subdivide' if it needs to be subdivided,
+    #or the number of the check that threw it out.
+    outcomes = [None]*num_intervals
+
+    for func in funcs:
+        active = [k for k in range(num_intervals) if outcomes[k] is None]
+        if len(active) == 0:
+            break
+        coeffs = full_cheb_approximate_batch(func,a[active],b[active],deg,tol=tol,eval_stats=eval_stats)
+        for k, coeff in zip(active, coeffs):
+            if coeff is None:
+                outcomes[k] = 'subdivide'
+                continue
+            coeff = trim_coeff(coeff,tol=tol)
+            #Run checks to try and throw out the interval
+            for check_num, check in enumerate(interval_checks):
+                if not check(coeff):
+                    outcomes[k] = check_num
+                    break
             else:
-                coeff = trim_coeff(coeff,tol=tol)
-                #Run checks to try and throw out the interval
-                for func_num, func in enumerate(interval_checks):
-                    if not func(coeff):
-                        interval_results[func_num].append([a,b])
-                        return np.zeros([0,dim])
-                cheb_approx_list.append(MultiCheb(coeff))
+                cheb_approx_lists[k].append(MultiCheb(coeff))
+
+    steps = []
+    for k in range(num_intervals):
+        if outcomes[k] == 'subdivide':
+            steps.append((None, get_subintervals(a[k],b[k],np.arange(dim),None,None,None)))
+        elif outcomes[k] is not None:
+            interval_results[outcomes[k]].append([a[k],b[k]])
+            steps.append((np.zeros([0,dim]), None))
+        else:
+            steps.append(division_step_nd(cheb_approx_lists[k],a[k],b[k],interval_results,subinterval_checks))
+    return steps
+
+def division_step_nd(cheb_approx_list,a,b,interval_results,subinterval_checks=[]):
+    """Solves the chebyshev approximations of an interval with division.
 
+    Parameters
+    ----------
+    cheb_approx_list : list
+        The MultiCheb approximation of each function on the interval.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    interval_results : list
+        A list of lists, one for each check and one for the division solve.
+
+    Returns
+    -------
+    zeros : numpy array
+        The zeros found on the interval. None if the division was unstable and the interval
+        needs to be subdivided.
+    intervals : list
+        The subintervals that passed the subinterval checks if the division was unstable, None otherwise.
+    """
+    dim = len(a)
+    division_var = 0
+    try:
         zeros = np.array(division(cheb_approx_list, get_divvar_coord_from_eigval = True, divisor_var = 0, tol = 1.e-6))
         interval_results[-1].append([a,b])
         if len(zeros) == 0:
-            return np.zeros([0,dim])
-        return transform(good_zeros_nd(zeros),a,b)
+            return np.zeros([0,dim]), None
+        return transform(good_zeros_nd(zeros),a,b), None
 
     except np.linalg.LinAlgError as e:
         while division_var < len(a):
             try:
                 zeros = np.array(division(cheb_approx_list, get_divvar_coord_from_eigval = True, divisor_var = 0, tol = 1.e-6))
-                return zeros
+                return zeros, None
             except np.linalg.LinAlgError as e:
                 division_var += 1
 
         #Subdivide but run some checks on the intervals first
-        intervals = get_subintervals(a,b,np.arange(dim),subinterval_checks,interval_results\
-                                     ,cheb_approx_list,check_subintervals=True)
-        if len(intervals) == 0:
-            return np.zeros([0,dim])
+        return None, get_subintervals(a,b,np.arange(dim),subinterval_checks,interval_results\
+                                      ,cheb_approx_list,check_subintervals=True)
+
+def subdivision_solve_nd(funcs,a,b,deg,interval_results,interval_checks = [],subinterval_checks=[],tol=1.e-3,\
+                         eval_stats=None):
+    """Finds the common zeros of the given functions.
+
+    Parameters
+    ----------
+    funcs : list
+        Each element of the list is a callable function.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    deg : int
+        The degree to approximate with in the chebyshev approximation.
+
+    Returns
+    -------
+    good_zeros : numpy array
+        The real zero in [-1,1] of the input zeros.
+    """
+    zeros, intervals = subdivision_step_nd(funcs,a,b,deg,interval_results,interval_checks,subinterval_checks,tol=tol,\
+                                           eval_stats=eval_stats)
+    if intervals is None:
+        return zeros
+    if len(intervals) == 0:
+        return np.zeros([0,len(a)])
+    return np.vstack([subdivision_solve_nd(funcs,interval[0],interval[1],deg,interval_results\
+                                           ,interval_checks,subinterval_checks,tol=tol,eval_stats=eval_stats)
+                      for interval in intervals])
+
+def _solve_subinterval_nd(funcs,a,b,deg,num_results,interval_checks,subinterval_checks,tol,share=None):
+    """Worker task for parallel_subdivision_solve_nd.
+
+    Solves one subinterval with its own interval_results so the results can be sent back
+    to the main process and merged there. If share is a (directory, min_bytes) pair, the zeros
+    and the intervals of each result are put in shared memory there as arrays, and their
+    descriptors are returned instead, see _open_subinterval.
+
+    Returns
+    -------
+    zeros : numpy array
+        The zeros found on the subinterval.
+    interval_results : list
+        What happened to each of the intervals checked while solving the subinterval.
+    eval_stats : dict
+        The function evaluations counted while solving the subinterval.
+    """
+    interval_results = [[] for i in range(num_results)]
+    eval_stats = {}
+    zeros = subdivision_solve_nd(funcs,a,b,deg,interval_results,interval_checks,subinterval_checks,tol=tol,\
+                                 eval_stats=eval_stats)
+    if share is not None:
+        arena = ArrayArena(*share)
+        #Each result is a list of (a,b) pairs, so it is an array of shape (intervals, 2, dim).
+        zeros = arena.put(zeros, owned=False)
+        interval_results = [arena.put(np.array(result, dtype=float).reshape(-1,2,len(a)), owned=False)
+                            for result in interval_results]
+    return zeros, interval_results, eval_stats
+
+def _open_subinterval(zeros, interval_results):
+    """Takes the zeros and interval_results a worker of _solve_subinterval_nd shared."""
+    zeros = open_array(zeros, take=True)
+    interval_results = [[[a0, b0] for a0, b0 in np.array(open_array(result, take=True))] for result in interval_results]
+    return zeros, interval_results
+
+def parallel_subdivision_solve_nd(funcs,a,b,deg,interval_results,interval_checks = [],subinterval_checks=[],\
+                                  tol=1.e-3,workers=None,executor='process',tasks_per_worker=4,eval_stats=None,\
+                                  shared_min_bytes=MIN_SHARED_BYTES):
+    """Finds the common zeros of the given functions, solving independent subintervals in parallel.
+
+    The main process runs the subdivision breadth first until there are about tasks_per_worker
+    intervals waiting for each worker. Those intervals are then handed to the workers, which each
+    finish their interval with subdivision_solve_nd. Every interval is tagged with its path in
+    the subdivision tree, so the zeros and interval_results are merged in exactly the order
+    subdivision_solve_nd would have produced them, no matter which worker finishes first.
+
+    Parameters
+    ----------
+    funcs : list
+        Each element of the list is a callable function. They must be picklable when using a
+        process pool.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    deg : int
+        The degree to approximate with in the chebyshev approximation.
+    interval_results : list
+        A list of lists, one for each check and one for the division solve.
+    workers : int
+        The number of workers. Defaults to the number of cpus.
+    executor : str or concurrent.futures.Executor
+        'process' to use a process pool, 'thread' to use a thread pool (only useful when the
+        functions release the GIL), or an existing Executor, which is not shut down afterwards.
+    tasks_per_worker : int
+        How many intervals to create for each worker before handing them out. More tasks
+        balance the load better but cost more communication.
+    eval_stats : dict
+        If given, counts the function evaluations of all the workers. See full_cheb_approximate.
+    shared_min_bytes : int
+        With a process pool, the zeros and interval_results of the workers come back through shared
+        memory, see transport.ArrayArena. Arrays with fewer bytes than this are pickled instead.
+        None pickles everything.
+
+    Returns
+    -------
+    zeros : numpy array
+        The common zeros of the functions on the interval. Each row is a zero.
+    """
+    dim = len(a)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    #Each queue entry is (path, a, b). Leaves are (path, zeros, results) with results the
+    #interval_results of that piece of the tree.
+    queue = deque([((), a, b)])
+    leaves = []
+    while queue and len(queue) < tasks_per_worker*workers:
+        path, a0, b0 = queue.popleft()
+        results = [[] for i in range(len(interval_results))]
+        zeros, intervals = subdivision_step_nd(funcs,a0,b0,deg,results,interval_checks,subinterval_checks,tol=tol,\
+                                               eval_stats=eval_stats)
+        leaves.append((path, zeros, results))
+        if intervals is not None:
+            for i, interval in enumerate(intervals):
+                queue.append((path + (i,), interval[0], interval[1]))
+
+    if queue:
+        if isinstance(executor, Executor):
+            pool = executor
+        elif executor == 'process':
+            pool = ProcessPoolExecutor(max_workers=workers)
+        elif executor == 'thread':
+            pool = ThreadPoolExecutor(max_workers=workers)
         else:
-            return np.vstack([subdivision_solve_nd(funcs,interval[0],interval[1],deg,interval_results\
-                                               ,interval_checks,subinterval_checks,tol=tol)
-                          for interval in intervals])
+            raise ValueError("executor must be 'process', 'thread' or a concurrent.futures.Executor")
+        #Only process pools need to move the arrays between address spaces.
+        share = None
+        if shared_min_bytes is not None and isinstance(pool, ProcessPoolExecutor):
+            share = (default_arena_directory(), shared_min_bytes)
+        futures = deque()
+        try:
+            for path, a0, b0 in queue:
+                futures.append((path, pool.submit(_solve_subinterval_nd,funcs,a0,b0,deg,len(interval_results),\
+                                                  interval_checks,subinterval_checks,tol,share)))
+            while futures:
+                path, future = futures[0]
+                zeros, results, stats = future.result()
+                futures.popleft()
+                if share is not None:
+                    zeros, results = _open_subinterval(zeros, results)
+                leaves.append((path, zeros, results))
+                if eval_stats is not None:
+                    for stat, count in stats.items():
+                        eval_stats[stat] = eval_stats.get(stat,0) + count
+        finally:
+            #After an error, the shared arrays of tasks that still run or finished are cleaned up.
+            for path, future in futures:
+                if not future.cancel() and share is not None:
+                    try:
+                        _open_subinterval(*future.result()[:2])
+                    except Exception:
+                        pass
+            if pool is not executor:
+                pool.shutdown()
+
+    #A parent always sorts before its children, so this is the depth first order of the recursion.
+    leaves.sort(key=lambda leaf: leaf[0])
+    zeros = [np.zeros([0,dim])]
+    for path, leaf_zeros, results in leaves:
+        if leaf_zeros is not None:
+            zeros.append(leaf_zeros)
+        for i, result in enumerate(results):
+            interval_results[i].extend(result)
+    return np.vstack(zeros)
 
 def trim_coeff(coeff, tol=1.e-3):
     """Reduce the number of coefficients and the degree.
@@ -1212,24 +2019,28 @@ def good_zeros(zeros, imag_tol = 1.e-10):
     zeros = zeros[np.where(np.abs(zeros.imag) < imag_tol)]
     return zeros
 
-def subdivision_solve_1d(f,a,b,cheb_approx_tol=1.e-3,max_degree=128):
-    """Finds the roots of a one-dimensional function using subdivision and chebyshev approximation.
+def subdivision_approximate_1d(f,a,b,cheb_approx_tol=1.e-3,max_degree=128):
+    """Finds a good enough chebyshev approximation of a one-dimensional function on one interval.
 
     Parameters
     ----------
-    f : function from R^n -> R
-        The function to interpolate.
+    f : function from R -> R
+        The function to approximate.
     a : numpy array
         The lower bound on the interval.
     b : numpy array
         The upper bound on the interval.
-    deg : int
-        The degree of the interpolation.
+    cheb_approx_tol : float
+        How small the high degree terms must be to consider the approximation accurate.
+    max_degree : int
+        The highest degree to approximate with before subdividing.
 
     Returns
     -------
     coeffs : numpy array
-        The coefficient of the chebyshev interpolating polynomial.
+        The coefficients of the approximation. None if the interval needs to be subdivided.
+    intervals : list
+        The two halves of the interval if it needs to be subdivided, None otherwise.
     """
     cur_deg = 2
     initial_approx = interval_approximate_1d(f,a,b,deg = cur_deg)
@@ -1240,15 +2051,310 @@ def subdivision_solve_1d(f,a,b,cheb_approx_tol=1.e-3,max_degree=128):
         #Check if the approximation is good enough
         # if np.sum(np.abs(coeffs2N - coeffsN)) < cheb_approx_tol:
         if np.sum(np.abs(coeffs2N[cur_deg+1:])) < cheb_approx_tol:
-            coeffs = coeffsN[:cur_deg+1]
-            #Division is faster after degree 75
-            if cur_deg > 75:
-                return transform(good_zeros(divCheb(coeffs)),a,b)
-            else:
-                return transform(good_zeros(multCheb(np.trim_zeros(coeffs.copy(),trim='b'))),a,b)
+            return coeffsN[:cur_deg+1], None
         initial_approx = coeffs2N
         cur_deg*=2
-    #Subdivide the interval and recursively call the function.
+    #Subdivide the interval.
     div_length = (b-a)/2
-    return np.hstack([subdivision_solve_1d(f,a,b-div_length,max_degree=max_degree),\
-                      subdivision_solve_1d(f,a+div_length,b,max_degree=max_degree)])
+    return None, [(a,b-div_length),(a+div_length,b)]
+
+def subdivision_step_1d(f,a,b,cheb_approx_tol=1.e-3,max_degree=128):
+    """Runs a single step of the one-dimensional subdivision on one interval.
+
+    Parameters
+    ----------
+    f : function from R -> R
+        The function to find the roots of.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    cheb_approx_tol : float
+        How small the high degree terms must be to consider the approximation accurate.
+    max_degree : int
+        The highest degree to approximate with before subdividing.
+
+    Returns
+    -------
+    zeros : numpy array
+        The roots found on the interval. None if the interval needs to be subdivided.
+    intervals : list
+        The two halves of the interval if it needs to be subdivided, None otherwise.
+    """
+    coeffs, intervals = subdivision_approximate_1d(f,a,b,cheb_approx_tol,max_degree)
+    if intervals is not None:
+        return None, intervals
+    #Division is faster after degree 75
+    if len(coeffs) - 1 > 75:
+        return transform(good_zeros(divCheb(coeffs)),a,b), None
+    else:
+        return transform(good_zeros(multCheb(np.trim_zeros(coeffs.copy(),trim='b'))),a,b), None
+
+def subdivision_leaves_1d(f,a,b,leaves,cheb_approx_tol=1.e-3,max_degree=128):
+    """Subdivides an interval until f is approximated well on each piece, without finding any roots.
+
+    Parameters
+    ----------
+    f : function from R -> R
+        The function to approximate.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    leaves : list
+        The (coeffs, a, b) of each piece is appended to it, in the order of the recursive subdivision.
+    cheb_approx_tol : float
+        How small the high degree terms must be to consider the approximation accurate.
+    max_degree : int
+        The highest degree to approximate with before subdividing.
+    """
+    #An explicit stack instead of recursion, so deep subdivisions can't hit the recursion limit.
+    stack = [(a,b)]
+    while stack:
+        a0, b0 = stack.pop()
+        coeffs, intervals = subdivision_approximate_1d(f,a0,b0,cheb_approx_tol,max_degree)
+        if intervals is None:
+            leaves.append((coeffs,a0,b0))
+        else:
+            #The first half is pushed last so it is subdivided first.
+            stack.extend(intervals[::-1])
+
+def solve_leaves_1d(leaves):
+    """Finds the roots of the chebyshev approximations on the leaves of a one-dimensional subdivision.
+
+    The approximations are grouped by degree, and the colleague matrices of each group are stacked
+    and solved with one eigenvalue call, see OneDimension.solve_batch.
+
+    Parameters
+    ----------
+    leaves : list
+        The (coeffs, a, b) of each leaf, from subdivision_leaves_1d.
+
+    Returns
+    -------
+    zeros : list of numpy arrays
+        The roots found on each leaf.
+    """
+    trimmed = [np.trim_zeros(coeffs,trim='b') for coeffs,a,b in leaves]
+    groups = {}
+    for i, coeffs in enumerate(trimmed):
+        groups.setdefault(len(coeffs), []).append(i)
+
+    zeros = [np.zeros(0)]*len(leaves)
+    for size, group in groups.items():
+        if size < 2:
+            continue
+        for i, leaf_zeros in zip(group, oneD.solve_batch(np.array([trimmed[i] for i in group]), False)):
+            coeffs, a, b = leaves[i]
+            zeros[i] = transform(good_zeros(leaf_zeros),a,b)
+    return zeros
+
+def subdivision_solve_1d(f,a,b,cheb_approx_tol=1.e-3,max_degree=128):
+    """Finds the roots of a one-dimensional function using subdivision and chebyshev approximation.
+
+    All the leaf intervals are approximated first and then solved together, see solve_leaves_1d.
+
+    Parameters
+    ----------
+    f : function from R^n -> R
+        The function to interpolate.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    deg : int
+        The degree of the interpolation.
+
+    Returns
+    -------
+    coeffs : numpy array
+        The coefficient of the chebyshev interpolating polynomial.
+    """
+    leaves = []
+    subdivision_leaves_1d(f,a,b,leaves,cheb_approx_tol,max_degree)
+    return np.hstack(solve_leaves_1d(leaves))
+
+def frontier_priority(priority, funcs=None, dim=None):
+    """Makes the function that orders the intervals in the frontier of an iterative subdivision.
+
+    Intervals with the smallest key are solved first.
+
+    Parameters
+    ----------
+    priority : str or callable
+        'depth_first' solves intervals in the same order as the recursive subdivision.
+        'volume' solves the largest intervals first.
+        'likelihood' solves the intervals whose center is closest to being a common zero first,
+        relative to the size of the interval. This costs one evaluation of each function per interval.
+        A callable is called as priority(a,b) and should return a number.
+    funcs : list
+        The functions being solved. Only needed for 'likelihood'.
+    dim : int
+        The dimension of the functions. Only needed for 'likelihood'.
+
+    Returns
+    -------
+    key : function
+        Called as key(path, a, b), where path is the position of the interval in the subdivision tree.
+    """
+    if priority == 'depth_first':
+        return lambda path, a, b: path
+    elif priority == 'volume':
+        return lambda path, a, b: -np.prod(b-a)
+    elif priority == 'likelihood':
+        def likelihood(path, a, b):
+            center = (a+b)/2
+            if dim == 1:
+                values = [func(center) for func in funcs]
+            else:
+                values = [func(center.reshape(1,-1)) for func in funcs]
+            return max(np.max(np.abs(value)) for value in values)/np.linalg.norm(b-a)
+        return likelihood
+    elif callable(priority):
+        return lambda path, a, b: priority(a,b)
+    else:
+        raise ValueError("priority must be 'depth_first', 'volume', 'likelihood' or a function of a and b")
+
+def iterative_subdivision(step, a, b, key, max_depth=None, max_intervals=None, time_budget=None, unresolved=None,\
+                          batch_step=None, batch_size=1):
+    """Runs a subdivision with an explicit frontier instead of recursion.
+
+    The frontier is a heap of intervals waiting to be solved, ordered by key. Each interval
+    popped off of it is handed to step, which either solves it or returns its subintervals.
+
+    Parameters
+    ----------
+    step : function
+        Called as step(a,b). Returns (zeros, intervals) like subdivision_step_nd.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    key : function
+        Called as key(path, a, b) to order the frontier. See frontier_priority.
+    max_depth : int
+        Intervals are not subdivided more than this many times.
+    max_intervals : int
+        The most intervals to solve.
+    time_budget : float
+        The most seconds to spend. Checked before each interval is solved.
+    unresolved : list
+        If given, the [a,b] of each interval left unsolved because of the limits above is appended to it.
+    batch_step : function
+        If given, called as batch_step(a,b) with the bounds of up to batch_size intervals stacked
+        into arrays. Returns a list of (zeros, intervals), one for each interval. Used in place of step.
+    batch_size : int
+        The most intervals to pop off the frontier and hand to batch_step at once. With more than
+        one the zeros can come out in a different order than the recursive subdivision.
+
+    Yields
+    ------
+    zeros : numpy array
+        The zeros found on an interval, as soon as that interval is solved.
+    """
+    start = time.time()
+    counter = itertools.count()
+    frontier = [(key((),a,b), next(counter), (), a, b)]
+    num_solved = 0
+    num_unresolved = 0
+    while frontier:
+        if (max_intervals is not None and num_solved >= max_intervals) or \
+           (time_budget is not None and time.time() - start > time_budget):
+            break
+        if batch_step is None:
+            batch = [heapq.heappop(frontier)]
+            steps = [step(batch[0][3],batch[0][4])]
+        else:
+            num_pop = min(batch_size, len(frontier))
+            if max_intervals is not None:
+                num_pop = min(num_pop, max_intervals - num_solved)
+            batch = [heapq.heappop(frontier) for i in range(num_pop)]
+            steps = batch_step(np.array([entry[3] for entry in batch]), np.array([entry[4] for entry in batch]))
+        num_solved += len(batch)
+        for (k, count, path, a0, b0), (zeros, intervals) in zip(batch, steps):
+            if intervals is None:
+                if len(zeros) > 0:
+                    yield zeros
+                continue
+            if max_depth is not None and len(path) >= max_depth:
+                for a1,b1 in intervals:
+                    num_unresolved += 1
+                    if unresolved is not None:
+                        unresolved.append([a1,b1])
+                continue
+            for i, (a1,b1) in enumerate(intervals):
+                heapq.heappush(frontier, (key(path + (i,),a1,b1), next(counter), path + (i,), a1, b1))
+
+    for k, count, path, a0, b0 in frontier:
+        num_unresolved += 1
+        if unresolved is not None:
+            unresolved.append([a0,b0])
+    if num_unresolved > 0:
+        warnings.warn("Subdivision stopped with {} unresolved intervals".format(num_unresolved), RuntimeWarning)
+
+def subdivision_solve_nd_iter(funcs,a,b,deg,interval_results,interval_checks = [],subinterval_checks=[],tol=1.e-3,\
+                              priority='depth_first',max_depth=None,max_intervals=None,time_budget=None,unresolved=None,\
+                              eval_stats=None,batch_size=1):
+    """Finds the common zeros of the given functions without recursion, yielding them as they are found.
+
+    Parameters
+    ----------
+    funcs : list
+        Each element of the list is a callable function.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    deg : int
+        The degree to approximate with in the chebyshev approximation.
+    interval_results : list
+        A list of lists, one for each check and one for the division solve.
+    priority : str or callable
+        The order to solve the intervals in. See frontier_priority.
+    max_depth, max_intervals, time_budget, unresolved
+        Limits on the subdivision. See iterative_subdivision.
+    eval_stats : dict
+        If given, counts the function evaluations. See full_cheb_approximate.
+    batch_size : int
+        How many intervals of the frontier to approximate together with one call to each function.
+        See subdivision_step_nd_batch.
+
+    Yields
+    ------
+    zeros : numpy array
+        The zeros found on an interval. Each row is a zero.
+    """
+    step = lambda a0, b0: subdivision_step_nd(funcs,a0,b0,deg,interval_results,interval_checks,subinterval_checks,tol=tol,\
+                                              eval_stats=eval_stats)
+    key = frontier_priority(priority, funcs, len(a))
+    batch_step = None
+    if batch_size > 1:
+        batch_step = lambda a0, b0: subdivision_step_nd_batch(funcs,a0,b0,deg,interval_results,interval_checks,\
+                                                              subinterval_checks,tol=tol,eval_stats=eval_stats)
+    return iterative_subdivision(step,a,b,key,max_depth,max_intervals,time_budget,unresolved,batch_step,batch_size)
+
+def subdivision_solve_1d_iter(f,a,b,cheb_approx_tol=1.e-3,max_degree=128,priority='depth_first',\
+                              max_depth=None,max_intervals=None,time_budget=None,unresolved=None):
+    """Finds the roots of a one-dimensional function without recursion, yielding them as they are found.
+
+    Parameters
+    ----------
+    f : function from R -> R
+        The function to find the roots of.
+    a : numpy array
+        The lower bound on the interval.
+    b : numpy array
+        The upper bound on the interval.
+    priority : str or callable
+        The order to solve the intervals in. See frontier_priority.
+    max_depth, max_intervals, time_budget, unresolved
+        Limits on the subdivision. See iterative_subdivision.
+
+    Yields
+    ------
+    zeros : numpy array
+        The roots found on an interval.
+    """
+    step = lambda a0, b0: subdivision_step_1d(f,a0,b0,cheb_approx_tol,max_degree)
+    key = frontier_priority(priority, [f], 1)
+    return iterative_subdivision(step,a,b,key,max_depth,max_intervals,time_budget,unresolved)
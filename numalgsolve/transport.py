@@ -0,0 +1,149 @@
+"""Moves numpy arrays between processes through shared memory, passing only small descriptors.
+
+Each shared array is a .npy file in a memory-mapped arena directory. The arena is in /dev/shm when
+there is one, which is the same tmpfs that multiprocessing.shared_memory uses on Linux, so the
+arrays never touch the disk. Processes open the arrays with np.load(mmap_mode) without copying
+them. Small arrays aren't worth a file and are just pickled in their descriptor.
+"""
+import os
+import tempfile
+import uuid
+import numpy as np
+from numalgsolve.polynomial import MultiCheb, MultiPower
+
+#Arrays with fewer bytes than this are pickled instead of shared.
+MIN_SHARED_BYTES = 1 << 16
+
+def default_arena_directory():
+    '''The directory shared arrays go in, /dev/shm if there is one and the temporary directory otherwise.'''
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+class ArrayArena(object):
+    '''
+    Places arrays in shared memory and hands out descriptors that any process can open them with.
+
+    Descriptors are ('pickle', array) for small arrays or ('memmap', path) for shared ones.
+    The arena owns the files it makes and deletes them on release or close, unless they are handed
+    off with owned=False to a process that takes them with open_array.
+
+    Parameters
+    ----------
+    directory : str
+        Where the memory-mapped files go. Defaults to default_arena_directory().
+    min_bytes : int
+        Arrays with fewer bytes than this are pickled in their descriptor.
+    '''
+    def __init__(self, directory=None, min_bytes=MIN_SHARED_BYTES):
+        self.directory = default_arena_directory() if directory is None else directory
+        self.min_bytes = min_bytes
+        self.prefix = 'numalgsolve-{}-{}'.format(os.getpid(), uuid.uuid4().hex[:8])
+        self.count = 0
+        self.owned = set()
+
+    def put(self, array, owned=True):
+        '''Places an array in the arena.
+
+        Parameters
+        ----------
+        array : numpy array
+            The array to share.
+        owned : bool
+            If False the arena forgets the file, and whoever opens it with open_array(take=True) deletes it.
+
+        Returns
+        -------
+        descriptor : tuple
+            What other processes open the array with.
+        '''
+        array = np.asarray(array)
+        if array.nbytes < self.min_bytes or array.dtype.hasobject:
+            return ('pickle', array)
+        path = os.path.join(self.directory, '{}-{}.npy'.format(self.prefix, self.count))
+        self.count += 1
+        shared = np.lib.format.open_memmap(path, mode='w+', dtype=array.dtype, shape=array.shape)
+        shared[...] = array
+        del shared
+        if owned:
+            self.owned.add(path)
+        return ('memmap', path)
+
+    def release(self, descriptor):
+        '''Deletes the file of a descriptor from this arena.'''
+        if descriptor[0] == 'memmap' and descriptor[1] in self.owned:
+            self.owned.discard(descriptor[1])
+            _remove(descriptor[1])
+
+    def close(self):
+        '''Deletes all the files this arena owns.'''
+        for path in self.owned:
+            _remove(path)
+        self.owned.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def open_array(descriptor, take=False):
+    '''Opens an array from its descriptor without copying it.
+
+    Shared arrays are mapped copy-on-write, so they can be changed without changing the shared copy.
+
+    Parameters
+    ----------
+    descriptor : tuple
+        From ArrayArena.put.
+    take : bool
+        If True the caller owns the shared file, which is deleted once it is mapped.
+
+    Returns
+    -------
+    array : numpy array
+        The array.
+    '''
+    if descriptor[0] == 'pickle':
+        return descriptor[1]
+    path = descriptor[1]
+    array = np.load(path, mmap_mode='c').view(np.ndarray)
+    if take:
+        if os.name == 'nt': #Windows can't delete a mapped file.
+            array = np.array(array)
+        #The mapping outlives the file on posix systems.
+        _remove(path)
+    return array
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def encode_polys(polys, arena):
+    '''Puts the coefficients of polynomials in an arena.
+
+    Parameters
+    ----------
+    polys : list
+        MultiCheb or MultiPower polynomials.
+    arena : ArrayArena
+        Where the coefficients go.
+
+    Returns
+    -------
+    encoded : list
+        A (class name, descriptor) pair for each polynomial.
+    '''
+    return [(type(poly).__name__, arena.put(poly.coeff)) for poly in polys]
+
+def decode_polys(encoded):
+    '''Makes the polynomials encoded by encode_polys.'''
+    classes = {'MultiCheb' : MultiCheb, 'MultiPower' : MultiPower}
+    return [classes[name](open_array(descriptor)) for name, descriptor in encoded]
+
+def is_encodable(system):
+    '''Whether a system is a list of MultiCheb and MultiPower polynomials that encode_polys can share.'''
+    return isinstance(system, (list, tuple)) and len(system) > 0 and \
+           all(type(poly) in (MultiCheb, MultiPower) for poly in system)
@@ -3,6 +3,11 @@ import numpy as np
 import itertools
 from scipy.linalg import qr, solve_triangular
 from scipy.misc import comb
+from scipy import sparse
+from collections import OrderedDict
+import os
+import re
+import shutil
 import time
 
 class InstabilityWarning(Warning):
@@ -75,6 +80,99 @@ class Term(object):
     def __hash__(self):
         return hash(self.val)
 
+class MonomialIndex(object):
+    '''
+    Finds the spots of monomials in a list of monomials with integer array indexing.
+
+    Each monomial gets a mixed-radix linear index in the smallest box that holds all the monomials.
+    A dense lookup array maps that index to the spot of the monomial, unless the monomials fill only
+    a little of a big box, like all the monomials up to a total degree in many variables. Then the
+    linear indexes are sorted and searched instead, so the memory follows the number of monomials.
+    Negative exponents, like the y^k/x terms used in division, are allowed.
+
+    Parameters
+    ----------
+    terms : 2D array-like
+        Each row is a monomial.
+
+    Attributes
+    ----------
+    terms : 2D numpy array
+        The monomials.
+    offset : numpy array
+        The smallest exponent of each variable.
+    shape : tuple
+        The number of exponents of each variable in the box.
+    lookup : numpy array
+        The spot of the monomial with each linear index, -1 where there isn't one. None if the
+        linear indexes are searched.
+    linear : numpy array
+        The sorted linear indexes of the monomials, if they are searched.
+    order : numpy array
+        The spot of the monomial with each of the sorted linear indexes, if they are searched.
+    '''
+    #The box can be this many times bigger than the number of monomials, or this big, for a dense lookup.
+    dense_fill = 16
+    dense_size = 1 << 16
+
+    def __init__(self, terms):
+        self.terms = np.asarray(terms, dtype=int)
+        if len(self.terms):
+            self.offset = np.minimum(self.terms.min(axis=0), 0)
+            self.shape = tuple(self.terms.max(axis=0) - self.offset + 1)
+        else:
+            self.offset = np.zeros(self.terms.shape[1], dtype=int)
+            self.shape = (0,)*self.terms.shape[1]
+        linear = np.ravel_multi_index((self.terms - self.offset).T, self.shape)
+        size = int(np.prod(self.shape))
+        if size <= max(self.dense_fill*len(self.terms), self.dense_size):
+            self.lookup = -np.ones(size, dtype=int)
+            self.lookup[linear] = np.arange(len(self.terms))
+        else:
+            self.lookup = None
+            self.order = np.argsort(linear)
+            self.linear = linear[self.order]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def spots(self, terms):
+        '''Finds the spots of some monomials.
+
+        Parameters
+        ----------
+        terms : 2D array-like
+            Each row is a monomial.
+
+        Returns
+        -------
+        spots : numpy array
+            The spot of each monomial, -1 if it isn't in the index.
+        '''
+        shifted = np.asarray(terms, dtype=int) - self.offset
+        inside = np.all((shifted >= 0) & (shifted < self.shape), axis=1)
+        spots = -np.ones(len(shifted), dtype=int)
+        linear = np.ravel_multi_index(shifted[inside].T, self.shape)
+        if self.lookup is not None:
+            spots[inside] = self.lookup[linear]
+        else:
+            places = np.minimum(np.searchsorted(self.linear, linear), len(self.linear)-1)
+            spots[inside] = np.where(self.linear[places] == linear, self.order[places], -1)
+        return spots
+
+    def __contains__(self, term):
+        return self.spots([term])[0] >= 0
+
+    def __getitem__(self, terms):
+        '''The spot of a monomial, or the spots of each row of a 2D array of monomials.
+        Raises a KeyError if a monomial isn't in the index.
+        '''
+        terms = np.asarray(terms, dtype=int)
+        spots = self.spots(terms.reshape(-1, len(self.shape)))
+        if np.any(spots < 0):
+            raise KeyError(tuple(terms.reshape(-1, len(self.shape))[np.argmax(spots < 0)]))
+        return spots[0] if terms.ndim == 1 else spots
+
 def clean_zeros_from_matrix(array, accuracy=1.e-10):
     '''Sets all values in the array less than the given accuracy to 0.
 
@@ -334,17 +432,47 @@ def sorted_polys_monomial(polys):
     sorted_polys = [polys[i] for i in argsort_list]
     return sorted_polys
 
+def sparse_row_extents(matrix):
+    '''Finds the first column and one past the last column each row of a sparse matrix has an entry in.
+
+    They are read off the column indices of the csr format, so the matrix is never made dense.
+
+    Parameters
+    ----------
+    matrix : scipy sparse matrix
+        The matrix. It is converted to csr, and its explicit zeros are dropped.
+
+    Returns
+    -------
+    leading : numpy array
+        The first nonzero column of each row, or the number of columns for rows of zeros.
+    ending : numpy array
+        One past the last nonzero column of each row, or 0 for rows of zeros.
+    '''
+    matrix = matrix.tocsr()
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+    leading = np.full(matrix.shape[0], matrix.shape[1], dtype=int)
+    ending = np.zeros(matrix.shape[0], dtype=int)
+    nonempty = np.diff(matrix.indptr) > 0
+    leading[nonempty] = matrix.indices[matrix.indptr[:-1][nonempty]]
+    ending[nonempty] = matrix.indices[matrix.indptr[1:][nonempty] - 1] + 1
+    return leading, ending
+
 def row_swap_matrix(matrix):
     '''Rearrange the rows of matrix so it is close to upper traingular.
 
+    Rows are sorted by their first nonzero column. Rows of all zeros go last.
+
     Parameters
     ----------
-    matrix : 2D numpy array
-        The matrix whose rows need to be switched
+    matrix : 2D numpy array or scipy sparse matrix
+        The matrix whose rows need to be switched. The first column of the rows of a sparse
+        matrix is found from its csr indices, see sparse_row_extents.
 
     Returns
     -------
-    2D numpy array
+    2D numpy array or scipy csr matrix
         The same matrix but with the rows changed so it is close to upper
         triangular
 
@@ -355,12 +483,363 @@ def row_swap_matrix(matrix):
            [0, 2, 0, 2],
            [0, 1, 3, 0]])
     '''
-    leading_mon_columns = list()
-    for row in matrix:
-        leading_mon_columns.append(np.where(row!=0)[0][0])
-    #print(np.argsort(leading_mon_columns))
+    if sparse.issparse(matrix):
+        matrix = matrix.tocsr()
+        leading_mon_columns = sparse_row_extents(matrix)[0]
+    else:
+        nonzero = matrix != 0
+        leading_mon_columns = np.where(nonzero.any(axis=1), np.argmax(nonzero, axis=1), matrix.shape[1])
     return matrix[np.argsort(leading_mon_columns)]
 
+def macaulay_matrix(poly_coeffs, matrix_terms, sparse_matrix=False):
+    '''Puts the coefficients of the polynomials into the rows of a Macaulay matrix.
+
+    Only the nonzero coefficients are touched, so no dense tensor of all the monomials up to
+    the degree is ever made, see entries_matrix.
+
+    Parameters
+    ----------
+    poly_coeffs : list
+        Contains numpy arrays that hold the coefficients of the polynomials to be put in the matrix.
+    matrix_terms : numpy array
+        The ith row is the term represented by the ith column of the matrix. Coefficients of
+        terms that aren't in it are left out.
+    sparse_matrix : bool
+        If True the matrix is returned as a scipy csr matrix, otherwise as a dense numpy array.
+
+    Returns
+    -------
+    matrix : 2D numpy array or scipy csr matrix
+        The Macaulay matrix, with the rows sorted by row_swap_matrix.
+    '''
+    rows, terms, values = list(), list(), list()
+    for row, coeff in enumerate(poly_coeffs):
+        spots = np.nonzero(coeff)
+        rows.append(np.full(len(spots[0]), row, dtype=int))
+        terms.append(np.column_stack(spots))
+        values.append(coeff[spots])
+    values = np.concatenate(values).astype(np.result_type(float, *poly_coeffs))
+    return entries_matrix(np.concatenate(rows), np.vstack(terms), values, len(poly_coeffs), matrix_terms,
+                          sparse_matrix=sparse_matrix)
+
+def entries_matrix(rows, terms, values, num_rows, matrix_terms, sparse_matrix=False):
+    '''Puts entries straight into a preallocated Macaulay matrix.
+
+    The columns of the terms are found with a MonomialIndex, so the memory used follows the
+    number of terms rather than all the monomials up to the degree.
+
+    Parameters
+    ----------
+    rows : numpy array
+        The row of each entry.
+    terms : 2D numpy array
+        The term of each entry. Entries with the same row and term are added up.
+    values : numpy array
+        The value of each entry.
+    num_rows : int
+        The number of rows of the matrix.
+    matrix_terms : numpy array
+        The ith row is the term represented by the ith column of the matrix. Entries of
+        terms that aren't in it are left out.
+    sparse_matrix : bool
+        If True the matrix is returned as a scipy csr matrix, otherwise as a dense numpy array.
+
+    Returns
+    -------
+    matrix : 2D numpy array or scipy csr matrix
+        The Macaulay matrix, with the rows sorted by row_swap_matrix.
+    '''
+    columns = MonomialIndex(matrix_terms).spots(terms)
+    in_matrix = columns >= 0
+    rows, cols, data = rows[in_matrix], columns[in_matrix], values[in_matrix]
+    shape = (num_rows, len(matrix_terms))
+
+    if sparse_matrix:
+        #The coo to csr conversion adds up repeated entries.
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+    else:
+        #bincount adds up repeated entries while scattering them into the flat matrix.
+        spots = rows*shape[1] + cols
+        size = shape[0]*shape[1]
+        matrix = np.bincount(spots, data.real, minlength=size)
+        if np.iscomplexobj(data):
+            matrix = matrix + 1j*np.bincount(spots, data.imag, minlength=size)
+        matrix = matrix.reshape(shape)
+
+    #Sorts the rows of the matrix so it is close to upper triangular.
+    return row_swap_matrix(matrix)
+
+def mon_mult_entries(terms, mons, power):
+    '''Finds where each term of a polynomial goes when it is multiplied by each monomial in mons.
+
+    Parameters
+    ----------
+    terms : 2D array-like
+        Each row is a term of the polynomial.
+    mons : 2D array-like
+        Each row is a monomial to multiply by.
+    power : bool
+        If True the terms are in the power basis, otherwise in the Chebyshev basis.
+
+    Returns
+    -------
+    mon_spots : numpy array
+        The row of mons each entry comes from.
+    term_spots : numpy array
+        The row of terms each entry comes from.
+    products : 2D numpy array
+        The term each entry lands on. The same term can come up more than once for a Chebyshev product.
+    weights : numpy array
+        What the coefficient of the term is multiplied by in each entry.
+    '''
+    mons = np.asarray(mons, dtype=int)
+    num_mons, dim = mons.shape
+    terms = np.asarray(terms, dtype=int).reshape(-1, dim)
+
+    if power:
+        products = [(terms[:,np.newaxis,:] + mons, 1.)]
+    else:
+        #T_a*T_b = (T_{a+b} + T_{|a-b|})/2 in each variable.
+        products = [(np.abs(terms[:,np.newaxis,:] + np.array(signs)*mons), .5**dim)
+                    for signs in itertools.product([1,-1], repeat=dim)]
+    num_entries = len(terms)*num_mons
+    mon_spots = np.tile(np.arange(num_mons), len(terms)*len(products))
+    term_spots = np.tile(np.repeat(np.arange(len(terms)), num_mons), len(products))
+    weights = np.repeat([scale for _,scale in products], num_entries)
+    products = np.concatenate([prod_terms.reshape(-1,dim) for prod_terms,_ in products])
+    return mon_spots, term_spots, products, weights
+
+def macaulay_layout(degrees, dim, power, matrix_terms):
+    '''Plans where the coefficients of polynomials with the given degrees go in a Macaulay matrix.
+
+    The rows are the polynomials times each monomial of mon_combos, in the same order as add_polys.
+    The layout only depends on the degrees, so it can be found once and reused with planned_macaulay_matrix.
+
+    Parameters
+    ----------
+    degrees : tuple
+        The degree of each polynomial.
+    dim : int
+        The dimension of the polynomials.
+    power : bool
+        If True the polynomials are in the power basis, otherwise in the Chebyshev basis.
+    matrix_terms : numpy array
+        The ith row is the term represented by the ith column of the matrix.
+
+    Returns
+    -------
+    layout : dict
+        Holds numpy arrays:
+            matrix_terms -- the terms of the columns
+            supports -- the terms of all the polynomials, one polynomial after the other
+            support_cuts -- where the terms of each polynomial start and end in supports
+            rows, cols, sources, weights -- entry i of the matrix is weights[i] times coefficient
+                                            sources[i] of supports, added into spot (rows[i], cols[i])
+            shape -- the shape of the matrix
+    '''
+    degree = sum(degrees) - len(degrees) + 1
+    col_index = MonomialIndex(matrix_terms)
+    supports, rows, cols, sources, weights = list(), list(), list(), list(), list()
+    num_rows = num_sources = 0
+    for deg in degrees:
+        support = np.array(mon_combos([0]*dim, deg), dtype=int)
+        mons = np.array(mon_combos([0]*dim, degree - deg), dtype=int)
+        mon_spots, term_spots, products, scales = mon_mult_entries(support, mons, power)
+        columns = col_index.spots(products)
+        in_matrix = columns >= 0
+        supports.append(support)
+        rows.append(num_rows + mon_spots[in_matrix])
+        cols.append(columns[in_matrix])
+        sources.append(num_sources + term_spots[in_matrix])
+        weights.append(scales[in_matrix])
+        num_rows += len(mons)
+        num_sources += len(support)
+    return {'matrix_terms' : np.asarray(matrix_terms, dtype=int),
+            'supports' : np.vstack(supports),
+            'support_cuts' : np.cumsum([0] + [len(support) for support in supports]),
+            'rows' : np.concatenate(rows),
+            'cols' : np.concatenate(cols),
+            'sources' : np.concatenate(sources),
+            'weights' : np.concatenate(weights),
+            'shape' : np.array([num_rows, len(matrix_terms)])}
+
+def planned_macaulay_matrix(poly_coeffs, layout, sparse_matrix=False):
+    '''Scatters the coefficients of polynomials into the Macaulay matrix planned by macaulay_layout.
+
+    Parameters
+    ----------
+    poly_coeffs : list
+        The coefficient tensors of the polynomials, with the degrees the layout was planned for.
+    layout : dict
+        The layout from macaulay_layout.
+    sparse_matrix : bool
+        If True the matrix is returned as a scipy csr matrix, otherwise as a dense numpy array.
+
+    Returns
+    -------
+    matrix : 2D numpy array or scipy csr matrix
+        The Macaulay matrix, with the rows sorted by row_swap_matrix.
+    '''
+    supports, cuts = layout['supports'], layout['support_cuts']
+    dtype = np.result_type(float, *poly_coeffs)
+    values = np.zeros(len(supports), dtype=dtype)
+    for i, coeff in enumerate(poly_coeffs):
+        support = supports[cuts[i]:cuts[i+1]]
+        #Terms outside of the coefficient tensor are zero.
+        inside = np.all(support < coeff.shape, axis=1)
+        values[cuts[i]:cuts[i+1]][inside] = coeff[tuple(support[inside].T)]
+
+    rows, cols = layout['rows'], layout['cols']
+    shape = tuple(layout['shape'])
+    data = values[layout['sources']]*layout['weights']
+    if sparse_matrix:
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+    else:
+        spots = rows*shape[1] + cols
+        matrix = np.bincount(spots, weights=data.real, minlength=shape[0]*shape[1]).reshape(shape)
+        if np.iscomplexobj(data):
+            matrix = matrix + 1j*np.bincount(spots, weights=data.imag, minlength=shape[0]*shape[1]).reshape(shape)
+
+    #Sorts the rows of the matrix so it is close to upper triangular.
+    return row_swap_matrix(matrix)
+
+def planned_macaulay_matrix_batch(coeff_stack, layout):
+    '''Scatters the coefficients of many systems into the Macaulay matrices planned by macaulay_layout.
+
+    Parameters
+    ----------
+    coeff_stack : numpy array
+        Shape (B, number of polynomials, ...). coeff_stack[b,i] is the coefficient tensor of the i'th
+        polynomial of the b'th system, with the degrees the layout was planned for.
+    layout : dict
+        The layout from macaulay_layout.
+
+    Returns
+    -------
+    matrices : 3D numpy array
+        matrices[b] is the Macaulay matrix of the b'th system, with the rows sorted like row_swap_matrix.
+    '''
+    supports, cuts = layout['supports'], layout['support_cuts']
+    num_systems = coeff_stack.shape[0]
+    values = np.zeros((num_systems, len(supports)), dtype=np.result_type(float, coeff_stack))
+    for i in range(coeff_stack.shape[1]):
+        support = supports[cuts[i]:cuts[i+1]]
+        #Terms outside of the coefficient tensors are zero.
+        inside = np.all(support < coeff_stack.shape[2:], axis=1)
+        values[:,cuts[i]:cuts[i+1]][:,inside] = coeff_stack[(slice(None), i) + tuple(support[inside].T)]
+
+    shape = tuple(layout['shape'])
+    size = shape[0]*shape[1]
+    data = (values[:,layout['sources']]*layout['weights']).ravel()
+    spots = (np.arange(num_systems)[:,np.newaxis]*size + layout['rows']*shape[1] + layout['cols']).ravel()
+    matrices = np.bincount(spots, weights=data.real, minlength=num_systems*size).reshape((num_systems,)+shape)
+    if np.iscomplexobj(data):
+        matrices = matrices + 1j*np.bincount(spots, weights=data.imag, minlength=num_systems*size).reshape((num_systems,)+shape)
+
+    #Sorts the rows of each matrix so it is close to upper triangular.
+    nonzero = matrices != 0
+    leading_mon_columns = np.where(nonzero.any(axis=2), np.argmax(nonzero, axis=2), shape[1])
+    order = np.argsort(leading_mon_columns, axis=1)
+    return matrices[np.arange(num_systems)[:,np.newaxis], order]
+
+class PlanCache(object):
+    '''
+    A least recently used cache of symbolic plans, like the layout of a Macaulay matrix.
+
+    A plan is a dictionary of numpy arrays that only depends on its key. If a directory is set each
+    plan is also saved there with np.save, one file per array, and plans that aren't in memory are
+    loaded from it with np.load(mmap_mode='r'). Plans are shared, so they should never be changed.
+
+    Parameters
+    ----------
+    maxsize : int
+        The most plans to keep in memory.
+    directory : str
+        Where to save the plans. If None they are only kept in memory.
+
+    Attributes
+    ----------
+    hits : int
+        How many times a plan was found in memory or on disk.
+    misses : int
+        How many times a plan had to be built.
+    '''
+    def __init__(self, maxsize=64, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.plans)
+
+    def __contains__(self, key):
+        return key in self.plans
+
+    def clear(self):
+        '''Forgets the plans in memory. Plans saved to disk are kept.'''
+        self.plans.clear()
+
+    def path(self, key):
+        '''The directory a plan is saved in.'''
+        return os.path.join(self.directory, re.sub(r'[^\w.-]+', '_', repr(key)).strip('_'))
+
+    def load(self, key):
+        '''Loads a saved plan, or returns None if there isn't one.'''
+        if self.directory is None or not os.path.isdir(self.path(key)):
+            return None
+        path = self.path(key)
+        return {name[:-4] : np.load(os.path.join(path, name), mmap_mode='r')
+                for name in os.listdir(path) if name.endswith('.npy')}
+
+    def save(self, key, plan):
+        '''Saves a plan. It is written to a temporary directory first so it is never read half written.'''
+        path = self.path(key)
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        os.makedirs(temp, exist_ok=True)
+        for name, array in plan.items():
+            np.save(os.path.join(temp, name + '.npy'), array)
+        try:
+            os.rename(temp, path)
+        except OSError: #Another process saved it first.
+            shutil.rmtree(temp, ignore_errors=True)
+
+    def get(self, key, build):
+        '''Finds the plan for a key.
+
+        Parameters
+        ----------
+        key : tuple
+            Everything the plan depends on.
+        build : function
+            Called with no arguments to make the plan if it isn't in memory or on disk.
+
+        Returns
+        -------
+        plan : dict
+            The plan.
+        '''
+        if key in self.plans:
+            self.hits += 1
+            self.plans.move_to_end(key)
+            return self.plans[key]
+        plan = self.load(key)
+        if plan is None:
+            self.misses += 1
+            plan = build()
+            if self.directory is not None:
+                self.save(key, plan)
+        else:
+            self.hits += 1
+        self.plans[key] = plan
+        while len(self.plans) > self.maxsize:
+            self.plans.popitem(last=False)
+        return plan
+
+#The plans shared by all the solvers.
+plan_cache = PlanCache()
+
 def get_var_list(dim):
     '''Returns a list of the variables [x_1, x_2, ..., x_n] as tuples.'''
     _vars = []
@@ -771,6 +1250,35 @@ def mon_mult2(matrix, mon, power):
             idx_zeros[i] = 0
         return matrix
 
+def sorted_matrix_terms(degree, dim):
+    '''Finds the matrix_terms sorted in the term order needed for Macaulay reduction.
+    So the highest terms come first,the x,y,z etc monomials last.
+    Parameters
+    ----------
+    degree : int
+        The degree of the Macaulay Matrix
+    dim : int
+        The dimension of the polynomials going into the matrix.
+    Returns
+    -------
+    sorted_matrix_terms : numpy array
+        The sorted matrix_terms. The ith row is the term represented by the ith column of the matrix.
+    cuts : tuple
+        When the matrix is reduced it is split into 3 parts with restricted pivoting. These numbers indicate
+        where those cuts happen.
+    '''
+    highest_mons = mon_combosHighest([0]*dim,degree)[::-1]
+
+    other_mons = list()
+    d = degree - 1
+    while d > 1:
+        other_mons += mon_combosHighest([0]*dim,d)[::-1]
+        d -= 1
+
+    xs_mons = mon_combos([0]*dim,1)[::-1]
+    sorted_matrix_terms = np.reshape(highest_mons+other_mons+xs_mons, (len(highest_mons+other_mons+xs_mons),dim))
+    return sorted_matrix_terms, tuple([len(highest_mons),len(highest_mons)+len(other_mons)])
+
 def mon_combosHighest(mon, numLeft, spot = 0):
     '''Finds all the monomials of a given degree and returns them. Works recursively.
 
@@ -1299,24 +1807,21 @@ def newton_polish(polys,root,niter=100,tol=1e-5):
     f_x = np.empty(m,dtype="complex_")
     jac = np.empty((m,dim),dtype="complex_")
 
-    def f(x):
-        #f_x = np.empty(m,dtype="complex_")
-        for i, poly in enumerate(polys):
-            f_x[i] = poly(x)
-        return f_x
-
-    def Df(x):
-        #jac = np.empty((m,dim),dtype="complex_")
+    def f_and_Df(x):
+        #evaluates each polynomial and its gradient in one pass
         for i, poly in enumerate(polys):
-            jac[i] = poly.grad(x)
-        return jac
+            value, grad = poly.value_and_grad(x)
+            f_x[i] = value[0]
+            jac[i] = grad[0]
+        return f_x, jac
 
     i = 0
     x0, x1 = root, root
     while True:
         if i == niter:
             break
-        delta = np.linalg.solve(Df(x0),-f(x0))
+        f_x0, Df_x0 = f_and_Df(x0)
+        delta = np.linalg.solve(Df_x0,-f_x0)
         norm = np.linalg.norm(delta)
         x1 = delta + x0
         if norm < tol or norm > .1:
@@ -1324,3 +1829,45 @@ def newton_polish(polys,root,niter=100,tol=1e-5):
         x0 = x1
         i+=1
     return x1
+
+def newton_polish_batch(polys,roots,niter=100,tol=1e-5):
+    """
+    Perform Newton's method on a system of N polynomials in M variables from many starting points at once.
+
+    Each iteration evaluates every polynomial and its gradient at all the roots that haven't
+    stopped yet, and solves all of their Newton steps with one stacked solve. Each root uses
+    the same stopping rule as newton_polish.
+
+    Parameters
+    ----------
+    polys : list
+        A list of polynomial objects of the same type (MultiPower or MultiCheb).
+    roots : ndarray
+        The initial guesses for Newton's method. Each row is a root.
+    niter : int
+        A maximum number of iterations of Newton's method.
+    tol : float
+        Tolerance for convergence of Newton's method.
+
+    Returns
+    -------
+    roots : ndarray
+        The terminal point of Newton's method for each root.
+    """
+    m = len(polys)
+    roots = np.array(roots, dtype="complex_")
+    active = np.arange(len(roots))
+
+    for i in range(niter):
+        if len(active) == 0:
+            break
+        f_x = np.empty((len(active),m),dtype="complex_")
+        jac = np.empty((len(active),m,roots.shape[1]),dtype="complex_")
+        for j, poly in enumerate(polys):
+            f_x[:,j], jac[:,j] = poly.value_and_grad(roots[active])
+        delta = np.linalg.solve(jac,-f_x[:,:,np.newaxis])[:,:,0]
+        norm = np.linalg.norm(delta,axis=1)
+        roots[active] += delta
+        #Like newton_polish, the step is still taken on the iteration a root stops.
+        active = active[~((norm < tol) | (norm > .1))]
+    return roots
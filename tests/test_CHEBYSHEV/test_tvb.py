@@ -1,7 +1,7 @@
 import numpy as np
 from CHEBYSHEV.TVB_Method.cheb_class import Polynomial, MultiCheb
 from CHEBYSHEV.TVB_Method.TVB import find_degree, mon_combos, sorted_matrix_terms
-from CHEBYSHEV.TVB_Method.root_finder import roots
+from CHEBYSHEV.TVB_Method.root_finder import roots, newton_polish, newton_polish_batch
 
 from itertools import product
 import warnings
@@ -162,3 +162,13 @@ def test_mon_combos():
             mons2.append(i)
     for i in range(len(mons)):
         assert((mons[i] == mons2[i]).all())
+
+def test_newton_polish_batch():
+    #polishing all the roots at once should agree with polishing them one at a time
+    np.random.seed(5)
+    A = MultiCheb(np.random.randn(4,4))
+    B = MultiCheb(np.random.randn(4,4))
+    zeros = np.random.rand(20,2)*2 - 1
+    polished = newton_polish_batch([A,B],zeros)
+    for zero, polished_zero in zip(zeros, polished):
+        assert np.allclose(polished_zero, newton_polish([A,B],zero))
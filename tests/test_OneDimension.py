@@ -1,6 +1,7 @@
 import numpy as np
+import warnings
 from numalgsolve.polynomial import Polynomial, MultiCheb, MultiPower
-from numalgsolve.OneDimension import solve
+from numalgsolve.OneDimension import solve, aberth, STRUCTURED_DEGREE
 
 def getPoly(deg, power):
     '''
@@ -136,3 +137,45 @@ def test_OneD_cheb_eigenvectors():
     correctZeros(poly, 1, eigvals=False)
     correctZeros(poly, 0, eigvals=False)
     correctZeros(poly, -1, eigvals=False)
+
+def test_aberth():
+    '''
+    Above STRUCTURED_DEGREE the eigenvalue solvers use aberth, which should find the same zeros as
+    the companion and colleague matrices, and give up when it doesn't converge.
+    '''
+    np.random.seed(4)
+    for power in [True, False]:
+        poly = getPoly(STRUCTURED_DEGREE + 50, power)
+        matrix = np.polynomial.polynomial.polycompanion(poly.coeff) if power else \
+                 np.polynomial.chebyshev.chebcompanion(poly.coeff)
+        expected = np.linalg.eigvals(matrix)
+        zeros = aberth(poly.coeff, power)
+        assert np.max([np.min(np.abs(zeros - zero)) for zero in expected]) < 1.e-8
+        for MSmatrix in [-1, 0, 1]:
+            zeros = solve(poly, MSmatrix=MSmatrix)
+            assert len(zeros) == poly.degree
+            assert np.max([np.min(np.abs(zeros - zero)) for zero in expected]) < 1.e-8
+        assert aberth(poly.coeff, power, maxiter=1) is None
+    assert aberth(np.array([1., 2., 0.]), False) is None
+
+def test_aberth_gives_up_quietly():
+    '''
+    Clustered zeros get stuck, so aberth should give up early, and the overflows on the way
+    shouldn't be warned about. Chebyshev polynomials shouldn't overflow off [-1,1].
+    '''
+    from numalgsolve.OneDimension import cheb_newton_steps
+    clustered = np.polynomial.chebyshev.chebfromroots(np.linspace(-1, 1, STRUCTURED_DEGREE + 20))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        assert aberth(clustered, False, patience=5, maxiter=1000) is None
+
+        np.random.seed(8)
+        coeff = np.random.randn(801)
+        points = np.array([.3 + .2j, -.9, 1.e5 + 1j, 1.e30])
+        steps = cheb_newton_steps(coeff.astype(complex), points.astype(complex))
+        assert np.all(np.isfinite(steps))
+        #Far away p/p' is about x/n.
+        assert np.allclose(steps[2:], points[2:]/800, rtol=1.e-2)
+        deriv = np.polynomial.chebyshev.chebder(coeff)
+        near = points[:2]
+        assert np.allclose(steps[:2], np.polynomial.chebyshev.chebval(near, coeff)/np.polynomial.chebyshev.chebval(near, deriv))
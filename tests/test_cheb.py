@@ -1,5 +1,5 @@
 import numpy as np
-from numalgsolve.polynomial import MultiCheb, MultiPower, poly2cheb, cheb2poly
+from numalgsolve.polynomial import MultiCheb, MultiPower, poly2cheb, cheb2poly, chebvalnd
 import pytest
 import pdb
 
@@ -70,6 +70,29 @@ def test_mon_mult():
     q4 = cheb2poly(a3)
     assert np.allclose(q3.coeff, q4.coeff)
 
+def test_mon_mult_maps():
+    """mon_mult should match folding in each dimension, reuse its maps, and fill an out buffer."""
+    from numalgsolve.utils import mon_mult2
+    from numalgsolve.polynomial import mon_mult_maps
+    np.random.seed(5)
+    for dim in [1,2,3]:
+        for i in range(10):
+            shape = tuple(np.random.randint(1,5,dim))
+            mon = tuple(np.random.randint(0,4,dim))
+            coeff = np.random.randn(*shape)
+            poly = MultiCheb(coeff, clean_zeros=False)
+            expected = mon_mult2(coeff, mon, False)
+            assert np.allclose(poly.mon_mult(mon, returnType='Matrix'), expected)
+            out = np.ones(tuple(np.array(expected.shape) + 1))
+            assert poly.mon_mult(mon, returnType='Matrix', out=out) is out
+            assert np.allclose(out[tuple(slice(0,size) for size in expected.shape)], expected)
+            assert np.all(out[tuple(slice(size,None) for size in expected.shape)] == 0)
+            hits = mon_mult_maps.hits
+            poly.mon_mult(mon, returnType='Matrix')
+            assert mon_mult_maps.hits == hits + 1
+    with pytest.raises(ValueError):
+        MultiCheb(np.ones((3,3))).mon_mult((1,1), out=np.zeros((3,4)))
+
 def test_evaluate():
     cheb = MultiCheb(np.array([[0,0,0,1],[0,0,0,0],[0,0,1,0]]))
     value = cheb((2,5))
@@ -87,6 +110,31 @@ def test_evaluate2():
     value = cheb((2,5))
     assert(np.isclose(value, 656.5))
 
+def test_evaluate_nd():
+    #compare with numpy on random points in 1 to 4 dimensions, including complex points
+    np.random.seed(0)
+    for dim in range(1,5):
+        coeff = np.random.randn(*np.random.randint(1,5,size=dim))
+        poly = MultiCheb(coeff, clean_zeros=False)
+        points = np.random.randn(10,dim) + 1j*np.random.randn(10,dim)*(dim%2)
+        values = poly(points)
+        for point, value in zip(points, values):
+            assert np.isclose(value, chebvalnd(point, coeff))
+
+def test_value_and_grad():
+    #compare with differentiating the coefficients and evaluating with numpy
+    np.random.seed(1)
+    for dim in range(1,5):
+        coeff = np.random.randn(*np.random.randint(1,5,size=dim))
+        poly = MultiCheb(coeff, clean_zeros=False)
+        points = np.random.randn(10,dim) + 1j*np.random.randn(10,dim)*(dim%2)
+        values, grads = poly.value_and_grad(points)
+        assert np.allclose(values, poly(points))
+        for point, grad in zip(points, grads):
+            for i in range(dim):
+                assert np.isclose(grad[i], chebvalnd(point, np.polynomial.chebyshev.chebder(coeff,axis=i)))
+            assert np.allclose(grad, poly.grad(point))
+
 def test_evaluate_grid1():
     poly = MultiCheb(np.array([[2,0,3],
                                 [0,-1,0],
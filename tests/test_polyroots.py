@@ -2,11 +2,14 @@ import numpy as np
 from numalgsolve.polynomial import Polynomial, MultiCheb, MultiPower
 from numalgsolve.MacaulayReduce import find_degree, mon_combos
 from numalgsolve import polyroots as pr
-from numalgsolve.utils import InstabilityWarning, arrays
+from numalgsolve.utils import InstabilityWarning, arrays, MonomialIndex
+from numalgsolve.transport import ArrayArena, open_array, default_arena_directory
 from numalgsolve.Multiplication import create_matrix
 from itertools import product
 import unittest
+import pytest
 import warnings
+import os
 
 def test_paper_example():
 
@@ -424,6 +427,271 @@ def test_div_cheb_roots():
     C = getPoly(5,3,False)
     correctZeros([A,B,C], -1)
 
+def test_reduce_max_memory():
+    '''
+    Reducing a block at a time on a memmap should give the same reduction as in memory, without
+    loading the memmap, and solving with a memory budget should still find the roots.
+    '''
+    from numalgsolve.MacaulayReduce import rrqr_reduceMacaulay, add_polys, row_extents
+    from numalgsolve.Multiplication import multiplication
+    import tempfile, os, tracemalloc
+    np.random.seed(7)
+    A = getPoly(4,3,True)
+    B = getPoly(4,3,True)
+    C = getPoly(4,3,True)
+    degree = find_degree([A,B,C])
+    poly_coeffs = []
+    for poly in [A,B,C]:
+        poly_coeffs = add_polys(degree, poly, poly_coeffs)
+    matrix, matrix_terms, cuts = create_matrix(poly_coeffs, degree, 3)
+    reduced, reduced_terms = rrqr_reduceMacaulay(matrix.copy(), matrix_terms.copy(), cuts, 64)
+    blocked, blocked_terms = rrqr_reduceMacaulay(matrix.copy(), matrix_terms.copy(), cuts, 64, max_memory=5000)
+    #The pivoting can differ in rounding, but the reduced rows should have the same staircase.
+    assert blocked.shape == reduced.shape
+    assert np.all(row_extents(blocked)[0] == row_extents(reduced)[0])
+
+    with tempfile.TemporaryDirectory() as directory:
+        memmap = np.memmap(os.path.join(directory, 'matrix.dat'), dtype=float, mode='w+', shape=matrix.shape)
+        memmap[:] = matrix
+        tracemalloc.start()
+        out_of_core, out_of_core_terms = rrqr_reduceMacaulay(memmap, matrix_terms.copy(), cuts, 64, max_memory=5000)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert isinstance(out_of_core, np.memmap) and np.shares_memory(out_of_core, memmap)
+        #Only E is copied whole, the rest of the matrix is read in blocks.
+        assert peak < matrix.nbytes
+        assert np.allclose(out_of_core, blocked) and np.all(out_of_core_terms == blocked_terms)
+        del memmap, out_of_core
+
+    zeros = multiplication([A,B,C], max_memory=5000)
+    assert len(zeros) == 64
+    for poly in [A,B,C]:
+        assert np.allclose(poly(zeros), 0, atol=1.e-6)
+
+def test_reduce_sparse():
+    '''
+    Reducing a csr Macaulay matrix should give the same reduction as the dense matrix, and solving
+    with sparse matrices should still find the roots.
+    '''
+    from numalgsolve.MacaulayReduce import rrqr_reduceMacaulay, add_polys
+    from numalgsolve.Multiplication import multiplication
+    from numalgsolve.Division import division
+    from scipy import sparse
+    np.random.seed(7)
+    A = getPoly(4,3,True)
+    B = getPoly(4,3,True)
+    C = getPoly(4,3,True)
+    degree = find_degree([A,B,C])
+    poly_coeffs = []
+    for poly in [A,B,C]:
+        poly_coeffs = add_polys(degree, poly, poly_coeffs)
+    matrix, matrix_terms, cuts = create_matrix(poly_coeffs, degree, 3)
+    sparse_matrix = create_matrix(poly_coeffs, degree, 3, sparse_matrix=True)[0]
+    reduced, reduced_terms = rrqr_reduceMacaulay(matrix, matrix_terms.copy(), cuts, 64)
+    sparse_reduced, sparse_terms = rrqr_reduceMacaulay(sparse_matrix, matrix_terms.copy(), cuts, 64)
+    assert isinstance(sparse_reduced, np.ndarray)
+    assert sparse_reduced.shape == reduced.shape
+    assert np.allclose(sparse_reduced, reduced) and np.all(sparse_terms == reduced_terms)
+
+    zeros = multiplication([A,B,C], sparse_matrix=True)
+    assert len(zeros) == 64
+    for poly in [A,B,C]:
+        assert np.allclose(poly(zeros), 0, atol=1.e-6)
+    assert np.allclose(division([A,B,C], sparse_matrix=True), division([A,B,C]))
+
+    with pytest.raises(ValueError):
+        multiplication([A,B,C], construction='permutation', sparse_matrix=True)
+
+def test_staircase_qr():
+    '''
+    Reducing a panel at a time along the staircase of the rows should give the R and Q.T times the rest
+    of the matrix of a dense QR, up to the signs of the rows.
+    '''
+    from numalgsolve.MacaulayReduce import staircase_qr, add_polys
+    from scipy.linalg import qr
+    np.random.seed(11)
+    for dim, deg in [(2,8), (3,3)]:
+        polys = [getPoly(deg,dim,True) for i in range(dim)]
+        degree = find_degree(polys)
+        poly_coeffs = []
+        for poly in polys:
+            poly_coeffs = add_polys(degree, poly, poly_coeffs)
+        matrix, matrix_terms, cuts = create_matrix(poly_coeffs, degree, dim)
+        Q, R = qr(matrix[:,:cuts[0]])
+        rest = Q.T@matrix[:,cuts[0]:]
+        for panel_width in [1, 7, 64]:
+            reduced = staircase_qr(matrix.copy(), cuts[0], panel_width=panel_width)
+            signs = np.sign(np.diag(reduced[:cuts[0],:cuts[0]]))*np.sign(np.diag(R))
+            assert np.allclose(reduced[:cuts[0],:cuts[0]]*signs[:,None], R[:cuts[0]])
+            assert np.allclose(reduced[cuts[0]:,:cuts[0]], 0)
+            assert np.allclose(reduced[:cuts[0],cuts[0]:]*signs[:,None], rest[:cuts[0]])
+            #The rest of the rows only match up to an orthogonal transformation, which keeps the column norms.
+            assert np.allclose(np.linalg.norm(reduced[cuts[0]:,cuts[0]:], axis=0), np.linalg.norm(rest[cuts[0]:], axis=0))
+
+def test_incremental_reduction():
+    '''
+    x^2 + xy and y^2 + xy share the root (1,-1) at infinity, so the highest terms are never full rank and the
+    full reduction fails, but the vector basis stabilizes and the incremental mode finds the 3 finite roots.
+    The highest terms of generic polynomials are full rank at find_degree, so incremental_reduction should
+    leave them to the usual reduction and get the same roots.
+    '''
+    from numalgsolve.Multiplication import incremental_reduction, multiplication, count_top_terms
+    from numalgsolve.utils import MacaulayError
+    np.random.seed(5)
+    for trial in range(3):
+        c1, c2 = np.zeros((3,3)), np.zeros((3,3))
+        for c in (c1, c2):
+            c[0,0], c[1,0], c[0,1] = np.random.randn(3)
+        c1[2,0] = c1[1,1] = c2[0,2] = c2[1,1] = 1
+        polys = [MultiPower(c1), MultiPower(c2)]
+        #The root at infinity leaves one highest term out of the pivots at every degree.
+        assert [count_top_terms(polys, degree) for degree in range(2, 6)] == [1, 1, 1, 1]
+        basis_index, reductions, VB = incremental_reduction(polys, True)
+        assert len(VB) == 3
+        zeros = multiplication(polys, incremental=True)
+        assert len(zeros) == 3
+        for poly in polys:
+            assert np.allclose(poly(zeros), 0, atol=1.e-8)
+        with pytest.raises(MacaulayError):
+            multiplication(polys)
+
+    for polys in [[getPoly(3,2,True), getPoly(5,2,True)], [getPoly(2,3,False), getPoly(2,3,False), getPoly(2,3,False)]]:
+        assert incremental_reduction(polys[::-1], isinstance(polys[0], MultiPower)) is None
+        zeros = multiplication(polys, incremental=True)
+        full_zeros = multiplication(polys)
+        assert len(zeros) == len(full_zeros) == np.prod([poly.degree for poly in polys])
+        for poly in polys:
+            assert np.allclose(poly(zeros), 0, atol=1.e-6)
+
+def test_multiplication_matrix():
+    '''
+    The assembled multiplication matrix should match multiplying each vector basis term with mon_mult.
+    '''
+    from numalgsolve.Multiplication import MacaulayReduction, multiplication_matrix, _random_poly
+    np.random.seed(11)
+    for power, poly_type in [(True, 'MultiPower'), (False, 'MultiCheb')]:
+        polys = [getPoly(4,2,power), getPoly(4,2,power)]
+        basis_index, reductions, VB = MacaulayReduction(polys, 16)
+        f = _random_poly(poly_type, 2)[0]
+        mMatrix = multiplication_matrix(f.coeff, MonomialIndex(VB), basis_index, reductions, power)
+        VBdict = {tuple(row):spot for spot,row in enumerate(VB)}
+        for i in range(len(VB)):
+            f_coeff = f.mon_mult(VB[i], returnType = 'Matrix')
+            column = np.zeros(len(VB))
+            for term in zip(*np.where(f_coeff != 0)):
+                if term in VBdict:
+                    column[VBdict[term]] += f_coeff[term]
+                else:
+                    column -= f_coeff[term]*reductions[basis_index[term]]
+            assert np.allclose(mMatrix[:,i], column)
+
+def test_get_divisor_terms():
+    '''
+    The quotients of T_n(y)*T_m(x) when divided by x should give back the terms when multiplied by x.
+    '''
+    from numalgsolve.Division import get_divisor_terms
+    from numpy.polynomial.chebyshev import chebval
+    terms = np.array([[3,0],[1,4],[2,6],[2,0],[0,5]])
+    rows, quotients, values, last = get_divisor_terms(terms, 1)
+    assert np.all(quotients[:,0] == terms[rows,0]) and np.sum(last) == len(terms)
+    x = np.linspace(-.9,.9,7)
+    for i, term in enumerate(terms):
+        mask = rows == i
+        quotient = sum(value*(1. if deg == -1 else x*chebval(x, [0]*deg+[1]))
+                       for deg, value in zip(quotients[mask,1], values[mask]))
+        assert np.allclose(quotient, chebval(x, [0]*term[1]+[1]))
+
+def test_plan():
+    '''
+    A plan should find the same roots as solve for any system with its degrees.
+    '''
+    import pytest
+    for basis, power in [('power', True), ('cheb', False)]:
+        mult_plan = pr.plan((3,2), basis=basis)
+        div_plan = pr.plan((3,2), basis=basis, method='div')
+        for seed in range(3):
+            np.random.seed(seed)
+            A, B = getPoly(3,2,power), getPoly(2,2,power)
+            np.random.seed(seed)
+            roots = mult_plan.solve([A.coeff, B.coeff])
+            np.random.seed(seed)
+            assert np.allclose(roots, pr.solve([A,B]))
+            for poly in [A,B]:
+                assert np.allclose(poly(roots), 0, atol=1.e-7)
+            assert np.allclose(div_plan.solve([A.coeff, B.coeff]), pr.solve([A,B], MSmatrix=-1))
+        with pytest.raises(ValueError):
+            mult_plan.solve([B.coeff, B.coeff])
+    assert len(pr.plan((4,), basis='power').solve([np.array([24.,-50,35,-10,1])])) == 4
+
+def test_solve_batch():
+    '''
+    Solving a stack of systems should find the same roots as solving each system, including
+    systems with other degrees and 1D polynomials that can't be stacked.
+    '''
+    for power, basis in [(True, 'power'), (False, 'cheb')]:
+        poly_class = MultiPower if power else MultiCheb
+        np.random.seed(12)
+        stack = np.array([[getPoly(3,2,power).coeff, getPoly(3,2,power).coeff] for _ in range(6)])
+        stack[2,1] = 0
+        stack[2,1,:2,:2] = np.random.rand(2,2)
+        roots = pr.solve_batch(stack, basis=basis, MSmatrix=2)
+        assert len(roots) == 6
+        for system, system_roots in zip(stack, roots):
+            expected = pr.solve([poly_class(coeff) for coeff in system], MSmatrix=2)
+            assert np.allclose(np.sort_complex(system_roots[:,0]), np.sort_complex(expected[:,0]))
+
+        coeffs = np.random.rand(8,1,6)
+        coeffs[1,0,-1] = 0
+        coeffs[3,0,0] = 0
+        roots = pr.solve_batch(coeffs, basis=basis)
+        assert len(roots[1]) == 4
+        for coeff, poly_roots in zip(coeffs, roots):
+            expected = pr.solve([poly_class(coeff[0])])
+            assert np.allclose(np.sort_complex(poly_roots), np.sort_complex(expected))
+
+def test_solve_stream():
+    '''
+    Streaming should solve every system, never read further ahead than prefetch, and report errors
+    in the diagnostics instead of stopping.
+    '''
+    np.random.seed(13)
+    systems = [[getPoly(2,2,True), getPoly(2,2,True)] for _ in range(6)]
+    read = []
+    def stream():
+        for i, system in enumerate(systems):
+            read.append(i)
+            yield ('system{}'.format(i), system)
+    yielded = []
+    for system_id, roots, diagnostics in pr.solve_stream(stream(), workers=2, prefetch=2, ordered=True,
+                                                         executor='thread', with_ids=True):
+        yielded.append(system_id)
+        assert len(read) - len(yielded) <= 2
+        assert diagnostics['error'] is None and diagnostics['number_of_roots'] == len(roots)
+        np.random.seed(0)
+        assert np.allclose(np.sort_complex(roots[:,0]), np.sort_complex(pr.solve(systems[int(system_id[6:])])[:,0]))
+        assert diagnostics['residual'] < 1.e-6
+    assert yielded == ['system{}'.format(i) for i in range(6)]
+
+    results = list(pr.solve_stream([systems[0], [systems[0][0]], systems[1]], workers=2))
+    assert sorted(system_id for system_id, _, _ in results) == [0,1,2]
+    for system_id, roots, diagnostics in results:
+        assert (diagnostics['error'] is None) == (system_id != 1)
+
+    #Small arrays are pickled, and shared ones can be taken over by whoever opens them.
+    with ArrayArena(min_bytes=64) as arena:
+        small, large = np.arange(4.), np.arange(100.)
+        assert arena.put(small)[0] == 'pickle'
+        descriptor = arena.put(large, owned=False)
+        assert descriptor[0] == 'memmap' and not arena.owned
+        assert np.all(open_array(descriptor, take=True) == large) and not os.path.exists(descriptor[1])
+
+    #Share every array through the arena, which should be empty afterwards.
+    shared = dict((system_id, roots) for system_id, roots, _ in pr.solve_stream(systems, workers=2, shared_min_bytes=0))
+    for system_id, system in enumerate(systems):
+        np.random.seed(0)
+        assert np.allclose(np.sort_complex(shared[system_id][:,0]), np.sort_complex(pr.solve(system)[:,0]))
+    assert not [name for name in os.listdir(default_arena_directory()) if name.startswith('numalgsolve-')]
+
 @unittest.skip("This is an unfinished test")
 def test_qr():
     """Tests BYU-style qr reduction. Specifically, makes sure that QR reduction
@@ -1,6 +1,6 @@
 import numpy as np
 import os,sys
-from numalgsolve.polynomial import MultiPower
+from numalgsolve.polynomial import MultiPower, polyvalnd
 import pytest
 from numalgsolve import utils
 
@@ -105,6 +105,31 @@ def test_evaluate2():
 
     assert(np.isclose(poly((7.4, 2.33, .25)), 16.94732))
 
+def test_evaluate_nd():
+    #compare with numpy on random points in 1 to 4 dimensions, including complex points
+    np.random.seed(0)
+    for dim in range(1,5):
+        coeff = np.random.randn(*np.random.randint(1,5,size=dim))
+        poly = MultiPower(coeff, clean_zeros=False)
+        points = np.random.randn(10,dim) + 1j*np.random.randn(10,dim)*(dim%2)
+        values = poly(points)
+        for point, value in zip(points, values):
+            assert np.isclose(value, polyvalnd(point, coeff))
+
+def test_value_and_grad():
+    #compare with differentiating the coefficients and evaluating with numpy
+    np.random.seed(1)
+    for dim in range(1,5):
+        coeff = np.random.randn(*np.random.randint(1,5,size=dim))
+        poly = MultiPower(coeff, clean_zeros=False)
+        points = np.random.randn(10,dim) + 1j*np.random.randn(10,dim)*(dim%2)
+        values, grads = poly.value_and_grad(points)
+        assert np.allclose(values, poly(points))
+        for point, grad in zip(points, grads):
+            for i in range(dim):
+                assert np.isclose(grad[i], polyvalnd(point, np.polynomial.polynomial.polyder(coeff,axis=i)))
+            assert np.allclose(grad, poly.grad(point))
+
 def test_evaluate_grid1():
     #Evaluate 2 + yx^2 + 3y^2 - xy on grid (0,0), (0,1), (0,2), (1,0), (1,1), (1,2), (2,0), (2,1), (2,2)
     poly = MultiPower(np.array([[2,0,3],
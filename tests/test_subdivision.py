@@ -1,8 +1,10 @@
 import unittest
+import pytest
 import numpy as np
 from numalgsolve.polynomial import Polynomial, MultiCheb, MultiPower
 from numalgsolve import subdivision as subdiv
 from itertools import product
+import sys
 
 def getPoly(deg,dim,power):
     '''
@@ -102,6 +104,31 @@ def test_subdivision_solve_1d():
     A = getPoly(20,1,False)
     correctZeros([A], a, b)
 
+def test_subdivision_solve_1d_batched():
+    '''
+    The leaves of the 1d subdivision are solved together at the end, and should give the zeros
+    the leaves give one at a time.
+    '''
+    f = lambda x: np.cos(60*x**2) - .3
+    a = -2*np.ones(1);b = 2*np.ones(1)
+    leaves = []
+    subdiv.subdivision_leaves_1d(f,a,b,leaves)
+    assert len(leaves) > 1 and len(set(len(coeffs) for coeffs,a0,b0 in leaves)) > 1
+    zeros = subdiv.solve_leaves_1d(leaves)
+    for (coeffs,a0,b0), leaf_zeros in zip(leaves, zeros):
+        expected = subdiv.transform(subdiv.good_zeros(subdiv.multCheb(np.trim_zeros(coeffs,trim='b'))),a0,b0)
+        assert np.allclose(np.sort(leaf_zeros), np.sort(expected))
+    zeros = np.sort(subdiv.subdivision_solve_1d(f,a,b).real)
+    k = 2*np.pi*np.arange(50)
+    expected = np.sort(np.sqrt(np.hstack([k + np.arccos(.3), k[1:] - np.arccos(.3)])/60))
+    expected = np.hstack([-expected[expected < 2][::-1], expected[expected < 2]])
+    assert len(zeros) == len(expected) and np.allclose(zeros, expected)
+
+    #Intervals whose single approximation loses roots with the division matrix.
+    f = lambda x: np.sin(40*x)*np.exp(x)
+    zeros = np.sort(subdiv.solve([f],a,b).real)
+    assert np.allclose(zeros, np.pi*np.arange(-25,26)/40)
+
 def test_subdivision_sine():
     '''
     Test case using basic sine function to put zeros on the coordinates.
@@ -126,6 +153,160 @@ def test_subdivision_sine():
     expected_zeros = np.column_stack([X.flatten(), Y.flatten()])
     assert np.allclose(expected_zeros, zeros, atol=1e-4)
 
+def test_subdivision_solve_parallel():
+    '''
+    Solving the subintervals in a pool should give the same zeros, in the same order, as
+    the serial subdivision.
+    '''
+    f = lambda x: np.sin(np.pi*x[:,1])
+    g = lambda x: np.sin(np.pi*(x[:,0]+x[:,1]))
+    a = -0.511*np.ones(2)
+    b = 3.511*np.ones(2)
+    serial_zeros = subdiv.solve([f, g], a, b)
+    #lambdas can't be pickled, so these have to go to a thread pool
+    thread_zeros = subdiv.solve([f, g], a, b, workers=2, executor='thread')
+    assert np.allclose(serial_zeros, thread_zeros)
+
+    np.random.seed(1)
+    a = -np.ones(2);b = np.ones(2)
+    A = getPoly(10,2,True)
+    B = getPoly(10,2,True)
+    serial_zeros = subdiv.solve([A, B], a, b)
+    process_zeros = subdiv.solve([A, B], a, b, workers=2, executor='process')
+    assert np.allclose(serial_zeros, process_zeros)
+
+    #The results of the workers come back through shared memory
+    interval_checks = [subdiv.constant_term_check]
+    subinterval_checks = [subdiv.linear_check]
+    serial_results = [[] for i in range(3)]
+    serial_zeros = subdiv.subdivision_solve_nd([A, B], a, b, 5, serial_results, interval_checks, subinterval_checks)
+    shared_results = [[] for i in range(3)]
+    shared_zeros = subdiv.parallel_subdivision_solve_nd([A, B], a, b, 5, shared_results, interval_checks,
+                                                        subinterval_checks, workers=2, shared_min_bytes=0)
+    assert np.allclose(serial_zeros, shared_zeros)
+    for serial, shared in zip(serial_results, shared_results):
+        assert len(serial) == len(shared)
+        assert np.allclose(np.array(serial, dtype=float), np.array(shared, dtype=float))
+
+def test_subdivision_leaves_1d_deep():
+    '''
+    A nearly discontinuous function is subdivided about 50 times around the jump, which shouldn't
+    need the stack to be any deeper than that of a shallow subdivision.
+    '''
+    f = lambda x: np.tanh(1.e15*(x-.1))
+    a = -np.ones(1);b = np.ones(1)
+    limit = sys.getrecursionlimit()
+    #Python won't set the limit below the current depth, so this finds it and leaves 40 frames above it.
+    depth = 1
+    while True:
+        try:
+            sys.setrecursionlimit(depth + 40)
+            break
+        except RecursionError:
+            depth += 1
+    try:
+        leaves = []
+        subdiv.subdivision_leaves_1d(f,a,b,leaves)
+        subdiv.solve([f],a,b)
+    finally:
+        sys.setrecursionlimit(limit)
+    #The leaves are in order and cover the interval.
+    assert np.isclose(leaves[0][1], -1) and np.isclose(leaves[-1][2], 1)
+    assert all(np.isclose(leaf[2], next_leaf[1]) for leaf, next_leaf in zip(leaves, leaves[1:]))
+    assert min(b0-a0 for coeffs,a0,b0 in leaves) < 2.**-45
+
+def test_subdivision_solve_priority():
+    '''
+    The order the frontier is worked through in shouldn't change the zeros found, and a
+    budget should stop the solve early with the rest of the intervals reported as unresolved.
+    '''
+    f = lambda x: np.sin(np.pi*x[:,1])
+    g = lambda x: np.sin(np.pi*(x[:,0]+x[:,1]))
+    a = -0.511*np.ones(2)
+    b = 3.511*np.ones(2)
+    zeros = subdiv.solve([f, g], a, b)
+    for priority in ['volume', 'likelihood', lambda a, b: -np.sum(b-a)]:
+        other_zeros = subdiv.solve([f, g], a, b, priority=priority)
+        assert len(other_zeros) == len(zeros)
+        assert np.allclose(np.sort(other_zeros, axis=0), np.sort(zeros, axis=0))
+
+    unresolved = []
+    with pytest.warns(RuntimeWarning):
+        found = list(subdiv.solve_iter([f, g], a, b, max_intervals=3, unresolved=unresolved))
+    assert len(unresolved) > 0
+    assert sum(len(z) for z in found) < len(zeros)
+
+    streamed = np.vstack(list(subdiv.solve_iter([f, g], a, b)))
+    assert np.allclose(np.sort(streamed, axis=0), np.sort(zeros, axis=0))
+
+def test_full_cheb_approximate_reuses_grid():
+    '''
+    Getting both approximations from one evaluation on the fine grid should give the same
+    coefficients as evaluating on each grid separately.
+    '''
+    f = lambda x: np.sin(x[:,0])*np.exp(x[:,1])
+    np.random.seed(2)
+    A = getPoly(4,2,True)
+    a = np.array([-.5,.2])
+    b = np.array([.3,1.1])
+    deg = 5
+    for func in [f, A]:
+        eval_stats = {}
+        coeff = subdiv.full_cheb_approximate(func,a,b,deg,tol=1,eval_stats=eval_stats)
+        assert np.allclose(coeff, subdiv.interval_approximate_nd(func,a,b,np.array([deg]*2)))
+        assert eval_stats['evaluations'] == (2*deg+1)**2
+        assert eval_stats['saved'] == (deg+1)**2
+
+def test_interval_approximate_nd_batch():
+    '''
+    Approximating on a stack of intervals at once should match approximating on each one,
+    and the batched solve should find the same zeros with fewer calls to the functions.
+    '''
+    f = lambda x: np.sin(x[:,0])*np.exp(x[:,1])
+    np.random.seed(3)
+    A = getPoly(4,2,True)
+    a = np.random.rand(5,2) - 1
+    b = a + np.random.rand(5,2)
+    degs = np.array([5,5])
+    for func in [f, A]:
+        coeffs = subdiv.interval_approximate_nd_batch(func,a,b,degs)
+        for k in range(len(a)):
+            assert np.allclose(coeffs[k], subdiv.interval_approximate_nd(func,a[k],b[k],degs))
+
+    calls = []
+    def g(x):
+        calls.append(len(x))
+        return np.sin(np.pi*(x[:,0]+x[:,1]))
+    h = lambda x: np.sin(np.pi*x[:,1])
+    a = -0.511*np.ones(2)
+    b = 3.511*np.ones(2)
+    zeros = subdiv.solve([h, g], a, b)
+    num_calls = len(calls)
+    del calls[:]
+    batch_zeros = subdiv.solve([h, g], a, b, batch_size=16)
+    assert len(calls) < num_calls
+    assert len(batch_zeros) == len(zeros)
+    assert np.allclose(np.sort(batch_zeros, axis=0), np.sort(zeros, axis=0))
+
+def test_batch_checks():
+    '''
+    The vectorized subinterval checks should give exactly the same masks as the originals.
+    '''
+    np.random.seed(4)
+    a = np.random.uniform(-1,.5,size=(20,2))
+    b = np.minimum(a + np.random.uniform(.01,.5,size=(20,2)), 1)
+    intervals = [(a[k],b[k]) for k in range(len(a))]
+    stacked = np.stack([a,b],axis=1)
+    num_eliminated = 0
+    for i in range(50):
+        coeff = np.random.randn(*np.random.randint(1,5,size=2))*.05
+        coeff[0,0] = np.random.randn()
+        for check, batch_check in subdiv.batch_checks.items():
+            mask = np.array(check(coeff,intervals),dtype=bool)
+            assert np.all(mask == batch_check(coeff,stacked))
+            num_eliminated += np.sum(~mask)
+    assert num_eliminated > 0
+
 def test_subdivision_solve_with_transform():
     '''
     The following tests will run subdivision.solve on relatively small random upper trianguler MultiPower.
@@ -5,6 +5,7 @@ from numalgsolve import utils as ut
 from numalgsolve.utils import *
 from numalgsolve.polynomial import MultiCheb, MultiPower
 from scipy.linalg import qr, solve_triangular
+from scipy import sparse
 from itertools import product
 
 def test_inverse_P():
@@ -242,3 +243,158 @@ def test_mon_combos():
             mons2.append(i)
     for i in range(len(mons)):
         assert((mons[i] == mons2[i]).all())
+
+def test_newton_polish_batch():
+    #polishing all the roots at once should agree with polishing them one at a time
+    np.random.seed(5)
+    A = MultiCheb(np.random.randn(4,4))
+    B = MultiCheb(np.random.randn(4,4))
+    roots = np.random.rand(20,2)*2 - 1
+    polished = newton_polish_batch([A,B],roots)
+    for root, polished_root in zip(roots, polished):
+        assert np.allclose(polished_root, newton_polish([A,B],root))
+    assert newton_polish_batch([A,B],roots,niter=0).dtype == complex
+
+def test_macaulay_matrix():
+    #the matrix built from the nonzero coefficients should be the coefficients of each column's term
+    from numalgsolve.Multiplication import create_matrix
+    from numalgsolve.MacaulayReduce import add_polys, find_degree
+    from numalgsolve.polynomial import getPoly
+    np.random.seed(6)
+    polys = [getPoly(3,3,False) for i in range(3)]
+    degree = find_degree(polys)
+    poly_coeffs = []
+    for poly in polys:
+        poly_coeffs = add_polys(degree, poly, poly_coeffs)
+    matrix, matrix_terms, cuts = create_matrix(poly_coeffs, degree, 3)
+    dense_rows = []
+    for coeff in poly_coeffs:
+        padded = np.zeros([degree+1]*3)
+        padded[tuple(slice(0, i) for i in coeff.shape)] = coeff
+        dense_rows.append(padded[tuple(matrix_terms.T)])
+    assert np.all(matrix == row_swap_matrix(np.array(dense_rows)))
+
+    #the sparse construction should give the same matrix as the dense one
+    sparse_matrix, sparse_terms, sparse_cuts = create_matrix(poly_coeffs, degree, 3, sparse_matrix=True)
+    assert sparse.isspmatrix_csr(sparse_matrix)
+    assert np.all(sparse_matrix.toarray() == matrix)
+    assert np.all(sparse_terms == matrix_terms) and sparse_cuts == cuts
+
+    matrix = np.array([[0,2,0,2],[0,0,0,0],[0,1,3,0],[1,2,3,4]])
+    sorted_matrix = np.array([[1,2,3,4],[0,2,0,2],[0,1,3,0],[0,0,0,0]])
+    assert np.all(row_swap_matrix(matrix) == sorted_matrix)
+    assert np.all(row_swap_matrix(sparse.csr_matrix(matrix)).toarray() == sorted_matrix)
+
+def test_sparse_row_extents():
+    matrix = np.array([[0,2,0,2],[0,0,0,0],[0,1,3,0],[1,2,3,4],[0,0,5,0]])
+    leading, ending = sparse_row_extents(sparse.csr_matrix(matrix))
+    assert np.all(leading == [1,4,1,0,2])
+    assert np.all(ending == [4,0,3,4,3])
+    #explicit zeros aren't counted
+    stored = sparse.csr_matrix((np.array([0.,1.,0.]), np.array([0,2,3]), np.array([0,3])), shape=(1,4))
+    leading, ending = sparse_row_extents(stored)
+    assert np.all(leading == [2]) and np.all(ending == [3])
+
+def test_monomial_index():
+    terms = np.array([[2,0],[0,3],[1,1],[-1,2],[0,0]])
+    index = MonomialIndex(terms)
+    assert len(index) == 5
+    assert np.all(index.spots(terms) == np.arange(5))
+    assert np.all(index.spots([[1,0],[5,5],[-2,0],[0,3]]) == [-1,-1,-1,1])
+    assert index[(1,1)] == 2 and index[(-1.,2.)] == 3
+    assert np.all(index[terms[::-1]] == np.arange(5)[::-1])
+    assert (0,3) in index and (3,0) not in index
+    with pytest.raises(KeyError):
+        index[(1,0)]
+    assert np.all(MonomialIndex(np.zeros((0,2), dtype=int)).spots(terms) == -1)
+
+    #monomials spread over a big box are searched instead of looked up
+    far = MonomialIndex(terms*1000)
+    assert far.lookup is None
+    assert np.all(far.spots(terms[::-1]*1000) == np.arange(5)[::-1])
+    assert np.all(far.spots([[1000,0],[5000,5000],[-2000,0],[0,3000],[2000,1]]) == [-1,-1,-1,1,-1])
+    with pytest.raises(KeyError):
+        far[(1,0)]
+
+def test_planned_macaulay_matrix():
+    #scattering into the planned layout should give the matrix built from monomial multiplication
+    from numalgsolve.Multiplication import create_matrix, macaulay_plan
+    from numalgsolve.MacaulayReduce import add_polys
+    from numalgsolve.polynomial import getPoly
+    np.random.seed(8)
+    for power in [True, False]:
+        polys = [getPoly(3,3,power), getPoly(2,3,power), getPoly(2,3,power)]
+        poly_coeffs = []
+        for poly in polys:
+            poly_coeffs = add_polys(5, poly, poly_coeffs)
+        matrix, matrix_terms, cuts = create_matrix(poly_coeffs, 5, 3)
+        plan = macaulay_plan([3,2,2], 3, power)
+        assert np.all(plan['matrix_terms'] == matrix_terms) and tuple(plan['cuts']) == cuts
+        assert np.allclose(planned_macaulay_matrix([poly.coeff for poly in polys], plan), matrix)
+        assert np.allclose(planned_macaulay_matrix([poly.coeff for poly in polys], plan, sparse_matrix=True).toarray(), matrix)
+
+def test_macaulay_entries():
+    from numalgsolve.MacaulayReduce import add_polys, macaulay_entries
+    from numalgsolve.Multiplication import sorted_matrix_terms
+    from numalgsolve.utils import macaulay_matrix, entries_matrix
+    from numalgsolve.polynomial import getPoly, MultiCheb, MultiPower
+    np.random.seed(9)
+    for power in [True, False]:
+        polys = []
+        for deg in [3,2,2]:
+            coeff = getPoly(deg,3,power).coeff
+            coeff[np.random.rand(*coeff.shape) < .4] = 0
+            polys.append(MultiPower(coeff) if power else MultiCheb(coeff))
+        poly_coeffs = []
+        for poly in polys:
+            poly_coeffs = add_polys(5, poly, poly_coeffs)
+        matrix_terms = sorted_matrix_terms(5, 3)[0]
+        rows, terms, values, num_rows = macaulay_entries(5, polys)
+        assert num_rows == len(poly_coeffs)
+        matrix = macaulay_matrix(poly_coeffs, matrix_terms)
+        assert np.allclose(entries_matrix(rows, terms, values, num_rows, matrix_terms), matrix)
+        assert np.allclose(entries_matrix(rows, terms, values, num_rows, matrix_terms, sparse_matrix=True).toarray(), matrix)
+
+def test_permutation_matrix():
+    from numalgsolve.MacaulayReduce import add_polys, permutation_matrix, createMatrixFast, construction
+    from numalgsolve.Multiplication import create_matrix, multiplication
+    from numalgsolve.polynomial import getPoly
+    np.random.seed(10)
+    for power in [True, False]:
+        polys = [getPoly(4,3,power), getPoly(3,3,power), getPoly(2,3,power)]
+        poly_coeffs = []
+        for poly in polys:
+            poly_coeffs = add_polys(7, poly, poly_coeffs)
+        expected, expected_terms, expected_cuts = create_matrix(poly_coeffs, 7, 3)
+        matrix, matrix_terms, cuts = (createMatrixFast if power else construction)(polys, 7, 3)
+        assert np.all(matrix_terms == expected_terms) and cuts == expected_cuts
+        assert np.allclose(matrix, expected)
+        #A guard that never passes falls back to add_polys.
+        matrix = permutation_matrix(polys, 7, 3, power, tol=-1)[0]
+        assert np.allclose(matrix, expected)
+
+        polys = [getPoly(3,2,power), getPoly(2,2,power)]
+        np.random.seed(0)
+        roots = multiplication(polys, construction='permutation')
+        np.random.seed(0)
+        assert np.allclose(roots, multiplication(polys))
+
+def test_plan_cache():
+    import tempfile
+    builds = []
+    def build(n):
+        builds.append(n)
+        return {'terms' : np.arange(n)}
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PlanCache(maxsize=2, directory=directory)
+        for n in [1,2,1,3]:
+            assert np.all(cache.get(('plan', n), lambda: build(n))['terms'] == np.arange(n))
+        assert builds == [1,2,3]
+        assert ('plan', 1) in cache and ('plan', 2) not in cache and len(cache) == 2
+
+        #plans that were evicted or made by another cache are loaded from the disk
+        cache = PlanCache(maxsize=2, directory=directory)
+        plan = cache.get(('plan', 2), lambda: build(2))
+        assert builds == [1,2,3] and cache.hits == 1 and cache.misses == 0
+        assert isinstance(plan['terms'], np.memmap) and np.all(plan['terms'] == np.arange(2))
+        del plan